@@ -0,0 +1,175 @@
+"""HTTP batch request helpers.
+
+Google APIs accept up to a few dozen calls in a single HTTP batch request.
+`execute_batched` packs keyed requests into batches, paces the batches by
+quota and retries only the items that failed with a transient error.
+`execute_paced` does the same under the default pacing when the caller
+brings no limiter.
+"""
+
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from googleapiclient.errors import HttpError
+
+from .quota import (
+    DEFAULT_BURST,
+    DEFAULT_RATE,
+    QuotaLimiter,
+    execute_with_retries,
+    is_retryable,
+)
+
+
+class BatchResult(NamedTuple):
+    """Outcome of a single request of a batch."""
+
+    key: str
+    response: Any = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        """Check whether the request succeeded."""
+        return self.error is None
+
+
+def accept_status(*statuses: int) -> Callable[[str, HttpError], bool]:
+    """Accept batch item errors with the given HTTP statuses as success.
+
+    Parameters
+    ----------
+    *statuses : int
+        The accepted HTTP statuses, e.g. 404 for a delete
+
+    Returns
+    -------
+    Callable[[str, HttpError], bool]
+        The `accept` function of `execute_batched`
+
+    """
+    return lambda key, error: getattr(error, "resp", None) is not None and (
+        error.resp.status in statuses
+    )
+
+
+def execute_batched(
+    service: Any,
+    requests: Dict[str, Callable[[], Any]],
+    batch_size: int = 50,
+    limiter: Optional[QuotaLimiter] = None,
+    max_retries: int = 5,
+    accept: Optional[Callable[[str, HttpError], bool]] = None,
+    on_success: Optional[Callable[[BatchResult], None]] = None,
+) -> Dict[str, BatchResult]:
+    """Execute keyed requests in HTTP batches, retrying failed items.
+
+    Parameters
+    ----------
+    service : Any
+        The discovery service that creates the batches
+        (`service.new_batch_http_request`)
+    requests : Dict[str, Callable[[], Any]]
+        Functions that build the request of every item, keyed by item key.
+        A request is built again for every retry.
+    batch_size : int, optional
+        The maximum number of requests per batch, by default 50
+    limiter : Optional[QuotaLimiter], optional
+        The quota limiter, every request of a batch costs one unit,
+        by default None
+    max_retries : int, optional
+        The maximum number of attempts per item, by default 5
+    accept : Optional[Callable[[str, HttpError], bool]], optional
+        Function that decides whether an error of an item counts as success,
+        e.g. a 409 conflict of an idempotent insert, by default None
+    on_success : Optional[Callable[[BatchResult], None]], optional
+        Function called with the result of every successful item as soon as
+        its batch returns, e.g. to journal it before the remaining batches
+        are sent, by default None
+
+    Returns
+    -------
+    Dict[str, BatchResult]
+        The outcome of every item, keyed by item key
+
+    """
+    results: Dict[str, BatchResult] = {}
+    pending = list(requests)
+    for attempt in range(max_retries):
+        if not pending:
+            break
+        retry = []
+        for i in range(0, len(pending), batch_size):
+            chunk = pending[i : i + batch_size]  # noqa: E203
+
+            def callback(request_id, response, exception):
+                if exception is None:
+                    results[request_id] = BatchResult(request_id, response)
+                elif accept is not None and accept(request_id, exception):
+                    results[request_id] = BatchResult(request_id, None)
+                else:
+                    results[request_id] = BatchResult(request_id, None, exception)
+                if on_success is not None and results[request_id].ok:
+                    on_success(results[request_id])
+
+            batch = service.new_batch_http_request(callback=callback)
+            for key in chunk:
+                batch.add(requests[key](), request_id=key)
+            if limiter is not None:
+                limiter.acquire(len(chunk))
+            # Errors of the batch request itself (not of its items) are retried
+            # as a whole
+            execute_with_retries(batch, max_retries=max_retries)
+            retry.extend(
+                key
+                for key in chunk
+                if key in results
+                and not results[key].ok
+                and is_retryable(results[key].error)  # type: ignore
+            )
+        pending = retry
+        if pending and attempt < max_retries - 1:
+            wait_time = (2**attempt) + (random.randint(0, 1000) / 1000)
+            logging.warning(f"Retrying {len(pending)} failed batch items")
+            time.sleep(wait_time)
+    return results
+
+
+def execute_paced(
+    service: Any,
+    requests: Dict[str, Callable[[], Any]],
+    limiter: Optional[QuotaLimiter] = None,
+    accept: Optional[Callable[[str, HttpError], bool]] = None,
+    **kwargs,
+) -> Dict[str, BatchResult]:
+    """Execute keyed requests in HTTP batches, paced by default.
+
+    Parameters
+    ----------
+    service : Any
+        The discovery service that creates the batches
+    requests : Dict[str, Callable[[], Any]]
+        Functions that build the request of every item, keyed by item key
+    limiter : Optional[QuotaLimiter], optional
+        The quota limiter, by default 10 requests per second
+    accept : Optional[Callable[[str, HttpError], bool]], optional
+        Function that decides whether an error of an item counts as success,
+        by default None
+    **kwargs : dict
+        Additional arguments for `execute_batched`
+
+    Returns
+    -------
+    Dict[str, BatchResult]
+        The outcome of every item, keyed by item key
+
+    """
+    return execute_batched(
+        service,
+        requests,
+        limiter=limiter or QuotaLimiter(DEFAULT_RATE, burst=DEFAULT_BURST),
+        accept=accept,
+        **kwargs,
+    )
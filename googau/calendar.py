@@ -1,8 +1,46 @@
 """Calendar utilities."""
 
+import base64
 import datetime
-from typing import Optional
+import functools
+import hashlib
+import itertools
+import json
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from googleapiclient.errors import HttpError
+
+from googau.batching import (
+    BatchResult,
+    accept_status,
+    execute_batched,
+    execute_paced,
+)
+from googau.quota import (
+    DEFAULT_BURST,
+    DEFAULT_RATE,
+    QuotaLimiter,
+    execute_with_retries,
+)
 from googau.sessions import CalendarSession
+from googau.store import SQLiteStore
+
+# The maximum number of events per page of events.list
+MAX_PAGE_SIZE = 2500
+# The maximum number of calendars per freebusy.query call
+MAX_FREEBUSY_CALENDARS = 50
+
+
+def _rfc3339(value: Union[str, datetime.datetime]) -> str:
+    """Format a naive UTC datetime as an RFC3339 timestamp, pass strings through."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            return f"{value.isoformat()}Z"
+        return value.isoformat()
+    return value
 
 
 class TimeDeltas:
@@ -15,6 +53,179 @@ class TimeDeltas:
     YTD = datetime.timedelta(days=365)
 
 
+def event_id_for(key: str) -> str:
+    """Derive a deterministic, valid event id from an external key.
+
+    Event ids may only use the base32hex alphabet (a-v and 0-9). Inserting
+    an event under the id of its external key (e.g. a booking id) makes the
+    insert idempotent: a retry fails with 409 Conflict instead of creating
+    a duplicate.
+
+    Parameters
+    ----------
+    key : str
+        The external key of the event
+
+    Returns
+    -------
+    str
+        The event id
+
+    """
+    digest = hashlib.sha1(key.encode("utf-8")).digest()  # nosec
+    return base64.b32hexencode(digest).decode("ascii").lower().rstrip("=")
+
+
+class EventStore(SQLiteStore):
+    """Persistent local store of calendar events and their sync tokens.
+
+    Events are kept in a SQLite database keyed by calendar and event ID,
+    together with the sync token of the last completed sync of every calendar.
+    The store is safe to share between threads.
+    """
+
+    _schema = (
+        "CREATE TABLE IF NOT EXISTS events (calendar_id TEXT NOT NULL, "
+        "event_id TEXT NOT NULL, payload TEXT NOT NULL, "
+        "PRIMARY KEY (calendar_id, event_id))",
+        "CREATE TABLE IF NOT EXISTS sync_tokens "
+        "(calendar_id TEXT PRIMARY KEY, token TEXT NOT NULL)",
+    )
+
+    def __init__(self, path: str = "googau_events.sqlite3"):
+        """Open (or create) an event store.
+
+        Parameters
+        ----------
+        path : str, optional
+            Path to the SQLite database file, by default "googau_events.sqlite3".
+            Use ":memory:" for a store that only lives as long as the object.
+
+        """
+        super().__init__(path)
+
+    def sync_token(self, calendar_id: str) -> Optional[str]:
+        """Get the sync token of the last completed sync of a calendar.
+
+        Parameters
+        ----------
+        calendar_id : str
+            The calendar id
+
+        Returns
+        -------
+        Optional[str]
+            The sync token, None if the calendar was never synced
+
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT token FROM sync_tokens WHERE calendar_id = ?", (calendar_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_sync_token(self, calendar_id: str, token: str) -> None:
+        """Save the sync token of a completed sync.
+
+        Parameters
+        ----------
+        calendar_id : str
+            The calendar id
+        token : str
+            The `nextSyncToken` returned by the last page of the sync
+
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sync_tokens (calendar_id, token) VALUES (?, ?)",
+                (calendar_id, token),
+            )
+
+    def apply(self, calendar_id: str, updated: List[dict], deleted: List[str]) -> None:
+        """Insert or update and delete events in a single transaction.
+
+        Parameters
+        ----------
+        calendar_id : str
+            The calendar id
+        updated : List[dict]
+            The new or changed events
+        deleted : List[str]
+            The IDs of the cancelled events
+
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO events (calendar_id, event_id, payload) "
+                "VALUES (?, ?, ?)",
+                [(calendar_id, event["id"], json.dumps(event)) for event in updated],
+            )
+            self._connection.executemany(
+                "DELETE FROM events WHERE calendar_id = ? AND event_id = ?",
+                [(calendar_id, event_id) for event_id in deleted],
+            )
+
+    def clear(self, calendar_id: str) -> None:
+        """Forget the events and the sync token of a calendar.
+
+        Parameters
+        ----------
+        calendar_id : str
+            The calendar id
+
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM events WHERE calendar_id = ?", (calendar_id,)
+            )
+            self._connection.execute(
+                "DELETE FROM sync_tokens WHERE calendar_id = ?", (calendar_id,)
+            )
+
+    def get(self, calendar_id: str, event_id: str) -> Optional[dict]:
+        """Get a stored event.
+
+        Parameters
+        ----------
+        calendar_id : str
+            The calendar id
+        event_id : str
+            The event id
+
+        Returns
+        -------
+        Optional[dict]
+            The event, None if it is not stored
+
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT payload FROM events WHERE calendar_id = ? AND event_id = ?",
+                (calendar_id, event_id),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def events(self, calendar_id: str) -> List[dict]:
+        """Get all stored events of a calendar.
+
+        Parameters
+        ----------
+        calendar_id : str
+            The calendar id
+
+        Returns
+        -------
+        List[dict]
+            The events
+
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT payload FROM events WHERE calendar_id = ?", (calendar_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
 class Calendar(object):
     """Gets a Calendar object for the current session and an ID."""
 
@@ -53,7 +264,8 @@ class Calendar(object):
         time_to_date : str, optional
             The time delta to get events to, by default "ytd"
         limit : int, optional
-            The number of events to return, by default 100
+            The maximum number of events to return, by default 100.
+            Events beyond the first page are fetched as needed.
 
         Returns
         -------
@@ -69,14 +281,802 @@ class Calendar(object):
             end_date = f"{_date.isoformat()}Z"
         delta_date = _date - getattr(TimeDeltas, time_to_date.upper())
         start_date = f"{delta_date.isoformat()}Z"
-        events_result = self.service.session.list(  # type: ignore
-            calendarId=self.calendarId,
-            timeMin=start_date,
-            timeMax=end_date,
-            maxResults=limit,
-            singleEvents=True,
-            orderBy="startTime",
-        ).execute()
-        self.events = events_result.get("items", [])
+        self.events = list(
+            itertools.islice(
+                self.iter_events(
+                    start_date, end_date, page_size=min(limit, MAX_PAGE_SIZE)
+                ),
+                limit,
+            )
+        )
 
         return self.events
+
+    def iter_events(
+        self,
+        start: Union[str, datetime.datetime],
+        end: Union[str, datetime.datetime],
+        page_size: int = MAX_PAGE_SIZE,
+        fields: Optional[str] = None,
+        prefetch: bool = False,
+        **kwargs,
+    ) -> Iterator[dict]:
+        """Iterate over the calendar events in a time range.
+
+        Pages are requested lazily as the events are consumed, following
+        `nextPageToken` until the range is exhausted.
+
+        Parameters
+        ----------
+        start : Union[str, datetime.datetime]
+            The start of the range, an RFC3339 timestamp or a naive UTC datetime
+        end : Union[str, datetime.datetime]
+            The end of the range, an RFC3339 timestamp or a naive UTC datetime
+        page_size : int, optional
+            The number of events per page, by default (and at most) 2500
+        fields : Optional[str], optional
+            The event fields to return, e.g. "id,summary,start,end",
+            by default all fields
+        prefetch : bool, optional
+            Fetch the next page concurrently while the current page is
+            consumed, by default False
+        **kwargs : dict
+            Additional arguments for `events.list`, e.g. `q` or `showDeleted`
+
+        Yields
+        ------
+        dict
+            The events, ordered by start time
+
+        """
+        params = {
+            "calendarId": self.calendarId,
+            "timeMin": _rfc3339(start),
+            "timeMax": _rfc3339(end),
+            "maxResults": min(page_size, MAX_PAGE_SIZE),
+            "singleEvents": True,
+            "orderBy": "startTime",
+            **kwargs,
+        }
+        if fields is not None:
+            params["fields"] = f"nextPageToken,items({fields})"
+        yield from self._iter_pages(params, prefetch)
+
+    def _iter_pages(self, params: dict, prefetch: bool = False) -> Iterator[dict]:
+        """Iterate over the items of a paginated `events.list` call."""
+
+        def fetch(page_token: Optional[str], threaded: bool = False) -> dict:
+            request = self.service.session.list(  # type: ignore
+                pageToken=page_token, **params
+            )
+            if threaded:
+                return request.execute(http=self.service.thread_http())  # type: ignore
+            return request.execute()
+
+        if not prefetch:
+            page_token = None
+            while True:
+                response = fetch(page_token)
+                yield from response.get("items", [])
+                page_token = response.get("nextPageToken")
+                if not page_token:
+                    return
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            response = fetch(None)
+            while True:
+                page_token = response.get("nextPageToken")
+                pending = None
+                if page_token:
+                    pending = executor.submit(fetch, page_token, True)
+                yield from response.get("items", [])
+                if pending is None:
+                    return
+                response = pending.result()
+
+    def insert_events(
+        self,
+        events: Union[List[dict], Dict[str, dict]],
+        limiter: Optional[QuotaLimiter] = None,
+        **kwargs,
+    ) -> Dict[str, BatchResult]:
+        """Insert many events using HTTP batch requests.
+
+        Every event gets a deterministic id: its own "id", the id derived from
+        its external key (if `events` is a dictionary) or the id derived from
+        its content and its occurrence among identical events of the call.
+        Retrying an insert that already went through fails with 409 Conflict,
+        which counts as success if the existing event is not cancelled, so
+        retries never create duplicates. A conflict with a deleted event is
+        reported as an error.
+
+        Parameters
+        ----------
+        events : Union[List[dict], Dict[str, dict]]
+            The events, or the events keyed by an external key
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter, by default 10 requests per second
+        **kwargs : dict
+            Additional arguments for `events.insert`, e.g. `sendUpdates`
+
+        Returns
+        -------
+        Dict[str, BatchResult]
+            The outcome of every insert, keyed by the external key or event id
+
+        """
+        if isinstance(events, dict):
+            keyed = {
+                key: {"id": event_id_for(key), **event} for key, event in events.items()
+            }
+        else:
+            keyed = {}
+            # Identical events of one call are numbered, so each gets its own id
+            occurrences: Dict[str, int] = {}
+            for event in events:
+                if "id" not in event:
+                    content = json.dumps(event, sort_keys=True)
+                    sequence = occurrences.get(content, 0)
+                    occurrences[content] = sequence + 1
+                    event = {"id": event_id_for(f"{content}#{sequence}"), **event}
+                keyed[event["id"]] = event
+
+        def exists(key: str, error: HttpError) -> bool:
+            # A conflict only means success if the event with the id is live,
+            # not if it was deleted (cancelled) earlier
+            if not accept_status(409)(key, error):
+                return False
+            try:
+                existing = self.service.session.get(  # type: ignore
+                    calendarId=self.calendarId, eventId=keyed[key]["id"]
+                ).execute()
+            except HttpError:
+                return False
+            return existing.get("status") != "cancelled"
+
+        return execute_paced(
+            self.service.service,  # type: ignore
+            {
+                key: functools.partial(
+                    self.service.session.insert,  # type: ignore
+                    calendarId=self.calendarId,
+                    body=event,
+                    **kwargs,
+                )
+                for key, event in keyed.items()
+            },
+            limiter,
+            accept=exists,
+        )
+
+    def patch_events(
+        self,
+        patches: Dict[str, dict],
+        limiter: Optional[QuotaLimiter] = None,
+        **kwargs,
+    ) -> Dict[str, BatchResult]:
+        """Patch many events using HTTP batch requests.
+
+        Parameters
+        ----------
+        patches : Dict[str, dict]
+            The fields to change, keyed by event id
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter, by default 10 requests per second
+        **kwargs : dict
+            Additional arguments for `events.patch`, e.g. `sendUpdates`
+
+        Returns
+        -------
+        Dict[str, BatchResult]
+            The outcome of every patch, keyed by event id
+
+        """
+        return execute_paced(
+            self.service.service,  # type: ignore
+            {
+                event_id: functools.partial(
+                    self.service.session.patch,  # type: ignore
+                    calendarId=self.calendarId,
+                    eventId=event_id,
+                    body=body,
+                    **kwargs,
+                )
+                for event_id, body in patches.items()
+            },
+            limiter,
+        )
+
+    def delete_events(
+        self,
+        event_ids: List[str],
+        limiter: Optional[QuotaLimiter] = None,
+        **kwargs,
+    ) -> Dict[str, BatchResult]:
+        """Delete many events using HTTP batch requests.
+
+        Events that are already deleted (404 or 410) count as deleted.
+
+        Parameters
+        ----------
+        event_ids : List[str]
+            The ids of the events to delete
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter, by default 10 requests per second
+        **kwargs : dict
+            Additional arguments for `events.delete`, e.g. `sendUpdates`
+
+        Returns
+        -------
+        Dict[str, BatchResult]
+            The outcome of every delete, keyed by event id
+
+        """
+        return execute_paced(
+            self.service.service,  # type: ignore
+            {
+                event_id: functools.partial(
+                    self.service.session.delete,  # type: ignore
+                    calendarId=self.calendarId,
+                    eventId=event_id,
+                    **kwargs,
+                )
+                for event_id in event_ids
+            },
+            limiter,
+            accept=accept_status(404, 410),
+        )
+
+    def sync(self, store: EventStore, **kwargs) -> Dict:
+        """Synchronize the calendar events into a local store.
+
+        The first sync lists all events and saves the `nextSyncToken`. Later
+        syncs send the saved token and only receive the events that changed
+        since, applying inserts, updates and cancellations to the store. If
+        the server rejects the token as expired (410 Gone) the store is
+        cleared and a full sync is done.
+
+        Every page of changes is applied in one transaction, the new sync
+        token is saved only after the last page, so an interrupted sync is
+        safely repeated.
+
+        Parameters
+        ----------
+        store : EventStore
+            The local event store
+        **kwargs : dict
+            Additional arguments for `events.list`, e.g. `singleEvents`.
+            They must be the same for every sync of the calendar and must not
+            include arguments that are incompatible with `syncToken`
+            such as `timeMin`, `timeMax` or `orderBy`.
+
+        Returns
+        -------
+        Dict
+            The changed events ("updated"), the IDs of the removed events
+            ("deleted") and whether a full sync was done ("full_sync")
+
+        """
+        calendar_id = self.calendarId
+        sync_token = store.sync_token(calendar_id)  # type: ignore
+        try:
+            changes = self._sync_pages(store, sync_token, kwargs)
+        except HttpError as error:
+            if error.resp.status != 410 or sync_token is None:
+                raise
+            store.clear(calendar_id)  # type: ignore
+            sync_token = None
+            changes = self._sync_pages(store, None, kwargs)
+        changes["full_sync"] = sync_token is None
+        return changes
+
+    def _sync_pages(
+        self, store: EventStore, sync_token: Optional[str], params: dict
+    ) -> Dict:
+        """Fetch and apply the pages of a full or incremental sync."""
+        updated: List[dict] = []
+        deleted: List[str] = []
+        page_token = None
+        while True:
+            response = self.service.session.list(  # type: ignore
+                calendarId=self.calendarId,
+                syncToken=sync_token,
+                pageToken=page_token,
+                maxResults=MAX_PAGE_SIZE,
+                **params,
+            ).execute()
+            page_updated = []
+            page_deleted = []
+            for event in response.get("items", []):
+                if event.get("status") == "cancelled":
+                    page_deleted.append(event["id"])
+                else:
+                    page_updated.append(event)
+            store.apply(self.calendarId, page_updated, page_deleted)  # type: ignore
+            updated.extend(page_updated)
+            deleted.extend(page_deleted)
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+        if response.get("nextSyncToken"):
+            store.set_sync_token(
+                self.calendarId, response["nextSyncToken"]  # type: ignore
+            )
+        return {"updated": updated, "deleted": deleted}
+
+
+class CalendarGroup(object):
+    """Gets a group of calendars for the current session and a list of IDs.
+
+    Events of many calendars are fetched with `events.list` calls packed into
+    HTTP batch requests, busy intervals with `freebusy.query`.
+    """
+
+    calendar_ids: List[str]
+    session: CalendarSession
+
+    def __init__(
+        self,
+        session: CalendarSession,
+        calendar_ids: List[str],
+        limiter: Optional[QuotaLimiter] = None,
+    ):
+        """Construct a calendar group.
+
+        Parameters
+        ----------
+        session : CalendarSession
+            The calendar session
+        calendar_ids : List[str]
+            The calendar ids from G-Suite
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter to pace the requests with,
+            by default 10 requests per second
+
+        """
+        self.session = session
+        self.calendar_ids = list(dict.fromkeys(calendar_ids))
+        self.limiter = limiter or QuotaLimiter(DEFAULT_RATE, burst=DEFAULT_BURST)
+
+    def get_events(
+        self,
+        start: Union[str, datetime.datetime],
+        end: Union[str, datetime.datetime],
+        fields: Optional[str] = None,
+        batch_size: int = 50,
+        **kwargs,
+    ) -> Dict[str, List[dict]]:
+        """Get the events of all calendars in a time range.
+
+        Every round sends one batch of `events.list` calls for all calendars
+        that still have pages to fetch, until every calendar is exhausted.
+
+        Parameters
+        ----------
+        start : Union[str, datetime.datetime]
+            The start of the range, an RFC3339 timestamp or a naive UTC datetime
+        end : Union[str, datetime.datetime]
+            The end of the range, an RFC3339 timestamp or a naive UTC datetime
+        fields : Optional[str], optional
+            The event fields to return, e.g. "id,summary,start,end",
+            by default all fields
+        batch_size : int, optional
+            The maximum number of calls per HTTP batch, by default 50
+        **kwargs : dict
+            Additional arguments for `events.list`, e.g. `q`
+
+        Returns
+        -------
+        Dict[str, List[dict]]
+            The events ordered by start time, keyed by calendar id.
+            Calendars that could not be read are left out.
+
+        """
+        params = {
+            "timeMin": _rfc3339(start),
+            "timeMax": _rfc3339(end),
+            "maxResults": MAX_PAGE_SIZE,
+            "singleEvents": True,
+            "orderBy": "startTime",
+            **kwargs,
+        }
+        if fields is not None:
+            params["fields"] = f"nextPageToken,items({fields})"
+
+        events: Dict[str, List[dict]] = {}
+        page_tokens: Dict[str, Optional[str]] = dict.fromkeys(self.calendar_ids)
+        while page_tokens:
+            results = execute_batched(
+                self.session.service,
+                {
+                    calendar_id: functools.partial(
+                        self.session.session.list,
+                        calendarId=calendar_id,
+                        pageToken=page_token,
+                        **params,
+                    )
+                    for calendar_id, page_token in page_tokens.items()
+                },
+                batch_size=batch_size,
+                limiter=self.limiter,
+            )
+            page_tokens = {}
+            for calendar_id, result in results.items():
+                if not result.ok:
+                    logging.error(
+                        f"Failed to list events of {calendar_id}: {result.error}"
+                    )
+                    events.pop(calendar_id, None)
+                    continue
+                events.setdefault(calendar_id, []).extend(
+                    result.response.get("items", [])
+                )
+                if result.response.get("nextPageToken"):
+                    page_tokens[calendar_id] = result.response["nextPageToken"]
+        return events
+
+    def get_busy(
+        self,
+        start: Union[str, datetime.datetime],
+        end: Union[str, datetime.datetime],
+    ) -> Dict[str, List[dict]]:
+        """Get the busy intervals of all calendars with `freebusy.query`.
+
+        This is much cheaper than fetching the events when only the busy
+        times are needed.
+
+        Parameters
+        ----------
+        start : Union[str, datetime.datetime]
+            The start of the range, an RFC3339 timestamp or a naive UTC datetime
+        end : Union[str, datetime.datetime]
+            The end of the range, an RFC3339 timestamp or a naive UTC datetime
+
+        Returns
+        -------
+        Dict[str, List[dict]]
+            The busy intervals (dictionaries with "start" and "end"),
+            keyed by calendar id. Calendars that could not be read are left out.
+
+        """
+        busy: Dict[str, List[dict]] = {}
+        for i in range(0, len(self.calendar_ids), MAX_FREEBUSY_CALENDARS):
+            chunk = self.calendar_ids[i : i + MAX_FREEBUSY_CALENDARS]  # noqa: E203
+            request = self.session.service.freebusy().query(
+                body={
+                    "timeMin": _rfc3339(start),
+                    "timeMax": _rfc3339(end),
+                    "items": [{"id": calendar_id} for calendar_id in chunk],
+                }
+            )
+            response = execute_with_retries(request, limiter=self.limiter)
+            for calendar_id, calendar in response.get("calendars", {}).items():
+                if calendar.get("errors"):
+                    logging.error(
+                        f"Failed to query busy times of {calendar_id}: "
+                        f"{calendar['errors']}"
+                    )
+                    continue
+                busy[calendar_id] = calendar.get("busy", [])
+        return busy
+
+
+def _timestamp(value: Union[str, dict, datetime.datetime]) -> float:
+    """Convert an event time, an RFC3339 timestamp or a datetime to epoch seconds.
+
+    Event times are the `start`/`end` dictionaries of events. All-day events
+    (with a "date" instead of a "dateTime") and naive datetimes are taken as UTC.
+    """
+    if isinstance(value, dict):
+        value = value.get("dateTime") or value["date"]
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+
+def _datetime(timestamp: float) -> datetime.datetime:
+    """Convert epoch seconds to an aware UTC datetime."""
+    return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+
+
+class EventIndex(object):
+    """In-memory interval index of calendar events.
+
+    Event start and end times are parsed once. The events are kept in arrays
+    sorted by start time with an implicit balanced search tree on top that
+    stores the latest end time of every subtree, so overlap and point queries
+    skip every subtree that ends before the queried interval.
+
+    Adding, replacing and removing events (e.g. from the changes returned by
+    `Calendar.sync`) is cheap, the arrays are rebuilt on the next query.
+    """
+
+    def __init__(self):
+        """Construct an empty event index."""
+        self._events: Dict[tuple, tuple] = {}
+        self._dirty = True
+        self._starts: List[float] = []
+        self._ends: List[float] = []
+        self._max_ends: List[float] = []
+        self._keys: List[tuple] = []
+
+    @classmethod
+    def from_events(cls, events: Dict[str, List[dict]]) -> "EventIndex":
+        """Build an index from events keyed by calendar id.
+
+        Parameters
+        ----------
+        events : Dict[str, List[dict]]
+            The events keyed by calendar id, e.g. from `CalendarGroup.get_events`
+
+        Returns
+        -------
+        EventIndex
+            The event index
+
+        """
+        index = cls()
+        for calendar_id, calendar_events in events.items():
+            for event in calendar_events:
+                index.add(calendar_id, event)
+        return index
+
+    def __len__(self) -> int:
+        """Get the number of indexed events."""
+        return len(self._events)
+
+    def add(self, calendar_id: str, event: dict) -> None:
+        """Add or replace an event.
+
+        Parameters
+        ----------
+        calendar_id : str
+            The calendar id of the event
+        event : dict
+            The event, it needs an "id", a "start" and an "end"
+
+        """
+        if event.get("status") == "cancelled":
+            self.remove(calendar_id, event["id"])
+            return
+        start = _timestamp(event["start"])
+        end = _timestamp(event["end"])
+        self._events[(calendar_id, event["id"])] = (start, end, event)
+        self._dirty = True
+
+    def remove(self, calendar_id: str, event_id: str) -> None:
+        """Remove an event if it is indexed.
+
+        Parameters
+        ----------
+        calendar_id : str
+            The calendar id of the event
+        event_id : str
+            The event id
+
+        """
+        if self._events.pop((calendar_id, event_id), None) is not None:
+            self._dirty = True
+
+    def apply(self, calendar_id: str, changes: Dict) -> None:
+        """Apply the changes returned by `Calendar.sync`.
+
+        Parameters
+        ----------
+        calendar_id : str
+            The synced calendar id
+        changes : Dict
+            The changes with the "updated" events, the "deleted" event ids
+            and the "full_sync" flag
+
+        """
+        if changes.get("full_sync"):
+            for key in [key for key in self._events if key[0] == calendar_id]:
+                del self._events[key]
+            self._dirty = True
+        for event in changes.get("updated", []):
+            self.add(calendar_id, event)
+        for event_id in changes.get("deleted", []):
+            self.remove(calendar_id, event_id)
+
+    def _build(self) -> None:
+        """Rebuild the sorted arrays and the subtree end times."""
+        items = sorted(
+            (start, end, key) for key, (start, end, _) in self._events.items()
+        )
+        self._starts = [item[0] for item in items]
+        self._ends = [item[1] for item in items]
+        self._keys = [item[2] for item in items]
+        self._max_ends = list(self._ends)
+
+        def build(lo: int, hi: int) -> float:
+            if lo >= hi:
+                return -math.inf
+            mid = (lo + hi) // 2
+            self._max_ends[mid] = max(
+                self._ends[mid], build(lo, mid), build(mid + 1, hi)
+            )
+            return self._max_ends[mid]
+
+        build(0, len(items))
+        self._dirty = False
+
+    def _query(
+        self, start: float, end: float, inclusive_end: bool = False
+    ) -> List[tuple]:
+        """Find the keys of events with start < end (<= end) and end > start."""
+        if self._dirty:
+            self._build()
+        found: List[tuple] = []
+
+        def visit(lo: int, hi: int) -> None:
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            if self._max_ends[mid] <= start:
+                # Every event of this subtree ends before the interval
+                return
+            visit(lo, mid)
+            node_start = self._starts[mid]
+            starts_before = node_start <= end if inclusive_end else node_start < end
+            if starts_before:
+                if self._ends[mid] > start:
+                    found.append(self._keys[mid])
+                visit(mid + 1, hi)
+
+        visit(0, len(self._starts))
+        return found
+
+    def _events_for(
+        self, keys: List[tuple], calendars: Optional[List[str]]
+    ) -> List[dict]:
+        """Get the events of keys, optionally filtered by calendar."""
+        wanted = set(calendars) if calendars is not None else None
+        return [
+            self._events[key][2] for key in keys if wanted is None or key[0] in wanted
+        ]
+
+    def overlapping(
+        self,
+        start: Union[str, datetime.datetime],
+        end: Union[str, datetime.datetime],
+        calendars: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """Find the events that overlap a time interval.
+
+        Parameters
+        ----------
+        start : Union[str, datetime.datetime]
+            The start of the interval
+        end : Union[str, datetime.datetime]
+            The end of the interval (exclusive)
+        calendars : Optional[List[str]], optional
+            Only return events of these calendars, by default all calendars
+
+        Returns
+        -------
+        List[dict]
+            The events ordered by start time
+
+        """
+        keys = self._query(_timestamp(start), _timestamp(end))
+        return self._events_for(keys, calendars)
+
+    def at(
+        self,
+        moment: Union[str, datetime.datetime],
+        calendars: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """Find the events that are happening at a point in time.
+
+        Parameters
+        ----------
+        moment : Union[str, datetime.datetime]
+            The point in time
+        calendars : Optional[List[str]], optional
+            Only return events of these calendars, by default all calendars
+
+        Returns
+        -------
+        List[dict]
+            The events ordered by start time
+
+        """
+        timestamp = _timestamp(moment)
+        keys = self._query(timestamp, timestamp, inclusive_end=True)
+        return self._events_for(keys, calendars)
+
+    def busy(
+        self,
+        start: Union[str, datetime.datetime],
+        end: Union[str, datetime.datetime],
+        calendars: Optional[List[str]] = None,
+    ) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """Merge the busy times of events within a time interval.
+
+        Events marked as transparent (free) do not count as busy.
+
+        Parameters
+        ----------
+        start : Union[str, datetime.datetime]
+            The start of the interval
+        end : Union[str, datetime.datetime]
+            The end of the interval
+        calendars : Optional[List[str]], optional
+            Only consider events of these calendars, by default all calendars
+
+        Returns
+        -------
+        List[Tuple[datetime.datetime, datetime.datetime]]
+            The merged busy intervals, clipped to the queried interval
+
+        """
+        return [
+            (_datetime(busy_start), _datetime(busy_end))
+            for busy_start, busy_end in self._busy(
+                _timestamp(start), _timestamp(end), calendars
+            )
+        ]
+
+    def _busy(
+        self, start: float, end: float, calendars: Optional[List[str]]
+    ) -> List[Tuple[float, float]]:
+        """Merge the busy intervals within [start, end) as epoch seconds."""
+        wanted = set(calendars) if calendars is not None else None
+        merged: List[List[float]] = []
+        # Keys come ordered by start time, a single pass merges them
+        for key in self._query(start, end):
+            if wanted is not None and key[0] not in wanted:
+                continue
+            event_start, event_end, event = self._events[key]
+            if event.get("transparency") == "transparent":
+                continue
+            event_start, event_end = max(event_start, start), min(event_end, end)
+            if merged and event_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], event_end)
+            else:
+                merged.append([event_start, event_end])
+        return [(busy_start, busy_end) for busy_start, busy_end in merged]
+
+    def free_slots(
+        self,
+        start: Union[str, datetime.datetime],
+        end: Union[str, datetime.datetime],
+        min_duration: datetime.timedelta = datetime.timedelta(0),
+        calendars: Optional[List[str]] = None,
+    ) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """Find the free slots within a time interval.
+
+        Parameters
+        ----------
+        start : Union[str, datetime.datetime]
+            The start of the interval
+        end : Union[str, datetime.datetime]
+            The end of the interval
+        min_duration : datetime.timedelta, optional
+            The minimum length of a slot, by default any length
+        calendars : Optional[List[str]], optional
+            Only consider events of these calendars, by default all calendars
+
+        Returns
+        -------
+        List[Tuple[datetime.datetime, datetime.datetime]]
+            The free slots in chronological order
+
+        """
+        start_ts, end_ts = _timestamp(start), _timestamp(end)
+        slots = []
+        cursor = start_ts
+        for busy_start, busy_end in self._busy(start_ts, end_ts, calendars) + [
+            (end_ts, end_ts)
+        ]:
+            if busy_start - cursor > 0 and busy_start - cursor >= (
+                min_duration.total_seconds()
+            ):
+                slots.append((_datetime(cursor), _datetime(busy_start)))
+            cursor = max(cursor, busy_end)
+        return slots
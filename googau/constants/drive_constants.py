@@ -30,3 +30,33 @@ SHARED_DRIVE = {
         "driveMembersOnly": True,
     },
 }
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+# Fields of the compact file records returned by listings
+FILE_FIELDS = "id,name,mimeType,parents,modifiedTime,size,md5Checksum"
+
+# Default export formats of Google Workspace files
+EXPORT_FORMATS = {
+    "application/vnd.google-apps.document": "application/pdf",
+    "application/vnd.google-apps.spreadsheet": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    ),
+    "application/vnd.google-apps.presentation": "application/pdf",
+    "application/vnd.google-apps.drawing": "image/png",
+}
+
+# File extensions of the export formats
+EXPORT_EXTENSIONS = {
+    "application/pdf": ".pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": (
+        ".docx"
+    ),
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": ".xlsx",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": (
+        ".pptx"
+    ),
+    "text/csv": ".csv",
+    "text/plain": ".txt",
+    "image/png": ".png",
+}
@@ -1,14 +1,366 @@
 """Document utilities."""
 
-from typing import Optional
+import bisect
+import json
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 from .sessions import DocSession
 
+# Paragraph styles that make a paragraph a heading
+HEADING_STYLES = ("TITLE", "SUBTITLE")
+
+
+def _utf16_len(text: str) -> int:
+    """Get the length of a text in UTF-16 code units, the unit of Docs indices."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _is_heading(style: Optional[str]) -> bool:
+    """Check whether a named paragraph style is a heading style."""
+    return style is not None and (
+        style in HEADING_STYLES or style.startswith("HEADING_")
+    )
+
+
+class DocElement(NamedTuple):
+    """A paragraph, heading or table of a document with its index range."""
+
+    kind: str
+    startIndex: int
+    endIndex: int
+    text: str
+    style: Optional[str] = None
+    cells: Optional[Tuple[Tuple[str, ...], ...]] = None
+
+
+class DocText(object):
+    """Plain text view of a document that maps text offsets to indices.
+
+    The text is the concatenation of all text runs of the body, including the
+    text of tables. Offsets into the text are converted to document indices
+    (UTF-16 code units) without walking the document again.
+    """
+
+    text: str
+
+    def __init__(self, text: str, offsets: List[int], indices: List[int]):
+        """Construct a text view.
+
+        Parameters
+        ----------
+        text : str
+            The plain text
+        offsets : List[int]
+            The text offsets at which the text runs start, ascending
+        indices : List[int]
+            The document indices at which the text runs start
+
+        """
+        self.text = text
+        self._offsets = offsets
+        self._indices = indices
+
+    def __str__(self) -> str:
+        """Get the plain text."""
+        return self.text
+
+    def index(self, offset: int) -> int:
+        """Convert a text offset to a document index.
+
+        Parameters
+        ----------
+        offset : int
+            The offset into the text
+
+        Returns
+        -------
+        int
+            The document index of the character at the offset
+
+        """
+        if not self._offsets:
+            return 1
+        run = max(bisect.bisect_right(self._offsets, offset) - 1, 0)
+        start = self._offsets[run]
+        return self._indices[run] + _utf16_len(self.text[start:offset])
+
+    def find(self, substring: str, start: int = 0) -> Iterator[Tuple[int, int]]:
+        """Find the occurrences of a substring.
+
+        Parameters
+        ----------
+        substring : str
+            The text to look for
+        start : int, optional
+            The text offset to start looking at, by default 0
+
+        Yields
+        ------
+        Tuple[int, int]
+            The start and end document index of every occurrence
+
+        """
+        offset = self.text.find(substring, start)
+        while offset != -1 and substring:
+            # The end follows the last character of the match, not the start of
+            # the next run, which may lie past a table or section break
+            last = offset + len(substring) - 1
+            end = self.index(last) + _utf16_len(self.text[last])
+            yield self.index(offset), end
+            offset = self.text.find(substring, offset + len(substring))
+
+
+class DocEdit(object):
+    """Builder that collects edits of a document into one batchUpdate.
+
+    All indices refer to the document as it was loaded, the builder shifts
+    them locally. Text changes are sent from the end of the document to the
+    start, so no change moves the indices of the changes sent after it.
+    Style updates are sent last, with their ranges shifted past the text
+    changes. Overlapping deletions, insertions at the same index and touching
+    style updates of the same style are merged. Adjacent deletions are sent as
+    one unless text is inserted where they meet.
+
+    The update only succeeds if the document was not changed since it was
+    loaded (`writeControl.requiredRevisionId`).
+    """
+
+    def __init__(self, doc: "Doc"):
+        """Construct an edit builder.
+
+        Parameters
+        ----------
+        doc : Doc
+            The loaded document to edit
+
+        """
+        self.doc = doc
+        self._inserts: Dict[int, str] = {}
+        self._deletes: List[Tuple[int, int]] = []
+        self._styles: List[Tuple[int, int, dict, str]] = []
+
+    def insert_text(self, index: int, text: str) -> "DocEdit":
+        """Queue an insertion of text.
+
+        Parameters
+        ----------
+        index : int
+            The index to insert the text at
+        text : str
+            The text to insert, texts inserted at the same index are
+            inserted in the order they are queued
+
+        Returns
+        -------
+        DocEdit
+            The builder
+
+        """
+        for start, end in self._deletes:
+            if start < index < end:
+                raise ValueError(f"Insertion at {index} lies in deleted range")
+        self._inserts[index] = self._inserts.get(index, "") + text
+        return self
+
+    def delete_range(self, start: int, end: int) -> "DocEdit":
+        """Queue a deletion of a range of content.
+
+        Parameters
+        ----------
+        start : int
+            The start index of the range
+        end : int
+            The end index of the range (exclusive)
+
+        Returns
+        -------
+        DocEdit
+            The builder
+
+        """
+        merged = []
+        for other_start, other_end in self._deletes:
+            # Adjacent ranges stay apart, text may be inserted between them
+            if other_start < end and start < other_end:
+                start, end = min(start, other_start), max(end, other_end)
+            else:
+                merged.append((other_start, other_end))
+        for index in self._inserts:
+            if start < index < end:
+                raise ValueError(f"Deletion of {start}-{end} spans an insertion")
+        merged.append((start, end))
+        self._deletes = sorted(merged)
+        return self
+
+    def replace_text(self, start: int, end: int, text: str) -> "DocEdit":
+        """Queue a replacement of a range with text.
+
+        Parameters
+        ----------
+        start : int
+            The start index of the range
+        end : int
+            The end index of the range (exclusive)
+        text : str
+            The new text
+
+        Returns
+        -------
+        DocEdit
+            The builder
+
+        """
+        return self.delete_range(start, end).insert_text(start, text)
+
+    def update_text_style(
+        self, start: int, end: int, style: dict, fields: str
+    ) -> "DocEdit":
+        """Queue a text style update.
+
+        Text inserted at the boundaries of the range is not styled.
+
+        Parameters
+        ----------
+        start : int
+            The start index of the range
+        end : int
+            The end index of the range (exclusive)
+        style : dict
+            The text style, e.g. {"bold": True}
+        fields : str
+            The style fields to update, e.g. "bold"
+
+        Returns
+        -------
+        DocEdit
+            The builder
+
+        """
+        self._styles.append((start, end, style, fields))
+        return self
+
+    def shift(self, index: int, after_inserts: bool = True) -> int:
+        """Map an index of the loaded document to the edited document.
+
+        Parameters
+        ----------
+        index : int
+            The index in the loaded document
+        after_inserts : bool, optional
+            Whether the index moves behind text inserted at the same index,
+            by default True
+
+        Returns
+        -------
+        int
+            The index after all queued text changes
+
+        """
+        shifted = index
+        for position, text in self._inserts.items():
+            if position < index or (after_inserts and position == index):
+                shifted += _utf16_len(text)
+        for start, end in self._deletes:
+            if start < index:
+                shifted -= min(end, index) - start
+        return shifted
+
+    def _merged_styles(self) -> List[Tuple[int, int, dict, str]]:
+        """Merge touching style updates with the same style and fields."""
+        groups: Dict[Tuple[str, str], List[Tuple[int, int, dict, str]]] = {}
+        for update in self._styles:
+            key = (json.dumps(update[2], sort_keys=True), update[3])
+            groups.setdefault(key, []).append(update)
+        merged = []
+        for updates in groups.values():
+            updates.sort(key=lambda update: update[0])
+            start, end, style, fields = updates[0]
+            for next_start, next_end, _, _ in updates[1:]:
+                if next_start <= end:
+                    end = max(end, next_end)
+                else:
+                    merged.append((start, end, style, fields))
+                    start, end = next_start, next_end
+            merged.append((start, end, style, fields))
+        return sorted(merged, key=lambda update: update[0])
+
+    def requests(self) -> List[dict]:
+        """Build the requests of the batchUpdate.
+
+        Returns
+        -------
+        List[dict]
+            The requests in the order they must be applied
+
+        """
+        deletes: List[Tuple[int, int]] = []
+        for start, end in self._deletes:
+            if deletes and deletes[-1][1] == start and start not in self._inserts:
+                deletes[-1] = (deletes[-1][0], end)
+            else:
+                deletes.append((start, end))
+        changes = [(start, 1, end) for start, end in deletes] + [
+            (index, 0, text) for index, text in self._inserts.items()
+        ]
+        requests = []
+        # At the same index the deletion goes first, then the insertion
+        for index, kind, value in sorted(changes, key=lambda c: (-c[0], -c[1])):
+            if kind:
+                requests.append(
+                    {
+                        "deleteContentRange": {
+                            "range": {"startIndex": index, "endIndex": value}
+                        }
+                    }
+                )
+            else:
+                requests.append(
+                    {"insertText": {"location": {"index": index}, "text": value}}
+                )
+        for start, end, style, fields in self._merged_styles():
+            start, end = self.shift(start), self.shift(end, after_inserts=False)
+            if start < end:
+                requests.append(
+                    {
+                        "updateTextStyle": {
+                            "range": {"startIndex": start, "endIndex": end},
+                            "textStyle": style,
+                            "fields": fields,
+                        }
+                    }
+                )
+        return requests
+
+    def execute(self) -> dict:
+        """Send all queued edits in one batchUpdate.
+
+        The document has to be loaded again to see the changes.
+
+        Returns
+        -------
+        dict
+            The response from the API call, an empty dictionary if there
+            was nothing to send
+
+        """
+        requests = self.requests()
+        if not requests:
+            return {}
+        body: dict = {"requests": requests}
+        if self.doc.revisionId is not None:
+            body["writeControl"] = {"requiredRevisionId": self.doc.revisionId}
+        response = self.doc.session.session.batchUpdate(  # type: ignore
+            documentId=self.doc.documentId, body=body
+        ).execute()
+        self.doc.invalidate()
+        return response
+
 
 class Doc(object):
     """Gets a Document object for the current session and an ID."""
 
     documentId: Optional[str] = None
     session: Optional[DocSession] = None
+    document: Optional[dict] = None
 
     # pylint: disable=invalid-name
     def __init__(self, session=None, documentId=None):
@@ -24,3 +376,170 @@ class Doc(object):
         """
         self.documentId = documentId
         self.session = session
+        self._elements: Optional[List[DocElement]] = None
+        self._text: Optional[DocText] = None
+
+    @property
+    def revisionId(self) -> Optional[str]:
+        """Get the revision of the loaded document."""
+        return self.document.get("revisionId") if self.document else None
+
+    def invalidate(self) -> None:
+        """Drop the loaded document and the views extracted from it.
+
+        The next access loads the current revision, e.g. after the document
+        was edited.
+        """
+        self.document = None
+        self._elements = None
+        self._text = None
+
+    def load(self, fields: Optional[str] = None) -> dict:
+        """Fetch the document.
+
+        Parameters
+        ----------
+        fields : Optional[str], optional
+            A field mask to fetch only parts of the document, e.g.
+            "body.content(startIndex,endIndex,paragraph)", by default everything.
+            The revision ID is always fetched.
+
+        Returns
+        -------
+        dict
+            The document
+
+        """
+        if fields is not None and "revisionId" not in fields:
+            fields = f"{fields},revisionId"
+        self.invalidate()
+        self.document = self.session.session.get(  # type: ignore
+            documentId=self.documentId, fields=fields
+        ).execute()
+        return self.document  # type: ignore
+
+    def _extract(self) -> None:
+        """Collect the elements and the text view in one pass over the body."""
+        if self.document is None:
+            self.load()
+        elements: List[DocElement] = []
+        text: List[str] = []
+        offsets: List[int] = []
+        indices: List[int] = []
+        length = 0
+
+        def paragraph_text(paragraph: dict) -> str:
+            nonlocal length
+            runs = []
+            for element in paragraph.get("elements", []):
+                content = element.get("textRun", {}).get("content")
+                if content:
+                    offsets.append(length)
+                    indices.append(element.get("startIndex", 0))
+                    text.append(content)
+                    runs.append(content)
+                    length += len(content)
+            return "".join(runs)
+
+        def content_text(content: List[dict]) -> str:
+            texts = []
+            for element in content:
+                if "paragraph" in element:
+                    texts.append(paragraph_text(element["paragraph"]))
+                elif "table" in element:
+                    texts.append(
+                        "".join(
+                            content_text(cell.get("content", []))
+                            for row in element["table"].get("tableRows", [])
+                            for cell in row.get("tableCells", [])
+                        )
+                    )
+                elif "tableOfContents" in element:
+                    texts.append(
+                        content_text(element["tableOfContents"].get("content", []))
+                    )
+            return "".join(texts)
+
+        for element in (self.document or {}).get("body", {}).get("content", []):
+            start = element.get("startIndex", 0)
+            end = element.get("endIndex", start)
+            if "paragraph" in element:
+                paragraph = element["paragraph"]
+                style = paragraph.get("paragraphStyle", {}).get("namedStyleType")
+                kind = "heading" if _is_heading(style) else "paragraph"
+                elements.append(
+                    DocElement(kind, start, end, paragraph_text(paragraph), style)
+                )
+            elif "table" in element:
+                cells = tuple(
+                    tuple(
+                        content_text(cell.get("content", []))
+                        for cell in row.get("tableCells", [])
+                    )
+                    for row in element["table"].get("tableRows", [])
+                )
+                elements.append(
+                    DocElement(
+                        "table",
+                        start,
+                        end,
+                        "".join(cell for row in cells for cell in row),
+                        cells=cells,
+                    )
+                )
+            elif "tableOfContents" in element:
+                content_text(element["tableOfContents"].get("content", []))
+        self._elements = elements
+        self._text = DocText("".join(text), offsets, indices)
+
+    def elements(self) -> List[DocElement]:
+        """Get the paragraphs, headings and tables of the body.
+
+        The document is loaded if needed. The elements and the text view are
+        extracted in a single pass and cached until the document is loaded
+        again.
+
+        Returns
+        -------
+        List[DocElement]
+            The top level elements in document order. Paragraphs inside table
+            cells are part of the table element.
+
+        """
+        if self._elements is None:
+            self._extract()
+        return self._elements  # type: ignore
+
+    def headings(self) -> List[DocElement]:
+        """Get the headings of the body.
+
+        Returns
+        -------
+        List[DocElement]
+            The headings in document order
+
+        """
+        return [element for element in self.elements() if element.kind == "heading"]
+
+    @property
+    def text(self) -> DocText:
+        """Get the cached plain text view of the body."""
+        if self._text is None:
+            self._extract()
+        return self._text  # type: ignore
+
+    def edit(self) -> DocEdit:
+        """Start collecting edits of the document.
+
+        The document is loaded if needed, all indices passed to the builder
+        refer to the loaded revision.
+
+        Returns
+        -------
+        DocEdit
+            The edit builder
+
+        """
+        if self.document is None:
+            self.load()
+        return DocEdit(self)
@@ -1,9 +1,320 @@
 """Google Drive API wrapper."""
 
-from typing import Optional
-import copy
+import functools
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+from googleapiclient.errors import HttpError
+from .batching import BatchResult, accept_status, execute_paced
+from .journal import JobJournal
+from .quota import QuotaLimiter
 from .sessions import DriveSession
-from .constants.drive_constants import SHARED_DRIVE
+from .store import SQLiteStore
+from .constants.drive_constants import FILE_FIELDS, FOLDER_MIME_TYPE, SHARED_DRIVE
+
+# The maximum page size of files.list
+MAX_PAGE_SIZE = 1000
+# Number of folders queried at once with "'a' in parents or 'b' in parents"
+PARENTS_PER_QUERY = 50
+# Number of listed files written to a DriveIndex per transaction
+INDEX_CHUNK_SIZE = 1000
+# Namespace of the request IDs derived from drive keys
+DRIVE_REQUEST_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "googau:shared-drives")
+# Journal key prefix of the IDs of created shared drives
+_DRIVE_KEY_PREFIX = "drive:"
+
+
+def drive_request_id(key: str) -> str:
+    """Derive a deterministic request ID for creating a shared drive.
+
+    `drives.create` is idempotent by request ID: sending the same ID again
+    never creates a second drive, so creates can be retried safely.
+
+    Parameters
+    ----------
+    key : str
+        The stable external key of the drive, e.g. an ID of the source system
+
+    Returns
+    -------
+    str
+        The request ID (UUID5)
+
+    """
+    return str(uuid.uuid5(DRIVE_REQUEST_NAMESPACE, key))
+
+
+def _drive_body(name: str, **fields) -> dict:
+    """Build the body of a new shared drive from the template.
+
+    The template is merged shallowly instead of deep-copied per call, its
+    nested dictionaries are shared but never modified.
+    """
+    return {**SHARED_DRIVE, "name": name, **fields}
+
+
+class DriveFile(NamedTuple):
+    """Compact record of a file in a listing."""
+
+    id: str
+    name: str
+    mimeType: str
+    parents: Tuple[str, ...] = ()
+    modifiedTime: Optional[str] = None
+    size: Optional[int] = None
+    md5Checksum: Optional[str] = None
+
+    @classmethod
+    def from_api(cls, file: dict) -> "DriveFile":
+        """Create a record from a file resource of the Drive API."""
+        return cls(
+            id=file["id"],
+            name=file.get("name", ""),
+            mimeType=file.get("mimeType", ""),
+            parents=tuple(file.get("parents", ())),
+            modifiedTime=file.get("modifiedTime"),
+            size=int(file["size"]) if "size" in file else None,
+            md5Checksum=file.get("md5Checksum"),
+        )
+
+    @property
+    def is_folder(self) -> bool:
+        """Check whether the file is a folder."""
+        return self.mimeType == FOLDER_MIME_TYPE
+
+
+class DriveIndex(SQLiteStore):
+    """Persistent local index of the files of shared drives.
+
+    Files are kept in a SQLite database keyed by drive and file ID, together
+    with the changes page token of every drive. Lookups by name, parent,
+    mimeType and modifiedTime are served from indexed columns without calling
+    the API. Use `SharedDrive.sync_index` to seed and update the index.
+    The index is safe to share between threads.
+    """
+
+    _schema = (
+        "CREATE TABLE IF NOT EXISTS files (drive_id TEXT NOT NULL, "
+        "file_id TEXT NOT NULL, name TEXT NOT NULL, mime_type TEXT NOT NULL, "
+        "parent TEXT, modified_time TEXT, size INTEGER, md5_checksum TEXT, "
+        "PRIMARY KEY (drive_id, file_id))",
+        *(
+            f"CREATE INDEX IF NOT EXISTS files_{column} "  # nosec
+            f"ON files (drive_id, {column})"
+            for column in ("name", "parent", "mime_type", "modified_time")
+        ),
+        "CREATE TABLE IF NOT EXISTS page_tokens "
+        "(drive_id TEXT PRIMARY KEY, token TEXT NOT NULL)",
+    )
+
+    def __init__(self, path: str = "googau_drive_index.sqlite3"):
+        """Open (or create) a drive index.
+
+        Parameters
+        ----------
+        path : str, optional
+            Path to the SQLite database file, by default "googau_drive_index.sqlite3".
+            Use ":memory:" for an index that only lives as long as the object.
+
+        """
+        super().__init__(path)
+
+    def page_token(self, drive_id: str) -> Optional[str]:
+        """Get the changes page token of the last completed sync of a drive.
+
+        Parameters
+        ----------
+        drive_id : str
+            The shared drive id
+
+        Returns
+        -------
+        Optional[str]
+            The page token, None if the drive was never synced
+
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT token FROM page_tokens WHERE drive_id = ?", (drive_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_page_token(self, drive_id: str, token: str) -> None:
+        """Save the changes page token to continue the next sync from.
+
+        Parameters
+        ----------
+        drive_id : str
+            The shared drive id
+        token : str
+            The page token
+
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO page_tokens (drive_id, token) VALUES (?, ?)",
+                (drive_id, token),
+            )
+
+    def apply(
+        self, drive_id: str, updated: Iterable[DriveFile], removed: Iterable[str]
+    ) -> None:
+        """Insert or update and remove files in a single transaction.
+
+        Parameters
+        ----------
+        drive_id : str
+            The shared drive id
+        updated : Iterable[DriveFile]
+            The new or changed files
+        removed : Iterable[str]
+            The IDs of the removed or trashed files
+
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO files (drive_id, file_id, name, mime_type, "
+                "parent, modified_time, size, md5_checksum) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        drive_id,
+                        file.id,
+                        file.name,
+                        file.mimeType,
+                        # Files in shared drives have exactly one parent
+                        file.parents[0] if file.parents else None,
+                        file.modifiedTime,
+                        file.size,
+                        file.md5Checksum,
+                    )
+                    for file in updated
+                ],
+            )
+            self._connection.executemany(
+                "DELETE FROM files WHERE drive_id = ? AND file_id = ?",
+                [(drive_id, file_id) for file_id in removed],
+            )
+
+    def clear(self, drive_id: str) -> None:
+        """Forget the files and the page token of a drive.
+
+        Parameters
+        ----------
+        drive_id : str
+            The shared drive id
+
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM files WHERE drive_id = ?", (drive_id,)
+            )
+            self._connection.execute(
+                "DELETE FROM page_tokens WHERE drive_id = ?", (drive_id,)
+            )
+
+    @staticmethod
+    def _to_file(row: tuple) -> DriveFile:
+        """Create a record from a row of the files table."""
+        file_id, name, mime_type, parent, modified_time, size, md5_checksum = row
+        return DriveFile(
+            file_id,
+            name,
+            mime_type,
+            (parent,) if parent is not None else (),
+            modified_time,
+            size,
+            md5_checksum,
+        )
+
+    def get(self, drive_id: str, file_id: str) -> Optional[DriveFile]:
+        """Get an indexed file.
+
+        Parameters
+        ----------
+        drive_id : str
+            The shared drive id
+        file_id : str
+            The file id
+
+        Returns
+        -------
+        Optional[DriveFile]
+            The file, None if it is not in the index
+
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT file_id, name, mime_type, parent, modified_time, size, "
+                "md5_checksum FROM files WHERE drive_id = ? AND file_id = ?",
+                (drive_id, file_id),
+            ).fetchone()
+        return self._to_file(row) if row else None
+
+    def find(
+        self,
+        drive_id: str,
+        name: Optional[str] = None,
+        parent: Optional[str] = None,
+        mime_type: Optional[str] = None,
+        modified_after: Optional[str] = None,
+        modified_before: Optional[str] = None,
+    ) -> List[DriveFile]:
+        """Find indexed files of a drive.
+
+        All given criteria must match.
+
+        Parameters
+        ----------
+        drive_id : str
+            The shared drive id
+        name : Optional[str], optional
+            The exact file name, by default None
+        parent : Optional[str], optional
+            The id of the parent folder, by default None
+        mime_type : Optional[str], optional
+            The MIME type, by default None
+        modified_after : Optional[str], optional
+            Only files modified at or after this RFC 3339 UTC timestamp,
+            by default None
+        modified_before : Optional[str], optional
+            Only files modified before this RFC 3339 UTC timestamp, by default None
+
+        Returns
+        -------
+        List[DriveFile]
+            The matching files, ordered by name
+
+        """
+        # RFC 3339 UTC timestamps sort lexicographically
+        conditions = ["drive_id = ?"]
+        params: List = [drive_id]
+        for condition, value in (
+            ("name = ?", name),
+            ("parent = ?", parent),
+            ("mime_type = ?", mime_type),
+            ("modified_time >= ?", modified_after),
+            ("modified_time < ?", modified_before),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT file_id, name, mime_type, parent, modified_time, size, "  # nosec
+                f"md5_checksum FROM files WHERE {' AND '.join(conditions)} "
+                "ORDER BY name",
+                params,
+            ).fetchall()
+        return [self._to_file(row) for row in rows]
 
 
 class SharedDrive(object):
@@ -26,12 +337,108 @@ class SharedDrive(object):
         self.drive_id = drive_id
         self.session = session
 
-    def get_drive_contents(self, drive_id: Optional[str]):
+    def _list_files(
+        self, drive_id: str, query: str, page_token: Optional[str], http=None
+    ) -> dict:
+        """Fetch a page of files of a shared drive matching a query."""
+        request = self.session.service.files().list(
+            corpora="drive",
+            driveId=drive_id,
+            includeItemsFromAllDrives=True,
+            supportsAllDrives=True,
+            pageSize=MAX_PAGE_SIZE,
+            pageToken=page_token,
+            q=query,
+            fields=f"nextPageToken,files({FILE_FIELDS})",
+        )
+        return request.execute(http=http) if http is not None else request.execute()
+
+    def get_drive_contents(
+        self,
+        drive_id: Optional[str] = None,
+        recursive: bool = False,
+        folder_id: Optional[str] = None,
+        max_workers: int = 4,
+        journal: Optional[JobJournal] = None,
+    ) -> Iterator[DriveFile]:
         """Get the contents of a shared drive.
 
-        TODO: Implement this method.
+        Files are streamed as compact records while the listing is in progress.
+        The flat listing pages through all files of the drive. The recursive
+        listing walks the folder tree level by level from `folder_id`,
+        querying many parent folders at once and listing them concurrently.
+
+        Parameters
+        ----------
+        drive_id : Optional[str], optional
+            The shared drive id, by default the id of this shared drive
+        recursive : bool, optional
+            Walk the folder tree instead of listing all files, by default False
+        folder_id : Optional[str], optional
+            The folder to start the recursive listing at, by default the drive root
+        max_workers : int, optional
+            The number of concurrent listings of the recursive mode, by default 4
+        journal : Optional[JobJournal], optional
+            A job journal to record the pages of the flat listing in,
+            by default None. Pages recorded by a previous run with the same
+            job ID are not fetched again.
+
+        Yields
+        ------
+        DriveFile
+            The files and folders of the drive, except trashed ones
+
         """
         drive_id = drive_id or self.drive_id
+        if drive_id is None:
+            raise ValueError("No Drive ID provided.")
+        if not recursive:
+            query = "trashed = false"
+
+            def fetch_page(page_token: Optional[str]) -> dict:
+                return self._list_files(drive_id, query, page_token)  # type: ignore
+
+            if journal is not None:
+                pages = journal.paginate(fetch_page, "files")
+                yield from (DriveFile.from_api(file) for file in pages)
+                return
+            page_token = None
+            while True:
+                response = fetch_page(page_token)
+                yield from (DriveFile.from_api(file) for file in response["files"])
+                page_token = response.get("nextPageToken")
+                if not page_token:
+                    return
+
+        def list_children(parents: List[str]) -> List[DriveFile]:
+            query = (
+                "("
+                + " or ".join(f"'{parent}' in parents" for parent in parents)
+                + ") and trashed = false"
+            )
+            http = self.session.thread_http()
+            files = []
+            page_token = None
+            while True:
+                response = self._list_files(drive_id, query, page_token, http)  # type: ignore
+                files.extend(DriveFile.from_api(file) for file in response["files"])
+                page_token = response.get("nextPageToken")
+                if not page_token:
+                    return files
+
+        level = [folder_id or drive_id]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while level:
+                futures = [
+                    executor.submit(list_children, level[i : i + PARENTS_PER_QUERY])
+                    for i in range(0, len(level), PARENTS_PER_QUERY)
+                ]
+                level = []
+                for future in as_completed(futures):
+                    for file in future.result():
+                        if file.is_folder:
+                            level.append(file.id)
+                        yield file
 
     def create(self, request_id: str, name: str, **kwargs) -> dict:
         """Create a shared drive.
@@ -51,10 +458,10 @@ class SharedDrive(object):
             The response from the API call.
 
         """
-        drive_template = copy.deepcopy(SHARED_DRIVE)
-        drive_template["name"] = name
         if "orgUnitId" in kwargs:
-            drive_template["orgUnitId"] = kwargs["orgUnitId"]
+            drive_template = _drive_body(name, orgUnitId=kwargs["orgUnitId"])
+        else:
+            drive_template = _drive_body(name)
 
         response = self.session.session.create(
             requestId=request_id, body=drive_template
@@ -89,3 +496,262 @@ class SharedDrive(object):
             return {"error": "No Drive ID provided."}
         response = self.session.session.unhide(driveId=self.drive_id).execute()
         return response
+
+    def create_drives(
+        self,
+        specs: List[dict],
+        limiter: Optional[QuotaLimiter] = None,
+        journal: Optional[JobJournal] = None,
+    ) -> Dict[str, BatchResult]:
+        """Create many shared drives using HTTP batch requests.
+
+        Every drive is created with a request ID derived from its key, so
+        rerunning a partially completed job never creates duplicates. The key
+        must be stable and unique per drive, e.g. an ID of the source system,
+        names are not accepted as keys since they may change or repeat.
+
+        A rerun gets a 409 conflict for the drives created before. With a
+        journal the ID of every created drive is recorded, and such a
+        conflict counts as success without a response if the recorded drive
+        still exists. Without a recorded drive the conflict is reported as an
+        error, since the request ID may belong to a deleted drive.
+
+        Parameters
+        ----------
+        specs : List[dict]
+            The drives to create. Every spec has a "key", a "name" and
+            optionally further drive fields such as "orgUnitId" or
+            "restrictions".
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter, by default 10 requests per second
+        journal : Optional[JobJournal], optional
+            A job journal to record the IDs of the created drives in,
+            by default None
+
+        Returns
+        -------
+        Dict[str, BatchResult]
+            The outcome of every create, keyed by drive key
+
+        Raises
+        ------
+        ValueError
+            If a spec has no key
+
+        """
+        missing = [spec["name"] for spec in specs if not spec.get("key")]
+        if missing:
+            raise ValueError(f"Shared drive specs without a key: {missing}")
+        requests = {}
+        for spec in specs:
+            fields = {k: v for k, v in spec.items() if k not in ("key", "name")}
+            requests[spec["key"]] = functools.partial(
+                self.session.session.create,
+                requestId=drive_request_id(spec["key"]),
+                body=_drive_body(spec["name"], **fields),
+            )
+
+        def exists(key: str, error: HttpError) -> bool:
+            # The request ID is also in use if its drive was deleted since
+            if journal is None or not accept_status(409)(key, error):
+                return False
+            journal_key = f"{_DRIVE_KEY_PREFIX}{key}"
+            drive_id = journal.payloads([journal_key]).get(journal_key)
+            if drive_id is None:
+                return False
+            try:
+                self.session.session.get(driveId=drive_id, fields="id").execute()
+            except HttpError:
+                return False
+            return True
+
+        def record(result: BatchResult) -> None:
+            if result.response is not None:
+                journal.record(  # type: ignore
+                    {f"{_DRIVE_KEY_PREFIX}{result.key}": result.response["id"]}
+                )
+
+        return execute_paced(
+            self.session.service,
+            requests,
+            limiter,
+            accept=exists,
+            on_success=record if journal is not None else None,
+        )
+
+    def update_drives(
+        self,
+        updates: Dict[str, dict],
+        limiter: Optional[QuotaLimiter] = None,
+        **kwargs,
+    ) -> Dict[str, BatchResult]:
+        """Update many shared drives using HTTP batch requests.
+
+        Parameters
+        ----------
+        updates : Dict[str, dict]
+            The fields to change, keyed by drive id
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter, by default 10 requests per second
+        **kwargs : dict
+            Additional arguments for `drives.update`, e.g. `useDomainAdminAccess`
+
+        Returns
+        -------
+        Dict[str, BatchResult]
+            The outcome of every update, keyed by drive id
+
+        """
+        return execute_paced(
+            self.session.service,
+            {
+                drive_id: functools.partial(
+                    self.session.session.update, driveId=drive_id, body=body, **kwargs
+                )
+                for drive_id, body in updates.items()
+            },
+            limiter,
+        )
+
+    def hide_drives(
+        self, drive_ids: List[str], limiter: Optional[QuotaLimiter] = None
+    ) -> Dict[str, BatchResult]:
+        """Hide many shared drives using HTTP batch requests.
+
+        Parameters
+        ----------
+        drive_ids : List[str]
+            The shared drive ids
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter, by default 10 requests per second
+
+        Returns
+        -------
+        Dict[str, BatchResult]
+            The outcome of every hide, keyed by drive id
+
+        """
+        return execute_paced(
+            self.session.service,
+            {
+                drive_id: functools.partial(self.session.session.hide, driveId=drive_id)
+                for drive_id in drive_ids
+            },
+            limiter,
+        )
+
+    def unhide_drives(
+        self, drive_ids: List[str], limiter: Optional[QuotaLimiter] = None
+    ) -> Dict[str, BatchResult]:
+        """Unhide many shared drives using HTTP batch requests.
+
+        Parameters
+        ----------
+        drive_ids : List[str]
+            The shared drive ids
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter, by default 10 requests per second
+
+        Returns
+        -------
+        Dict[str, BatchResult]
+            The outcome of every unhide, keyed by drive id
+
+        """
+        return execute_paced(
+            self.session.service,
+            {
+                drive_id: functools.partial(
+                    self.session.session.unhide, driveId=drive_id
+                )
+                for drive_id in drive_ids
+            },
+            limiter,
+        )
+
+    def sync_index(self, index: DriveIndex, drive_id: Optional[str] = None) -> Dict:
+        """Synchronize the files of the shared drive into a local index.
+
+        The first sync saves the current changes page token and seeds the
+        index with a full listing. Later syncs only fetch the changes since
+        the saved token with `changes.list` and apply them to the index.
+
+        Every page of changes is applied in one transaction and the page token
+        is saved after it, so an interrupted sync continues where it stopped.
+
+        Parameters
+        ----------
+        index : DriveIndex
+            The local file index
+        drive_id : Optional[str], optional
+            The shared drive id, by default the id of this shared drive
+
+        Returns
+        -------
+        Dict
+            Whether the index was seeded ("full_sync"). A seed only reports the
+            number of indexed files ("indexed"), the files themselves are in
+            the index. An update reports the new or changed files ("updated")
+            and the IDs of the removed files ("removed").
+
+        """
+        drive_id = drive_id or self.drive_id
+        if drive_id is None:
+            raise ValueError("No Drive ID provided.")
+        service = self.session.service
+        page_token = index.page_token(drive_id)
+        if page_token is None:
+            # Take the token before listing so no change during the listing is lost
+            start_token = (
+                service.changes()
+                .getStartPageToken(driveId=drive_id, supportsAllDrives=True)
+                .execute()["startPageToken"]
+            )
+            index.clear(drive_id)
+            indexed = 0
+            chunk: List[DriveFile] = []
+            for file in self.get_drive_contents(drive_id):
+                chunk.append(file)
+                if len(chunk) == INDEX_CHUNK_SIZE:
+                    index.apply(drive_id, chunk, [])
+                    indexed += len(chunk)
+                    chunk = []
+            index.apply(drive_id, chunk, [])
+            indexed += len(chunk)
+            index.set_page_token(drive_id, start_token)
+            return {"indexed": indexed, "full_sync": True}
+        updated: List[DriveFile] = []
+        removed: List[str] = []
+        while True:
+            response = (
+                service.changes()
+                .list(
+                    driveId=drive_id,
+                    pageToken=page_token,
+                    pageSize=MAX_PAGE_SIZE,
+                    includeItemsFromAllDrives=True,
+                    supportsAllDrives=True,
+                    includeRemoved=True,
+                    fields="nextPageToken,newStartPageToken,"
+                    f"changes(changeType,fileId,removed,file({FILE_FIELDS},trashed))",
+                )
+                .execute()
+            )
+            page_updated = []
+            page_removed = []
+            for change in response.get("changes", []):
+                if change.get("changeType", "file") != "file":
+                    continue
+                file = change.get("file")
+                if change.get("removed") or file is None or file.get("trashed"):
+                    page_removed.append(change["fileId"])
+                else:
+                    page_updated.append(DriveFile.from_api(file))
+            index.apply(drive_id, page_updated, page_removed)
+            updated.extend(page_updated)
+            removed.extend(page_removed)
+            page_token = response.get("nextPageToken") or response["newStartPageToken"]
+            index.set_page_token(drive_id, page_token)  # type: ignore
+            if "nextPageToken" not in response:
+                break
+        return {"updated": updated, "removed": removed, "full_sync": False}
@@ -0,0 +1,489 @@
+"""Drive file content helpers."""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+
+from .batching import BatchResult, execute_batched
+from .constants.drive_constants import EXPORT_EXTENSIONS, EXPORT_FORMATS
+from .journal import JobJournal
+from .quota import QuotaLimiter, execute_with_retries
+from .sessions import FilesSession
+
+# Resumable upload chunks must be a multiple of 256 KiB
+UPLOAD_CHUNK_ALIGNMENT = 256 * 1024
+DEFAULT_UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+DEFAULT_DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+EXPORT_FIELDS = "id,name,mimeType,modifiedTime"
+# Statuses of a resumable upload session that expired or is unknown
+EXPIRED_SESSION_STATUSES = (404, 410)
+
+# Called with the transferred bytes, the total bytes and the bytes per second
+ProgressCallback = Callable[[int, int, float], None]
+
+
+def file_md5(path: str, block_size: int = 1024 * 1024) -> str:
+    """Compute the MD5 checksum of a local file.
+
+    Parameters
+    ----------
+    path : str
+        The file path
+    block_size : int, optional
+        The number of bytes read at once, by default 1 MiB
+
+    Returns
+    -------
+    str
+        The hex digest, comparable to the `md5Checksum` of Drive files
+
+    """
+    digest = hashlib.md5()  # nosec
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _Progress(object):
+    """Thread-safe transfer progress that reports to a callback."""
+
+    def __init__(self, total: int, callback: Optional[ProgressCallback]):
+        self.total = total
+        self.done = 0
+        self._callback = callback
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def advance(self, size: int) -> None:
+        self._report(size=size)
+
+    def update(self, done: int) -> None:
+        self._report(done=done)
+
+    def _report(self, done: Optional[int] = None, size: int = 0) -> None:
+        with self._lock:
+            self.done = done if done is not None else self.done + size
+            if self._callback is not None:
+                elapsed = time.monotonic() - self._started
+                rate = self.done / elapsed if elapsed > 0 else 0.0
+                self._callback(self.done, self.total, rate)
+
+
+def _upload_status(http: Any, uri: str, size: int) -> Tuple[int, Optional[dict]]:
+    """Ask a resumable upload session how many bytes it received.
+
+    Parameters
+    ----------
+    http : Any
+        The HTTP client to send the status request with
+    uri : str
+        The URI of the upload session
+    size : int
+        The total size of the upload
+
+    Returns
+    -------
+    Tuple[int, Optional[dict]]
+        The number of received bytes and the file metadata if the upload
+        is complete
+
+    Raises
+    ------
+    HttpError
+        If the session cannot be queried, e.g. because it expired
+
+    """
+    resp, content = http.request(
+        uri,
+        method="PUT",
+        headers={"Content-Length": "0", "Content-Range": f"bytes */{size}"},
+    )
+    if resp.status in (200, 201):
+        return size, json.loads(content)
+    if resp.status != 308:
+        raise HttpError(resp, content, uri=uri)
+    # The Range header holds the received bytes, e.g. "bytes=0-4095"
+    received = resp.get("range")
+    return (int(received.rpartition("-")[2]) + 1 if received else 0), None
+
+
+class _ChunkDownload(object):
+    """The next chunk of a media download as a request for retries.
+
+    A failed chunk writes nothing and leaves the download at its previous
+    position, so executing it again resumes the download.
+    """
+
+    def __init__(self, downloader: MediaIoBaseDownload):
+        self.downloader = downloader
+
+    def execute(self) -> bool:
+        """Download the next chunk and report whether the download is done."""
+        _, done = self.downloader.next_chunk(num_retries=0)
+        return done
+
+
+class DriveFiles(object):
+    """Transfers the content of Drive files for the current session."""
+
+    session: FilesSession
+
+    def __init__(self, session: FilesSession, limiter: Optional[QuotaLimiter] = None):
+        """Construct a Drive files helper.
+
+        Parameters
+        ----------
+        session : FilesSession
+            A FilesSession instance
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter shared by all requests, by default None
+
+        """
+        self.session = session
+        self.limiter = limiter
+
+    def download(
+        self,
+        file_id: str,
+        path: str,
+        chunk_size: int = DEFAULT_DOWNLOAD_CHUNK_SIZE,
+        max_workers: int = 4,
+        verify: bool = True,
+        progress: Optional[ProgressCallback] = None,
+    ) -> dict:
+        """Download the content of a file with concurrent range requests.
+
+        The local file is preallocated to the size of the Drive file and every
+        chunk is written to its offset as soon as it arrives, so at most
+        `max_workers` chunks are held in memory.
+
+        Parameters
+        ----------
+        file_id : str
+            The id of a binary (not Google Docs editors) file
+        path : str
+            The local path to write the content to
+        chunk_size : int, optional
+            The number of bytes per range request, by default 16 MiB
+        max_workers : int, optional
+            The number of concurrent range requests, by default 4
+        verify : bool, optional
+            Compare the MD5 checksum of the download with the `md5Checksum`
+            of the file, by default True
+        progress : Optional[ProgressCallback], optional
+            Called with the downloaded bytes, the total bytes and the bytes
+            per second after every chunk, by default None
+
+        Returns
+        -------
+        dict
+            The file metadata (id, name, size and md5Checksum)
+
+        """
+        metadata = execute_with_retries(
+            self.session.session.get(
+                fileId=file_id,
+                fields="id,name,size,md5Checksum",
+                supportsAllDrives=True,
+            ),
+            limiter=self.limiter,
+        )
+        if "size" not in metadata:
+            raise ValueError(
+                f"File {file_id} has no binary content, export it instead."
+            )
+        size = int(metadata["size"])
+        with open(path, "wb") as file:
+            file.truncate(size)
+        tracker = _Progress(size, progress)
+
+        def fetch(start: int) -> None:
+            end = min(start + chunk_size, size) - 1
+            request = self.session.session.get_media(
+                fileId=file_id, supportsAllDrives=True
+            )
+            request.headers["Range"] = f"bytes={start}-{end}"
+            content = execute_with_retries(
+                request, http=self.session.thread_http(), limiter=self.limiter
+            )
+            with open(path, "r+b") as file:
+                file.seek(start)
+                file.write(content)
+            tracker.advance(len(content))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Consume the results to raise the errors of failed chunks
+            list(executor.map(fetch, range(0, size, chunk_size)))
+        if verify and metadata.get("md5Checksum") != file_md5(path):
+            raise ValueError(f"Checksum mismatch for the download of {file_id}")
+        return metadata
+
+    def upload(
+        self,
+        path: str,
+        metadata: Optional[dict] = None,
+        file_id: Optional[str] = None,
+        mime_type: Optional[str] = None,
+        chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+        journal: Optional[JobJournal] = None,
+        verify: bool = True,
+        progress: Optional[ProgressCallback] = None,
+    ) -> dict:
+        """Upload a local file with the resumable upload protocol.
+
+        The file is sent in chunks. With a journal the session URI and the
+        confirmed progress are recorded after every chunk, and a rerun with
+        the same job ID asks the session for the bytes it received and resumes
+        the upload from there instead of starting over. An expired session is
+        dropped from the journal and the upload starts over in a new one.
+
+        Parameters
+        ----------
+        path : str
+            The local file path
+        metadata : Optional[dict], optional
+            The file metadata, e.g. name and parents, by default None
+        file_id : Optional[str], optional
+            Replace the content of this file instead of creating a new file,
+            by default None
+        mime_type : Optional[str], optional
+            The MIME type of the content, by default guessed from the path
+        chunk_size : int, optional
+            The number of bytes per chunk, rounded down to a multiple of
+            256 KiB, by default 16 MiB
+        journal : Optional[JobJournal], optional
+            A job journal to record the upload session in, by default None
+        verify : bool, optional
+            Compare the `md5Checksum` of the uploaded file with the local file,
+            by default True
+        progress : Optional[ProgressCallback], optional
+            Called with the uploaded bytes, the total bytes and the bytes per
+            second after every chunk, by default None
+
+        Returns
+        -------
+        dict
+            The metadata of the uploaded file (id, name, size and md5Checksum)
+
+        """
+        key = f"upload:{os.path.abspath(path)}"
+        state = journal.payloads([key]).get(key) if journal is not None else None
+        if state is not None and "response" in state:
+            return state["response"]
+        chunk_size = max(1, chunk_size // UPLOAD_CHUNK_ALIGNMENT)
+        media = MediaFileUpload(
+            path,
+            mimetype=mime_type,
+            chunksize=chunk_size * UPLOAD_CHUNK_ALIGNMENT,
+            resumable=True,
+        )
+        params = {
+            "body": metadata or {},
+            "media_body": media,
+            "fields": "id,name,size,md5Checksum",
+            "supportsAllDrives": True,
+        }
+        if file_id is None:
+            request = self.session.session.create(**params)
+        else:
+            request = self.session.session.update(fileId=file_id, **params)
+        response = None
+        if state is not None:
+            try:
+                received, response = _upload_status(
+                    request.http, state["uri"], media.size()
+                )
+            except HttpError as error:
+                if error.resp.status not in EXPIRED_SESSION_STATUSES:
+                    raise
+                logging.warning(f"Upload session of {path} expired, starting over")
+                journal.discard([key])  # type: ignore
+            else:
+                request.resumable_uri = state["uri"]
+                request.resumable_progress = received
+        tracker = _Progress(media.size(), progress)
+        while response is None:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            status, response = request.next_chunk(num_retries=5)
+            if status is not None:
+                tracker.update(status.resumable_progress)
+                if journal is not None:
+                    journal.record(
+                        {
+                            key: {
+                                "uri": request.resumable_uri,
+                                "progress": status.resumable_progress,
+                            }
+                        }
+                    )
+        tracker.update(media.size())
+        if verify and response.get("md5Checksum") != file_md5(path):
+            raise ValueError(f"Checksum mismatch for the upload of {path}")
+        if journal is not None:
+            journal.record({key: {"response": response}})
+        return response
+
+    def _export_metadata(
+        self, file_ids: Optional[List[str]], query: Optional[str]
+    ) -> Iterator[BatchResult]:
+        """Get the metadata of the files to export."""
+        if query is not None:
+            page_token = None
+            while True:
+                response = execute_with_retries(
+                    self.session.session.list(
+                        q=query,
+                        pageSize=1000,
+                        pageToken=page_token,
+                        includeItemsFromAllDrives=True,
+                        supportsAllDrives=True,
+                        fields=f"nextPageToken,files({EXPORT_FIELDS})",
+                    ),
+                    limiter=self.limiter,
+                )
+                for file in response.get("files", []):
+                    yield BatchResult(file["id"], file)
+                page_token = response.get("nextPageToken")
+                if not page_token:
+                    return
+        results = execute_batched(
+            self.session.service,
+            {
+                file_id: functools.partial(
+                    self.session.session.get,
+                    fileId=file_id,
+                    supportsAllDrives=True,
+                    fields=EXPORT_FIELDS,
+                )
+                for file_id in file_ids or []
+            },
+            limiter=self.limiter,
+        )
+        yield from results.values()
+
+    def export(
+        self,
+        directory: str,
+        file_ids: Optional[List[str]] = None,
+        query: Optional[str] = None,
+        formats: Optional[Dict[str, str]] = None,
+        manifest: Optional[JobJournal] = None,
+        chunk_size: int = DEFAULT_DOWNLOAD_CHUNK_SIZE,
+        max_workers: int = 4,
+    ) -> Dict[str, BatchResult]:
+        """Export Google Workspace files to a directory.
+
+        The exports run concurrently and every export is streamed to disk in
+        chunks, each paced by the limiter and retried on transient errors. It
+        is written to a temporary file first, which is renamed when complete
+        and removed if the export fails. With a manifest, files whose `modifiedTime` is unchanged
+        since their last export are skipped.
+
+        Parameters
+        ----------
+        directory : str
+            The directory to write the exports to. The file names are the
+            file names with the file id and the extension of the format.
+        file_ids : Optional[List[str]], optional
+            The ids of the files to export, by default None
+        query : Optional[str], optional
+            A Drive query selecting the files to export instead of `file_ids`,
+            e.g. "'folder_id' in parents and trashed = false", by default None
+        formats : Optional[Dict[str, str]], optional
+            The export MIME type per Google Workspace MIME type, merged into
+            `EXPORT_FORMATS` (Docs and Slides as PDF, Sheets as XLSX),
+            by default None
+        manifest : Optional[JobJournal], optional
+            A job journal recording the modifiedTime and path of every export,
+            by default None
+        chunk_size : int, optional
+            The number of bytes per chunk, by default 16 MiB
+        max_workers : int, optional
+            The number of concurrent exports, by default 4
+
+        Returns
+        -------
+        Dict[str, BatchResult]
+            The outcome of every file keyed by file id. The response holds
+            the "path" of the export and whether it was "skipped".
+
+        """
+        if (file_ids is None) == (query is None):
+            raise ValueError("Provide either file_ids or query.")
+        formats = {**EXPORT_FORMATS, **(formats or {})}
+        os.makedirs(directory, exist_ok=True)
+
+        def export_file(file: dict) -> dict:
+            mime_type = formats.get(file["mimeType"])
+            if mime_type is None:
+                raise ValueError(f"No export format for {file['mimeType']}")
+            name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', "_", file.get("name", ""))
+            path = os.path.join(
+                directory,
+                f"{name}_{file['id']}{EXPORT_EXTENSIONS.get(mime_type, '')}",
+            )
+            if manifest is not None:
+                previous = manifest.payloads([file["id"]]).get(file["id"])
+                if (
+                    previous is not None
+                    and previous["modifiedTime"] == file.get("modifiedTime")
+                    and previous["mimeType"] == mime_type
+                    and os.path.exists(previous["path"])
+                ):
+                    return {"path": previous["path"], "skipped": True}
+            request = self.session.session.export_media(
+                fileId=file["id"], mimeType=mime_type
+            )
+            request.http = self.session.thread_http()
+            part = f"{path}.part"
+            try:
+                with open(part, "wb") as output:
+                    chunk = _ChunkDownload(
+                        MediaIoBaseDownload(output, request, chunksize=chunk_size)
+                    )
+                    # Every chunk is paced and retried on its own
+                    while not execute_with_retries(chunk, limiter=self.limiter):
+                        pass
+                os.replace(part, path)
+            except BaseException:
+                if os.path.exists(part):
+                    os.remove(part)
+                raise
+            if manifest is not None:
+                manifest.record(
+                    {
+                        file["id"]: {
+                            "modifiedTime": file.get("modifiedTime"),
+                            "mimeType": mime_type,
+                            "path": path,
+                        }
+                    }
+                )
+            return {"path": path, "skipped": False}
+
+        results: Dict[str, BatchResult] = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for result in self._export_metadata(file_ids, query):
+                if result.ok:
+                    futures[result.key] = executor.submit(export_file, result.response)
+                else:
+                    results[result.key] = result
+            for file_id, future in futures.items():
+                try:
+                    results[file_id] = BatchResult(file_id, future.result())
+                except Exception as error:  # pylint: disable=broad-except
+                    results[file_id] = BatchResult(file_id, None, error)
+        return results
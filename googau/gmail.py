@@ -9,8 +9,9 @@ from datetime import datetime
 from typing import Callable, Dict, List, Optional
 
 from googleapiclient.errors import HttpError
-from googleapiclient.http import BatchHttpRequest
+from googleapiclient.http import BatchHttpRequest, HttpRequest
 
+from .journal import JobJournal
 from .sessions import GmailSession
 
 
@@ -334,7 +335,10 @@ class GmailMailbox(object):
         return message
 
     def get_messages(
-        self, user_id: str = "me", msg_ids: Optional[List[str]] = None
+        self,
+        user_id: str = "me",
+        msg_ids: Optional[List[str]] = None,
+        journal: Optional[JobJournal] = None,
     ) -> List[Dict]:
         """Get a list of specific messages by their IDs using batch requests.
 
@@ -350,13 +354,22 @@ class GmailMailbox(object):
             The user ID for the search, by default "me"
         msg_ids : List[str], optional
             The list of message IDs to retrieve, by default []
+        journal : Optional[JobJournal], optional
+            A job journal to record fetched messages in, by default None.
+            Messages recorded by a previous run with the same job ID are
+            read from the journal instead of being fetched again.
 
         """
         if msg_ids is None:
             return []
 
-        messages = []
-        failed_ids = msg_ids.copy()
+        if journal is not None:
+            fetched = journal.payloads(msg_ids)
+            messages = list(fetched.values())
+            failed_ids = [msg_id for msg_id in msg_ids if msg_id not in fetched]
+        else:
+            messages = []
+            failed_ids = msg_ids.copy()
         request_id_to_msg_id: Dict = {}
         max_retries = 5
 
@@ -371,9 +384,12 @@ class GmailMailbox(object):
             ]
 
             for chunk in chunks:
+                chunk_messages: Dict[str, Dict] = {}
                 batch = self.session.service.new_batch_http_request(
                     callback=self._batch_callback(
-                        lambda response, msg_id: messages.append(response),
+                        lambda response, msg_id, found=chunk_messages: found.update(
+                            {msg_id: response}
+                        ),
                         request_id_to_msg_id,
                         failed_ids,
                     )
@@ -386,6 +402,9 @@ class GmailMailbox(object):
                     request_id_to_msg_id[request_id] = msg_id
 
                 self._execute_batch_with_retries(batch)
+                messages.extend(chunk_messages.values())
+                if journal is not None:
+                    journal.record(chunk_messages)
 
             if not failed_ids:
                 break
@@ -395,52 +414,133 @@ class GmailMailbox(object):
 
         return messages
 
-    def delete_messages(
-        self, user_id: str = "me", msg_ids: Optional[List[str]] = None
+    def _batch_apply(
+        self,
+        make_request: Callable[[List[str]], HttpRequest],
+        msg_ids: List[str],
+        chunk_size: int,
+        journal: Optional[JobJournal] = None,
     ) -> None:
-        """Delete a list of messages by their IDs using batch requests.
+        """Apply a bulk operation to message IDs in chunks using batch requests.
 
         Parameters
         ----------
-        user_id : str, optional
-            The user ID for the operation, by default "me"
-        msg_ids : List[str], optional
-            The list of message IDs to delete, by default None
+        make_request : Callable[[List[str]], HttpRequest]
+            Function that builds the bulk request for a chunk of message IDs
+        msg_ids : List[str]
+            The list of message IDs to apply the operation to
+        chunk_size : int
+            The number of message IDs per bulk request
+        journal : Optional[JobJournal], optional
+            A job journal to record completed chunks in, by default None
 
         """
-        if msg_ids is None:
-            return
-
-        failed_ids = msg_ids.copy()
+        failed_ids = journal.pending(msg_ids) if journal is not None else msg_ids.copy()
         request_id_to_msg_id: Dict = {}
 
-        # Split the list of messages that need to be deleted into chunks of 50
         chunks = [
-            failed_ids[i : i + 50] for i in range(0, len(failed_ids), 50)  # noqa: E203
+            failed_ids[i : i + chunk_size]  # noqa: E203
+            for i in range(0, len(failed_ids), chunk_size)
         ]
 
         for chunk in chunks:
+
+            def on_success(response, msg_id, chunk=chunk):
+                if journal is not None:
+                    journal.record_keys(chunk)
+
             batch = self.session.service.new_batch_http_request(
                 callback=self._batch_callback(
-                    lambda response, msg_id: None,  # No action needed on success
+                    on_success,
                     request_id_to_msg_id,
                     failed_ids,
                 )
             )
 
             # Add each chunk to the batch request
-            request = self.session.messages().batchDelete(
-                userId=user_id, body={"ids": chunk}
-            )
             request_id = str(uuid.uuid4())
-            batch.add(request, request_id=request_id)
+            batch.add(make_request(chunk), request_id=request_id)
             for msg_id in chunk:
                 request_id_to_msg_id[request_id] = msg_id
 
             self._execute_batch_with_retries(batch)
 
             # Google allows 250 quota credits per second
-            # Each batchDelete request is 50 quota credits
+            # Each batchDelete/batchModify request is 50 quota credits
             # We need to introduce a delay to comply with rate limits
             # 0.2 seconds delay allows for 5 operations per second
             time.sleep(0.2)
+
+    def delete_messages(
+        self,
+        user_id: str = "me",
+        msg_ids: Optional[List[str]] = None,
+        journal: Optional[JobJournal] = None,
+    ) -> None:
+        """Delete a list of messages by their IDs using batch requests.
+
+        Parameters
+        ----------
+        user_id : str, optional
+            The user ID for the operation, by default "me"
+        msg_ids : List[str], optional
+            The list of message IDs to delete, by default None
+        journal : Optional[JobJournal], optional
+            A job journal to record deleted chunks in, by default None.
+            Chunks recorded by a previous run with the same job ID are skipped.
+
+        """
+        if msg_ids is None:
+            return
+
+        # Split the list of messages that need to be deleted into chunks of 50
+        self._batch_apply(
+            lambda chunk: self.session.messages().batchDelete(
+                userId=user_id, body={"ids": chunk}
+            ),
+            msg_ids,
+            chunk_size=50,
+            journal=journal,
+        )
+
+    def modify_messages(
+        self,
+        user_id: str = "me",
+        msg_ids: Optional[List[str]] = None,
+        add_label_ids: Optional[List[str]] = None,
+        remove_label_ids: Optional[List[str]] = None,
+        journal: Optional[JobJournal] = None,
+    ) -> None:
+        """Add or remove labels on a list of messages using batch requests.
+
+        Parameters
+        ----------
+        user_id : str, optional
+            The user ID for the operation, by default "me"
+        msg_ids : List[str], optional
+            The list of message IDs to modify, by default None
+        add_label_ids : Optional[List[str]], optional
+            The label IDs to add to the messages, by default None
+        remove_label_ids : Optional[List[str]], optional
+            The label IDs to remove from the messages, by default None
+        journal : Optional[JobJournal], optional
+            A job journal to record modified chunks in, by default None.
+            Chunks recorded by a previous run with the same job ID are skipped.
+
+        """
+        if msg_ids is None:
+            return
+
+        body = {
+            "addLabelIds": add_label_ids or [],
+            "removeLabelIds": remove_label_ids or [],
+        }
+        # batchModify accepts up to 1000 IDs, keep chunks small enough to retry cheaply
+        self._batch_apply(
+            lambda chunk: self.session.messages().batchModify(
+                userId=user_id, body={"ids": chunk, **body}
+            ),
+            msg_ids,
+            chunk_size=50,
+            journal=journal,
+        )
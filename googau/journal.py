@@ -0,0 +1,238 @@
+"""Job journal for resumable bulk operations.
+
+Long-running bulk jobs (fetching or deleting hundreds of thousands of Gmail
+messages, writing large sheet ranges, listing big shared drives) keep their
+progress in memory only. If the process dies the whole job restarts from zero.
+
+The journal records completed work items in a small SQLite database, keyed by
+a job ID. Rerunning a job with the same job ID skips everything that was
+already recorded.
+"""
+
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .store import SQLiteStore
+
+DEFAULT_JOURNAL_PATH = "googau_journal.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    job_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT,
+    PRIMARY KEY (job_id, key)
+)
+"""
+
+# SQLite limits the number of host parameters in a single statement
+_MAX_QUERY_PARAMS = 900
+
+# Reserved key prefix for paginated listings
+_PAGE_KEY_PREFIX = "__page__:"
+
+
+class JobJournal(SQLiteStore):
+    """Persistent record of the completed work items of a job.
+
+    A work item is identified by a string key (a message ID, a cell range, a
+    page token). Items are recorded in chunks: every call to `record` is a
+    single transaction, so a crash never leaves a half-written chunk behind.
+
+    The journal is safe to share between threads.
+    """
+
+    job_id: str
+    _schema = (_SCHEMA,)
+
+    def __init__(self, job_id: str, path: str = DEFAULT_JOURNAL_PATH):
+        """Open (or create) the journal for a job.
+
+        Parameters
+        ----------
+        job_id : str
+            The ID of the job. Reruns with the same ID resume the job.
+        path : str, optional
+            Path to the SQLite database file, by default "googau_journal.sqlite3".
+            Use ":memory:" for a journal that only lives as long as the object.
+
+        """
+        self.job_id = job_id
+        super().__init__(path)
+
+    def _select(self, keys: List[str]) -> Dict[str, Optional[str]]:
+        """Return the recorded raw payloads for the given keys."""
+        found: Dict[str, Optional[str]] = {}
+        for i in range(0, len(keys), _MAX_QUERY_PARAMS):
+            chunk = keys[i : i + _MAX_QUERY_PARAMS]  # noqa: E203
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._connection.execute(
+                f"SELECT key, payload FROM journal "  # nosec
+                f"WHERE job_id = ? AND key IN ({placeholders})",
+                [self.job_id, *chunk],
+            )
+            found.update(rows)
+        return found
+
+    def is_done(self, key: str) -> bool:
+        """Check whether a work item has been recorded.
+
+        Parameters
+        ----------
+        key : str
+            The work item key
+
+        Returns
+        -------
+        bool
+            True if the work item has already been completed
+
+        """
+        with self._lock:
+            return key in self._select([key])
+
+    def pending(self, keys: Iterable[str]) -> List[str]:
+        """Filter out the keys that have already been recorded.
+
+        Parameters
+        ----------
+        keys : Iterable[str]
+            The keys of all work items of the job
+
+        Returns
+        -------
+        List[str]
+            The keys that still need to be processed, in their original order
+
+        """
+        keys = list(keys)
+        with self._lock:
+            done = self._select(keys)
+        return [key for key in keys if key not in done]
+
+    def record(self, items: Dict[str, Any]) -> None:
+        """Record a chunk of completed work items in a single transaction.
+
+        Parameters
+        ----------
+        items : Dict[str, Any]
+            Mapping of work item keys to JSON-serializable payloads.
+            Use None as payload when there is nothing to keep.
+
+        """
+        rows = [
+            (self.job_id, key, None if payload is None else json.dumps(payload))
+            for key, payload in items.items()
+        ]
+        if not rows:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO journal (job_id, key, payload) VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def record_keys(self, keys: Iterable[str]) -> None:
+        """Record a chunk of completed work items that have no payload.
+
+        Parameters
+        ----------
+        keys : Iterable[str]
+            The keys of the completed work items
+
+        """
+        self.record(dict.fromkeys(keys))
+
+    def payloads(self, keys: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Get the recorded payloads.
+
+        Parameters
+        ----------
+        keys : Optional[Iterable[str]], optional
+            Only return payloads for these keys, by default all recorded keys
+
+        Returns
+        -------
+        Dict[str, Any]
+            Mapping of recorded keys to their decoded payloads
+
+        """
+        with self._lock:
+            if keys is None:
+                rows = dict(
+                    self._connection.execute(
+                        "SELECT key, payload FROM journal WHERE job_id = ?",
+                        (self.job_id,),
+                    )
+                )
+            else:
+                rows = self._select(list(keys))
+        return {
+            key: None if payload is None else json.loads(payload)
+            for key, payload in rows.items()
+        }
+
+    def discard(self, keys: Iterable[str]) -> None:
+        """Forget recorded work items, e.g. to redo them from scratch.
+
+        Parameters
+        ----------
+        keys : Iterable[str]
+            The keys of the work items
+
+        """
+        rows = [(self.job_id, key) for key in keys]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM journal WHERE job_id = ? AND key = ?", rows
+            )
+
+    def clear(self) -> None:
+        """Forget all recorded work items of the job."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM journal WHERE job_id = ?", (self.job_id,)
+            )
+
+    def paginate(
+        self,
+        fetch_page: Callable[[Optional[str]], dict],
+        items_key: str,
+        next_page_key: str = "nextPageToken",
+    ) -> Iterator[dict]:
+        """Iterate over a paginated listing, recording every page.
+
+        Pages recorded by a previous run are replayed from the journal and the
+        listing continues from the first page token that was not recorded.
+
+        Parameters
+        ----------
+        fetch_page : Callable[[Optional[str]], dict]
+            Function that executes the list call for a page token
+            (None for the first page) and returns the response
+        items_key : str
+            The response key holding the listed items, e.g. "files"
+        next_page_key : str, optional
+            The response key holding the next page token, by default "nextPageToken"
+
+        Yields
+        ------
+        dict
+            The listed items
+
+        """
+        page_token: Optional[str] = None
+        while True:
+            key = f"{_PAGE_KEY_PREFIX}{page_token or ''}"
+            page = self.payloads([key]).get(key)
+            if page is None:
+                response = fetch_page(page_token)
+                page = {
+                    "items": response.get(items_key, []),
+                    "next": response.get(next_page_key),
+                }
+                self.record({key: page})
+            yield from page["items"]
+            page_token = page["next"]
+            if not page_token:
+                break
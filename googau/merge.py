@@ -0,0 +1,269 @@
+"""Template mail merge for Google Docs.
+
+Every row of data becomes a copy of a template document in which the
+placeholders ("{{column}}") are replaced by the values of the row. Templates
+are copied in HTTP batches, every document is filled by a single
+`batchUpdate` and the documents are filled concurrently under shared quota
+pacing. With a journal an interrupted merge resumes by row key.
+"""
+
+import functools
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from .batching import BatchResult, execute_batched
+from .journal import JobJournal
+from .quota import QuotaLimiter, execute_with_retries
+from .sessions import DocSession, FilesSession
+from .sheets import SpreadSheet
+
+# Default pacing of Drive and Docs API requests per second
+DEFAULT_RATE = 5.0
+# Journal key prefix of copies that were made but not filled yet
+_COPY_KEY_PREFIX = "copy:"
+
+
+def rows_from_sheet(
+    spreadsheet: SpreadSheet, sheet_title: str, **kwargs
+) -> Iterator[Dict[str, Any]]:
+    """Read the rows of a worksheet as dictionaries keyed by the header row.
+
+    Parameters
+    ----------
+    spreadsheet : SpreadSheet
+        The spreadsheet holding the data
+    sheet_title : str
+        The title of the worksheet, its first row holds the column names
+    **kwargs : dict
+        Additional arguments for `SpreadSheet.iter_rows`
+
+    Yields
+    ------
+    Dict[str, Any]
+        The rows, missing trailing cells as empty strings. Rows without any
+        value are skipped.
+
+    """
+    rows = spreadsheet.iter_rows(sheet_title, **kwargs)
+    header = next(rows, None)
+    if header is None:
+        return
+    for row in rows:
+        if all(value in ("", None) for value in row):
+            continue
+        yield dict(itertools.zip_longest(header, row[: len(header)], fillvalue=""))
+
+
+def _format_name(template: str, key_column: str, row: Dict[str, Any]) -> str:
+    """Format the name of a merged document from the columns of its row."""
+    return template.format(**{**row, "key": row[key_column]})
+
+
+class MailMerge(object):
+    """Creates filled copies of a template document."""
+
+    files_session: FilesSession
+    doc_session: DocSession
+    template_id: str
+
+    def __init__(
+        self,
+        files_session: FilesSession,
+        doc_session: DocSession,
+        template_id: str,
+        limiter: Optional[QuotaLimiter] = None,
+        journal: Optional[JobJournal] = None,
+    ):
+        """Construct a mail merge.
+
+        Parameters
+        ----------
+        files_session : FilesSession
+            A FilesSession instance
+        doc_session : DocSession
+            A DocSession instance
+        template_id : str
+            The id of the template document
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter shared by all requests, by default 5 requests
+            per second
+        journal : Optional[JobJournal], optional
+            A job journal to record the merged rows in, by default None.
+            Rows recorded by a previous run with the same job ID are skipped.
+
+        """
+        self.files_session = files_session
+        self.doc_session = doc_session
+        self.template_id = template_id
+        self.limiter = limiter or QuotaLimiter(DEFAULT_RATE, burst=20)
+        self.journal = journal
+
+    @staticmethod
+    def replacements(row: Dict[str, Any]) -> List[dict]:
+        """Build the replaceAllText requests for a row.
+
+        Parameters
+        ----------
+        row : Dict[str, Any]
+            The row, every column replaces the placeholder "{{column}}"
+
+        Returns
+        -------
+        List[dict]
+            The requests of the batchUpdate
+
+        """
+        return [
+            {
+                "replaceAllText": {
+                    "containsText": {"text": f"{{{{{column}}}}}", "matchCase": True},
+                    "replaceText": "" if value is None else str(value),
+                }
+            }
+            for column, value in row.items()
+        ]
+
+    def _copy(
+        self, rows: Dict[str, dict], name: Callable[[dict], str], parents: List[str]
+    ) -> Dict[str, BatchResult]:
+        """Copy the template for every row in HTTP batches.
+
+        Every copy is journaled as soon as its batch returns, so an interrupted
+        run never copies a row twice.
+        """
+        body = {"parents": parents} if parents else {}
+
+        def record(result: BatchResult) -> None:
+            self.journal.record(  # type: ignore
+                {f"{_COPY_KEY_PREFIX}{result.key}": result.response["id"]}
+            )
+
+        return execute_batched(
+            self.files_session.service,
+            {
+                key: functools.partial(
+                    self.files_session.session.copy,
+                    fileId=self.template_id,
+                    body={**body, "name": name(row)},
+                    supportsAllDrives=True,
+                    fields="id",
+                )
+                for key, row in rows.items()
+            },
+            limiter=self.limiter,
+            on_success=record if self.journal is not None else None,
+        )
+
+    def _fill(self, document_id: str, row: dict) -> dict:
+        """Replace the placeholders of a copy in one batchUpdate."""
+        return execute_with_retries(
+            self.doc_session.session.batchUpdate(
+                documentId=document_id, body={"requests": self.replacements(row)}
+            ),
+            http=self.doc_session.thread_http(),
+            limiter=self.limiter,
+        )
+
+    def run(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        key_column: str,
+        name: Union[str, Callable[[dict], str]] = "{key}",
+        parents: Optional[List[str]] = None,
+        batch_size: int = 50,
+        max_workers: int = 4,
+    ) -> Dict[str, BatchResult]:
+        """Merge rows into copies of the template.
+
+        Parameters
+        ----------
+        rows : Iterable[Dict[str, Any]]
+            The rows, e.g. from `rows_from_sheet`. Rows with an empty key are
+            skipped.
+        key_column : str
+            The column with the unique key of every row
+        name : Union[str, Callable[[dict], str]], optional
+            The name of the copies, a format string of the row columns ("{key}"
+            is the row key) or a function of the row, by default the row key
+        parents : Optional[List[str]], optional
+            The folder to create the copies in, by default the folder of the
+            template
+        batch_size : int, optional
+            The number of rows copied per HTTP batch, by default 50
+        max_workers : int, optional
+            The number of documents filled concurrently, by default 4
+
+        Returns
+        -------
+        Dict[str, BatchResult]
+            The outcome of every row keyed by row key, the response holds the
+            "documentId" of the merged document. If the copy was made but
+            could not be filled, the failed result still holds its
+            "documentId".
+
+        Raises
+        ------
+        ValueError
+            If two rows have the same key. The batches read before the
+            duplicate are merged already and skipped by a rerun with the same
+            journal.
+
+        """
+        if isinstance(name, str):
+            name = functools.partial(_format_name, name, key_column)
+        results: Dict[str, BatchResult] = {}
+        rows = iter(rows)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                chunk: Dict[str, dict] = {}
+                for row in batch:
+                    if row[key_column] in ("", None):
+                        logging.warning(f"Skipping a row without {key_column}")
+                        continue
+                    key = str(row[key_column])
+                    if key in chunk or key in results:
+                        raise ValueError(f"Duplicate row key: {key!r}")
+                    chunk[key] = row
+                keys = list(chunk)
+                copies: Dict[str, str] = {}
+                if self.journal is not None:
+                    done = self.journal.payloads(keys)
+                    for key, payload in done.items():
+                        results[key] = BatchResult(key, payload)
+                    keys = [key for key in keys if key not in done]
+                    # Copies made by an interrupted run are filled, not copied again
+                    copy_keys = [f"{_COPY_KEY_PREFIX}{key}" for key in keys]
+                    for copy_key, document_id in self.journal.payloads(
+                        copy_keys
+                    ).items():
+                        copies[copy_key[len(_COPY_KEY_PREFIX) :]] = document_id
+                to_copy = {key: chunk[key] for key in keys if key not in copies}
+                copied = self._copy(to_copy, name, parents or [])  # type: ignore
+                for key, result in copied.items():
+                    if result.ok:
+                        copies[key] = result.response["id"]
+                    else:
+                        results[key] = result
+                futures = {
+                    key: executor.submit(self._fill, document_id, chunk[key])
+                    for key, document_id in copies.items()
+                }
+                for key, future in futures.items():
+                    try:
+                        future.result()
+                    except Exception as error:  # pylint: disable=broad-except
+                        # The copy stays to be filled by a rerun or removed
+                        results[key] = BatchResult(
+                            key, {"documentId": copies[key]}, error
+                        )
+                        continue
+                    payload = {"documentId": copies[key]}
+                    if self.journal is not None:
+                        self.journal.record({key: payload})
+                    results[key] = BatchResult(key, payload)
+        return results
@@ -0,0 +1,262 @@
+"""Drive permission audit helpers.
+
+Permissions of many files are listed and changed with HTTP batch requests.
+A typical audit streams the permissions of every file of a shared drive,
+plans the changes and applies them after reviewing a dry run:
+
+    auditor = PermissionAuditor(session)
+    files = (file.id for file in drive.get_drive_contents(recursive=True))
+    changes = auditor.plan_changes(auditor.iter_permissions(files))
+    results = auditor.apply_changes(changes, dry_run=True)
+"""
+
+import functools
+import itertools
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+from .batching import BatchResult, accept_status, execute_batched
+from .quota import DEFAULT_BURST, DEFAULT_RATE, QuotaLimiter
+from .sessions import DriveSession, FilesSession
+
+# The maximum page size of permissions.list
+MAX_PAGE_SIZE = 100
+PERMISSION_FIELDS = "id,type,role,emailAddress,domain,allowFileDiscovery"
+# Roles that cannot be changed by a downgrade
+PROTECTED_ROLES = ("owner", "organizer")
+
+
+class PermissionRecord(NamedTuple):
+    """Normalized permission of a file."""
+
+    fileId: str
+    id: str
+    type: str
+    role: str
+    emailAddress: Optional[str] = None
+    domain: Optional[str] = None
+    allowFileDiscovery: Optional[bool] = None
+
+    @classmethod
+    def from_api(cls, file_id: str, permission: dict) -> "PermissionRecord":
+        """Create a record from a permission resource of the Drive API."""
+        return cls(
+            fileId=file_id,
+            id=permission["id"],
+            type=permission.get("type", ""),
+            role=permission.get("role", ""),
+            emailAddress=permission.get("emailAddress"),
+            domain=permission.get("domain"),
+            allowFileDiscovery=permission.get("allowFileDiscovery"),
+        )
+
+
+class PermissionChange(NamedTuple):
+    """Planned change of a permission, a removal if `role` is None."""
+
+    fileId: str
+    permissionId: str
+    role: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        """Get the key of the change in the results."""
+        return f"{self.fileId}/{self.permissionId}"
+
+
+class PermissionAuditor(object):
+    """Lists and changes the permissions of many Drive files."""
+
+    session: Union[DriveSession, FilesSession]
+
+    def __init__(
+        self,
+        session: Union[DriveSession, FilesSession],
+        limiter: Optional[QuotaLimiter] = None,
+        use_domain_admin_access: bool = False,
+    ):
+        """Construct a permission auditor.
+
+        Parameters
+        ----------
+        session : Union[DriveSession, FilesSession]
+            A session of the Drive API
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter shared by all batches, by default 10 requests
+            per second
+        use_domain_admin_access : bool, optional
+            Issue the requests as a domain administrator, by default False
+
+        """
+        self.session = session
+        self.limiter = limiter or QuotaLimiter(DEFAULT_RATE, burst=DEFAULT_BURST)
+        self.use_domain_admin_access = use_domain_admin_access
+
+    def iter_permissions(
+        self,
+        file_ids: Iterable[str],
+        batch_size: int = 50,
+        errors: Optional[Dict[str, Exception]] = None,
+    ) -> Iterator[PermissionRecord]:
+        """Stream the permissions of many files.
+
+        The permissions of `batch_size` files are listed per HTTP batch, the
+        further pages of files with many permissions in the following batches.
+
+        Parameters
+        ----------
+        file_ids : Iterable[str]
+            The file ids, e.g. from `SharedDrive.get_drive_contents`
+        batch_size : int, optional
+            The number of files per batch, by default 50
+        errors : Optional[Dict[str, Exception]], optional
+            A dictionary that receives the errors of files whose permissions
+            could not be listed, keyed by file id, by default None
+
+        Yields
+        ------
+        PermissionRecord
+            The permissions of the files
+
+        """
+        permissions = self.session.service.permissions()
+        file_ids = iter(file_ids)
+        # File ids with the token of their next page (None for the first page)
+        pending: Dict[str, Optional[str]] = {}
+        while True:
+            pending.update(
+                dict.fromkeys(
+                    itertools.islice(file_ids, max(batch_size - len(pending), 0))
+                )
+            )
+            if not pending:
+                return
+            results = execute_batched(
+                self.session.service,
+                {
+                    file_id: functools.partial(
+                        permissions.list,
+                        fileId=file_id,
+                        pageToken=page_token,
+                        pageSize=MAX_PAGE_SIZE,
+                        supportsAllDrives=True,
+                        useDomainAdminAccess=self.use_domain_admin_access,
+                        fields=f"nextPageToken,permissions({PERMISSION_FIELDS})",
+                    )
+                    for file_id, page_token in pending.items()
+                },
+                limiter=self.limiter,
+            )
+            pending = {}
+            for file_id, result in results.items():
+                if not result.ok:
+                    if errors is not None:
+                        errors[file_id] = result.error  # type: ignore
+                    continue
+                for permission in result.response.get("permissions", []):
+                    yield PermissionRecord.from_api(file_id, permission)
+                if result.response.get("nextPageToken"):
+                    pending[file_id] = result.response["nextPageToken"]
+
+    @staticmethod
+    def plan_changes(
+        records: Iterable[PermissionRecord],
+        remove_anyone: bool = True,
+        downgrade: Optional[Dict[str, str]] = None,
+        allowed_domains: Iterable[str] = (),
+    ) -> List[PermissionChange]:
+        """Plan the changes that bring permissions in line with a policy.
+
+        Parameters
+        ----------
+        records : Iterable[PermissionRecord]
+            The current permissions
+        remove_anyone : bool, optional
+            Remove "anyone" permissions (anyone with the link and public files),
+            by default True
+        downgrade : Optional[Dict[str, str]], optional
+            Roles to replace, e.g. {"writer": "reader"}, by default None.
+            Owners and organizers are never downgraded.
+        allowed_domains : Iterable[str], optional
+            Domains whose users, groups and domain permissions are exempt from
+            downgrades, by default none
+
+        Returns
+        -------
+        List[PermissionChange]
+            The planned changes
+
+        """
+        downgrade = downgrade or {}
+        allowed_domains = set(allowed_domains)
+        changes = []
+        for record in records:
+            if remove_anyone and record.type == "anyone":
+                changes.append(PermissionChange(record.fileId, record.id))
+                continue
+            domain = record.domain or (record.emailAddress or "").rpartition("@")[2]
+            if (
+                record.role in downgrade
+                and record.role not in PROTECTED_ROLES
+                and domain not in allowed_domains
+            ):
+                changes.append(
+                    PermissionChange(record.fileId, record.id, downgrade[record.role])
+                )
+        return changes
+
+    def apply_changes(
+        self, changes: Iterable[PermissionChange], dry_run: bool = False
+    ) -> Dict[str, BatchResult]:
+        """Apply planned permission changes using HTTP batch requests.
+
+        Parameters
+        ----------
+        changes : Iterable[PermissionChange]
+            The planned changes
+        dry_run : bool, optional
+            Only report the changes without sending any request, by default False
+
+        Returns
+        -------
+        Dict[str, BatchResult]
+            The outcome of every change keyed by "fileId/permissionId". In a
+            dry run every result holds the change as its response.
+
+        """
+        changes = list(changes)
+        if dry_run:
+            return {change.key: BatchResult(change.key, change) for change in changes}
+        permissions = self.session.service.permissions()
+        requests: Dict[str, Callable[[], Any]] = {}
+        for change in changes:
+            params = {
+                "fileId": change.fileId,
+                "permissionId": change.permissionId,
+                "supportsAllDrives": True,
+                "useDomainAdminAccess": self.use_domain_admin_access,
+            }
+            if change.role is None:
+                requests[change.key] = functools.partial(permissions.delete, **params)
+            else:
+                requests[change.key] = functools.partial(
+                    permissions.update, body={"role": change.role}, **params
+                )
+        removals = {change.key for change in changes if change.role is None}
+        # A permission that is already gone needs no removal
+        return execute_batched(
+            self.session.service,
+            requests,
+            limiter=self.limiter,
+            accept=lambda key, error: key in removals
+            and accept_status(404)(key, error),
+        )
@@ -0,0 +1,141 @@
+"""Quota pacing and retry helpers for Google API requests.
+
+Google APIs enforce per-user and per-project quotas. Bulk helpers share a
+`QuotaLimiter` to pace their requests and retry rate limited or failed
+requests with exponential backoff.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Optional
+
+from googleapiclient.errors import HttpError
+
+# Rate limit and server errors that are worth retrying
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+# Default pacing of bulk helpers in requests per second, and their burst
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 50
+
+
+class QuotaLimiter(object):
+    """Token bucket that paces requests to a quota.
+
+    The limiter is safe to share between threads and between helpers that
+    draw from the same quota.
+    """
+
+    rate: float
+    burst: float
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """Construct a quota limiter.
+
+        Parameters
+        ----------
+        rate : float
+            The number of quota units replenished per second
+        burst : Optional[float], optional
+            The maximum number of units that can be spent at once,
+            by default one second worth of quota
+
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost: float = 1.0) -> None:
+        """Block until `cost` quota units are available and spend them.
+
+        Parameters
+        ----------
+        cost : float, optional
+            The quota cost of the request, by default 1.0
+
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                # A request that costs more than the burst waits for a full bucket
+                needed = min(cost, self.burst)
+                if self._tokens >= needed:
+                    self._tokens -= cost
+                    return
+                wait_time = (needed - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Check whether a failed request is worth retrying.
+
+    Parameters
+    ----------
+    error : Exception
+        The error raised by the request
+
+    Returns
+    -------
+    bool
+        True for rate limit errors, server errors and connection errors
+
+    """
+    if isinstance(error, HttpError):
+        if error.resp.status == 403 and "rateLimitExceeded" in str(error):
+            return True
+        return error.resp.status in RETRYABLE_STATUSES
+    return isinstance(error, OSError)
+
+
+def execute_with_retries(
+    request: Any,
+    http: Any = None,
+    limiter: Optional[QuotaLimiter] = None,
+    cost: float = 1.0,
+    max_retries: int = 5,
+) -> Any:
+    """Execute a request, pacing it by quota and retrying transient errors.
+
+    Parameters
+    ----------
+    request : Any
+        The API request (an `HttpRequest`)
+    http : Any, optional
+        The HTTP client to execute the request with, by default the client
+        of the service. Pass `session.thread_http()` from worker threads.
+    limiter : Optional[QuotaLimiter], optional
+        The quota limiter to pace the request with, by default None
+    cost : float, optional
+        The quota cost of the request, by default 1.0
+    max_retries : int, optional
+        The maximum number of attempts, by default 5
+
+    Returns
+    -------
+    Any
+        The response of the request
+
+    """
+    for attempt in range(max_retries):
+        if limiter is not None:
+            limiter.acquire(cost)
+        try:
+            if http is None:
+                return request.execute()
+            return request.execute(http=http)
+        except (HttpError, OSError) as error:
+            if not is_retryable(error) or attempt == max_retries - 1:
+                raise
+            wait_time = (2**attempt) + (random.randint(0, 1000) / 1000)
+            logging.warning(
+                f"Retrying request due to error: {error}. Attempt {attempt + 1}"
+            )
+            time.sleep(wait_time)
+    return None
@@ -0,0 +1,374 @@
+"""A1 notation helpers for the Google Sheets API."""
+
+import math
+import re
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+_CELL_RE = re.compile(r"^\$?([A-Za-z]{0,3})\$?([0-9]*)$")
+
+
+def quote_sheet_title(title: str) -> str:
+    """Quote a sheet title for use in A1 notation.
+
+    Parameters
+    ----------
+    title : str
+        The sheet title, e.g. "Sheet 1" or "Bob's data"
+
+    Returns
+    -------
+    str
+        The quoted sheet title, e.g. "'Sheet 1'" or "'Bob''s data'"
+
+    """
+    return "'" + title.replace("'", "''") + "'"
+
+
+def split_a1(a1: str) -> Tuple[Optional[str], str]:
+    """Split an A1 range into the sheet title and the cells part.
+
+    Parameters
+    ----------
+    a1 : str
+        A range in A1 notation, e.g. "'Sheet 1'!A1:B2" or "A1:B2"
+
+    Returns
+    -------
+    Tuple[Optional[str], str]
+        The unquoted sheet title (None if the range has none) and the cells part
+
+    """
+    if "!" not in a1:
+        return None, a1
+    title, cells = a1.rsplit("!", 1)
+    if len(title) >= 2 and title[0] == title[-1] == "'":
+        title = title[1:-1].replace("''", "'")
+    return title, cells
+
+
+def column_letters(index: int) -> str:
+    """Convert a zero-based column index to column letters (0 -> "A").
+
+    Parameters
+    ----------
+    index : int
+        The zero-based column index
+
+    Returns
+    -------
+    str
+        The column letters
+
+    """
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def column_index(letters: str) -> int:
+    """Convert column letters to a zero-based column index ("A" -> 0).
+
+    Parameters
+    ----------
+    letters : str
+        The column letters, case insensitive
+
+    Returns
+    -------
+    int
+        The zero-based column index
+
+    """
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+def parse_cell(cell: str) -> Tuple[Optional[int], Optional[int]]:
+    """Parse a cell reference into zero-based row and column indices.
+
+    Parameters
+    ----------
+    cell : str
+        A cell reference like "B3", a column "B" or a row "3"
+
+    Returns
+    -------
+    Tuple[Optional[int], Optional[int]]
+        The row and the column index, None for the part that is missing
+
+    """
+    match = _CELL_RE.match(cell.strip())
+    if match is None or not any(match.groups()):
+        raise ValueError(f"Invalid cell reference: {cell}")
+    letters, digits = match.groups()
+    row = int(digits) - 1 if digits else None
+    column = column_index(letters) if letters else None
+    return row, column
+
+
+class A1Range(NamedTuple):
+    """A rectangular range of cells parsed from A1 notation.
+
+    Row and column indices are zero-based, the end indices are exclusive.
+    A missing bound (e.g. the end row of "A:B") is None, meaning unbounded.
+    """
+
+    sheet: Optional[str] = None
+    start_row: Optional[int] = None
+    start_column: Optional[int] = None
+    end_row: Optional[int] = None
+    end_column: Optional[int] = None
+
+    def to_a1(self) -> str:
+        """Format the range in A1 notation.
+
+        Returns
+        -------
+        str
+            The range in A1 notation, e.g. "'Sheet 1'!A1:B2"
+
+        """
+        start = (
+            column_letters(self.start_column or 0)
+            if self.start_column is not None or self.end_column is not None
+            else ""
+        ) + (str((self.start_row or 0) + 1) if self.start_row is not None else "")
+        end = (
+            column_letters(self.end_column - 1) if self.end_column is not None else ""
+        ) + (str(self.end_row) if self.end_row is not None else "")
+        single_cell = self.end_row is not None and self.end_column is not None
+        if start == end and (single_cell or not start):
+            cells = start
+        else:
+            cells = f"{start}:{end}"
+        if self.sheet is None:
+            return cells
+        if not cells:
+            return quote_sheet_title(self.sheet)
+        return f"{quote_sheet_title(self.sheet)}!{cells}"
+
+    def sub_range(self, row: int, column: int, rows: int, columns: int) -> "A1Range":
+        """Get a range positioned relative to the top left cell of this range.
+
+        Parameters
+        ----------
+        row : int
+            The row offset from the start row
+        column : int
+            The column offset from the start column
+        rows : int
+            The number of rows of the sub-range
+        columns : int
+            The number of columns of the sub-range
+
+        Returns
+        -------
+        A1Range
+            The sub-range on the same sheet
+
+        """
+        start_row = (self.start_row or 0) + row
+        start_column = (self.start_column or 0) + column
+        return A1Range(
+            self.sheet,
+            start_row,
+            start_column,
+            start_row + rows,
+            start_column + columns,
+        )
+
+    def _bounds(self) -> Tuple[int, int, float, float]:
+        """Get the bounds with unbounded ends as infinity."""
+        return (
+            self.start_row or 0,
+            self.start_column or 0,
+            math.inf if self.end_row is None else self.end_row,
+            math.inf if self.end_column is None else self.end_column,
+        )
+
+    def contains(self, other: "A1Range") -> bool:
+        """Check whether another range lies within this range.
+
+        Parameters
+        ----------
+        other : A1Range
+            The other range
+
+        Returns
+        -------
+        bool
+            True if both ranges are on the same sheet and `other` is inside
+
+        """
+        if self.sheet != other.sheet:
+            return False
+        row, column, end_row, end_column = self._bounds()
+        o_row, o_column, o_end_row, o_end_column = other._bounds()
+        return (
+            row <= o_row
+            and column <= o_column
+            and o_end_row <= end_row
+            and o_end_column <= end_column
+        )
+
+    def touches(self, other: "A1Range") -> bool:
+        """Check whether two ranges overlap or share an edge.
+
+        Parameters
+        ----------
+        other : A1Range
+            The other range
+
+        Returns
+        -------
+        bool
+            True if both ranges are on the same sheet and overlap or share an edge
+
+        """
+        if self.sheet != other.sheet:
+            return False
+        row, column, end_row, end_column = self._bounds()
+        o_row, o_column, o_end_row, o_end_column = other._bounds()
+        rows_overlap = row < o_end_row and o_row < end_row
+        rows_touch = row <= o_end_row and o_row <= end_row
+        columns_overlap = column < o_end_column and o_column < end_column
+        columns_touch = column <= o_end_column and o_column <= end_column
+        # Ranges that only share a corner are not adjacent
+        return (rows_overlap and columns_touch) or (columns_overlap and rows_touch)
+
+    def bounding(self, other: "A1Range") -> "A1Range":
+        """Get the smallest range that covers both ranges.
+
+        Parameters
+        ----------
+        other : A1Range
+            The other range on the same sheet
+
+        Returns
+        -------
+        A1Range
+            The bounding range
+
+        """
+        if self.sheet != other.sheet:
+            raise ValueError("Ranges on different sheets have no bounding range")
+
+        def lower(a: Optional[int], b: Optional[int]) -> Optional[int]:
+            return None if a is None and b is None else min(a or 0, b or 0)
+
+        def upper(a: Optional[int], b: Optional[int]) -> Optional[int]:
+            return None if a is None or b is None else max(a, b)
+
+        start_row = lower(self.start_row, other.start_row)
+        end_row = upper(self.end_row, other.end_row)
+        start_column = lower(self.start_column, other.start_column)
+        end_column = upper(self.end_column, other.end_column)
+        return A1Range(self.sheet, start_row, start_column, end_row, end_column)
+
+    def slice(self, outer: "A1Range", values: List[List]) -> List[List]:
+        """Cut the values of this range out of the values of a covering range.
+
+        Trailing empty cells and rows are dropped, like the API does.
+
+        Parameters
+        ----------
+        outer : A1Range
+            The range `values` were read from, it must contain this range
+        values : List[List]
+            The values of the outer range
+
+        Returns
+        -------
+        List[List]
+            The values of this range
+
+        """
+        row, column, end_row, end_column = self._bounds()
+        o_row, o_column, _, _ = outer._bounds()
+        rows = values[
+            row - o_row : None if end_row == math.inf else int(end_row - o_row)
+        ]
+        sliced = []
+        for values_row in rows:
+            cells = values_row[
+                column
+                - o_column : (
+                    None if end_column == math.inf else int(end_column - o_column)
+                )
+            ]
+            while cells and cells[-1] == "":
+                cells = cells[:-1]
+            sliced.append(cells)
+        while sliced and not sliced[-1]:
+            sliced.pop()
+        return sliced
+
+
+def merge_ranges(ranges: Iterable[A1Range]) -> List[A1Range]:
+    """Merge overlapping and adjacent ranges into bounding ranges.
+
+    Parameters
+    ----------
+    ranges : Iterable[A1Range]
+        The ranges to merge
+
+    Returns
+    -------
+    List[A1Range]
+        Ranges that cover all given ranges, none of them touching another
+
+    """
+    merged: List[A1Range] = []
+    for cell_range in ranges:
+        # Merging may make a range touch ranges it was apart from, repeat
+        while True:
+            for i, other in enumerate(merged):
+                if cell_range.touches(other):
+                    cell_range = cell_range.bounding(merged.pop(i))
+                    break
+            else:
+                merged.append(cell_range)
+                break
+    return merged
+
+
+def parse_a1(a1: str) -> A1Range:
+    """Parse a range in A1 notation.
+
+    Parameters
+    ----------
+    a1 : str
+        A range like "'Sheet 1'!A1:B2", "A1", "A:C", "2:5" or a sheet title
+
+    Returns
+    -------
+    A1Range
+        The parsed range
+
+    """
+    sheet, cells = split_a1(a1)
+    if sheet is None and not _CELL_RE.match(cells.split(":")[0].strip()):
+        # A bare (unquoted) sheet title references the whole sheet
+        sheet, cells = split_a1(f"{a1}!")
+    if not cells:
+        return A1Range(sheet)
+    start, _, end = cells.partition(":")
+    start_row, start_column = parse_cell(start)
+    if not end:
+        end_row = start_row + 1 if start_row is not None else None
+        end_column = start_column + 1 if start_column is not None else None
+    else:
+        end_row, end_column = parse_cell(end)
+        end_row = end_row + 1 if end_row is not None else None
+        end_column = end_column + 1 if end_column is not None else None
+    if start_row is None and end_row is not None:
+        # "A:B5" style ranges start at the first row
+        start_row = 0
+    if start_column is None and end_column is not None:
+        start_column = 0
+    return A1Range(sheet, start_row, start_column, end_row, end_column)
@@ -2,12 +2,17 @@
 
 import os
 import pickle  # nosec
-from typing import Optional
+import threading
+from typing import List, Optional
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 
+from .journal import JobJournal
+
 # If modifying these scopes, delete the token.pickle file.
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
@@ -90,6 +95,23 @@ class GoogleSession:
                 raise ValueError("No credentials found")
         return creds
 
+    def thread_http(self) -> AuthorizedHttp:
+        """Get an authorized HTTP client for the current thread.
+
+        The HTTP client of the discovery service is not thread-safe. Requests
+        executed from worker threads should pass this client to `execute(http=...)`.
+
+        Returns
+        -------
+        AuthorizedHttp
+            The HTTP client of the current thread
+
+        """
+        local = self.__dict__.setdefault("_thread_local", threading.local())
+        if getattr(local, "http", None) is None:
+            local.http = AuthorizedHttp(self.creds, http=httplib2.Http())
+        return local.http
+
 
 class SheetsSession(GoogleSession):
     """GoogleSession for Sheets API."""
@@ -107,8 +129,9 @@ class DocSession(GoogleSession):
     def __init__(self, **kwargs):
         """Connect to Google Workspace Docs API."""
         self.creds = self.authenticate(**kwargs)
+        self.service = build("docs", "v1", credentials=self.creds)
         # pylint: disable=no-member
-        self.session = build("docs", "v1", credentials=self.creds).documents()
+        self.session = self.service.documents()
 
 
 class DriveSession(GoogleSession):
@@ -117,13 +140,41 @@ class DriveSession(GoogleSession):
     def __init__(self, **kwargs):
         """Connect to Google Workspace Drive API."""
         self.creds = self.authenticate(**kwargs)
+        self.service = build("drive", "v3", credentials=self.creds)
         # pylint: disable=no-member
-        self.session = build("drive", "v3", credentials=self.creds).drives()
+        self.session = self.service.drives()
+
+    def list_shared_drives(self, journal: Optional[JobJournal] = None) -> List[dict]:
+        """List all shared drives.
+
+        Parameters
+        ----------
+        journal : Optional[JobJournal], optional
+            A job journal to record listed pages in, by default None.
+            Pages recorded by a previous run with the same job ID are not
+            fetched again.
+
+        Returns
+        -------
+        List[dict]
+            The shared drives
+
+        """
+
+        def fetch_page(page_token: Optional[str]) -> dict:
+            return self.session.list(pageSize=100, pageToken=page_token).execute()
+
+        if journal is not None:
+            return list(journal.paginate(fetch_page, "drives"))
 
-    def list_shared_drives(self):
-        """List all shared drives."""
-        response = self.session.list().execute()
-        return response["drives"]
+        drives: List[dict] = []
+        page_token = None
+        while True:
+            response = fetch_page(page_token)
+            drives.extend(response.get("drives", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return drives
 
 
 class FilesSession(GoogleSession):
@@ -132,8 +183,9 @@ class FilesSession(GoogleSession):
     def __init__(self, **kwargs):
         """Connect to Google Workspace Drive API."""
         self.creds = self.authenticate(**kwargs)
+        self.service = build("drive", "v3", credentials=self.creds)
         # pylint: disable=no-member
-        self.session = build("drive", "v3", credentials=self.creds).files()
+        self.session = self.service.files()
 
 
 class CalendarSession(GoogleSession):
@@ -142,8 +194,9 @@ class CalendarSession(GoogleSession):
     def __init__(self, **kwargs):
         """Connect to Google Workspace Calendar API."""
         self.creds = self.authenticate(**kwargs)
+        self.service = build("calendar", "v3", credentials=self.creds)
         # pylint: disable=no-member
-        self.session = build("calendar", "v3", credentials=self.creds).events()
+        self.session = self.service.events()
 
 
 class GmailSession(GoogleSession):
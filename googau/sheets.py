@@ -1,9 +1,296 @@
 """Spreadsheet utilities."""
 
-from typing import List, Optional, Any, Union
+import contextlib
+import copy
+import csv
+import io
+import json
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+from urllib.parse import quote
+
+from googleapiclient.errors import HttpError
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+from .journal import JobJournal
+from .quota import QuotaLimiter, execute_with_retries
+from .ranges import (
+    A1Range,
+    merge_ranges,
+    parse_a1,
+    parse_cell,
+    quote_sheet_title,
+    split_a1,
+)
 from .sessions import SheetsSession
 from .constants.sheets_constants import CONDITIONAL_FORMATTING_RULE
 
+T = TypeVar("T")
+
+# Field mask for the properties the WorkSheet object holds
+WORKSHEET_FIELDS = (
+    "sheetId,title,index,sheetType,gridProperties,hidden,tabColor,rightToLeft"
+)
+
+# batchUpdate requests that change worksheet properties or grid sizes
+METADATA_CHANGING_REQUESTS = frozenset(
+    [
+        "updateSheetProperties",
+        "appendDimension",
+        "insertDimension",
+        "deleteDimension",
+        "moveDimension",
+        "insertRange",
+        "deleteRange",
+        "appendCells",
+        "pasteData",
+    ]
+)
+
+# Sheets allows 60 write requests per minute per user
+DEFAULT_WRITE_RATE = 1.0
+
+# Ranges of a batchGet call are sent as query parameters, keep the URL well
+# below the size limits of Google front-ends
+MAX_BATCH_GET_URL_LENGTH = 6000
+# Google recommends a maximum payload of 2 MB per request
+MAX_REQUEST_PAYLOAD_BYTES = 2_000_000
+
+
+def _chunk_by_size(
+    items: Iterable[T], size_of: Callable[[T], int], max_size: int
+) -> Iterator[List[T]]:
+    """Split items into consecutive chunks whose total size stays under a limit.
+
+    An item that is larger than the limit on its own ends up in a chunk of its own.
+    """
+    chunk: List[T] = []
+    chunk_size = 0
+    for item in items:
+        item_size = size_of(item)
+        if chunk and chunk_size + item_size > max_size:
+            yield chunk
+            chunk, chunk_size = [], 0
+        chunk.append(item)
+        chunk_size += item_size
+    if chunk:
+        yield chunk
+
+
+def _grid_ranges(ranges: Any) -> List[dict]:
+    """Normalize sheet ids and GridRange dictionaries to a list of GridRanges."""
+    if not isinstance(ranges, list):
+        ranges = [ranges]
+    template_range = CONDITIONAL_FORMATTING_RULE["addConditionalFormatRule"]["rule"][
+        "ranges"
+    ][0]
+    return [
+        (
+            dict(grid_range)
+            if isinstance(grid_range, dict)
+            # A bare sheet id gets the default range of the rule template
+            else {**template_range, "sheetId": grid_range}
+        )
+        for grid_range in ranges
+    ]
+
+
+def build_cf_requests(
+    ranges: Any, cf_style_dict: dict, condition_type: str = "TEXT_EQ"
+) -> List[dict]:
+    """Build `addConditionalFormatRule` requests from the rule template.
+
+    Every request is built from a fresh copy of `CONDITIONAL_FORMATTING_RULE`,
+    the template itself is never modified.
+
+    Parameters
+    ----------
+    ranges : Any
+        A sheet id, a GridRange dictionary or a list of those
+    cf_style_dict : dict
+        Mapping of the condition values to the background colors
+        (dictionaries with "red", "green" and "blue" keys)
+    condition_type : str, optional
+        The boolean condition type of the rules, by default "TEXT_EQ"
+
+    Returns
+    -------
+    List[dict]
+        The requests to send in a `batchUpdate` call
+
+    """
+    grid_ranges = _grid_ranges(ranges)
+    requests = []
+    for value, style in cf_style_dict.items():
+        cfr = copy.deepcopy(CONDITIONAL_FORMATTING_RULE)
+        rule = cfr["addConditionalFormatRule"]["rule"]
+        rule["ranges"] = [dict(grid_range) for grid_range in grid_ranges]
+        condition = rule["booleanRule"]["condition"]
+        condition["type"] = condition_type
+        condition["values"][0]["userEnteredValue"] = value
+        background_color = rule["booleanRule"]["format"]["backgroundColor"]
+        for color in ("red", "green", "blue"):
+            background_color[color] = style[color]
+        requests.append(cfr)
+    return requests
+
+
+def _infer_column_type(values: List) -> str:
+    """Infer the type of a column of unformatted cell values.
+
+    Returns one of "bool", "int", "float" or "object". Empty cells (None) only
+    fit in "float" (as NaN) and "object" columns.
+    """
+    present = [value for value in values if value is not None]
+    if not present:
+        return "object"
+    if all(isinstance(value, bool) for value in present):
+        return "bool" if len(present) == len(values) else "object"
+    if any(isinstance(value, bool) for value in present):
+        return "object"
+    if all(isinstance(value, int) for value in present) and len(present) == len(values):
+        return "int"
+    if all(isinstance(value, (int, float)) for value in present):
+        return "float"
+    return "object"
+
+
+def _to_typed_column(values: List) -> Any:
+    """Convert a column of cell values to a typed array.
+
+    Uses NumPy arrays when NumPy is installed and `array.array` (or a plain
+    list for "object" columns) otherwise.
+    """
+    column_type = _infer_column_type(values)
+    if column_type == "float":
+        values = [math.nan if value is None else value for value in values]
+    if np is not None:
+        dtypes = {"bool": np.bool_, "int": np.int64, "float": np.float64}
+        return np.array(values, dtype=dtypes.get(column_type, object))
+    typecodes = {"bool": "B", "int": "q", "float": "d"}
+    if column_type in typecodes:
+        return array(typecodes[column_type], values)
+    return values
+
+
+def _serialize_column(column: Any) -> List:
+    """Convert a typed column to a list of JSON-serializable cell values.
+
+    Missing values (NaN) become empty strings, which clear their cells. None
+    would leave the current cell value in place.
+    """
+    if np is not None and isinstance(column, np.ndarray):
+        if column.dtype.kind == "f":
+            missing = np.isnan(column)
+            if missing.any():
+                column = column.astype(object)
+                column[missing] = ""
+        return column.tolist()
+    if isinstance(column, array):
+        values = column.tolist()
+        if column.typecode == "d":
+            return ["" if value != value else value for value in values]
+        if column.typecode == "B":
+            return [bool(value) for value in values]
+        return values
+    return list(column)
+
+
+def diff_rectangles(
+    old: List[List], new: List[List], max_gap: int = 0
+) -> List[Tuple[int, int, int, int]]:
+    """Find the rectangles of cells that differ between two grids of values.
+
+    Changed cells of every row are grouped into runs, runs that are separated
+    by at most `max_gap` unchanged cells are joined, and identical runs on
+    consecutive rows are merged into one rectangle. Cells missing from a
+    ragged row count as empty.
+
+    Parameters
+    ----------
+    old : List[List]
+        The current cell values
+    new : List[List]
+        The new cell values
+    max_gap : int, optional
+        The number of unchanged cells allowed inside a run, by default 0
+
+    Returns
+    -------
+    List[Tuple[int, int, int, int]]
+        The rectangles as (start_row, start_column, end_row, end_column)
+        with zero-based indices and exclusive ends
+
+    """
+    rectangles = []
+    open_runs: Dict[Tuple[int, int], int] = {}
+    for row_index in range(max(len(old), len(new)) + 1):
+        old_row = old[row_index] if row_index < len(old) else []
+        new_row = new[row_index] if row_index < len(new) else []
+        runs: List[Tuple[int, int]] = []
+        for column in range(max(len(old_row), len(new_row))):
+            old_value = old_row[column] if column < len(old_row) else None
+            new_value = new_row[column] if column < len(new_row) else None
+            if _cell_key(old_value) == _cell_key(new_value):
+                continue
+            if runs and column - runs[-1][1] <= max_gap:
+                runs[-1] = (runs[-1][0], column + 1)
+            else:
+                runs.append((column, column + 1))
+        for run in list(open_runs):
+            if run not in runs:
+                start_row = open_runs.pop(run)
+                rectangles.append((start_row, run[0], row_index, run[1]))
+        for run in runs:
+            open_runs.setdefault(run, row_index)
+    return sorted(rectangles)
+
+
+def _pack_csv_chunks(
+    rows: Iterable[List], max_bytes: int
+) -> Iterator[Tuple[int, str, int]]:
+    """Pack rows into CSV text chunks of bounded size.
+
+    Yields the number of rows, the CSV text and the widest row of every chunk.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    chunk_rows = 0
+    width = 0
+    for row in rows:
+        writer.writerow(row)
+        chunk_rows += 1
+        width = max(width, len(row))
+        if buffer.tell() >= max_bytes:
+            yield chunk_rows, buffer.getvalue(), width
+            buffer.seek(0)
+            buffer.truncate()
+            chunk_rows = 0
+            width = 0
+    if chunk_rows:
+        yield chunk_rows, buffer.getvalue(), width
+
 
 class WorkSheet(object):
     """Spreadsheet Worksheet object class.
@@ -51,41 +338,112 @@ class WorkSheet(object):
             "rightToLeft": False,
         }
         for ws_key in self.__dict__:
+            if ws_key.startswith("_"):
+                continue
             if vars(self)[ws_key] is not None:
                 worksheet_json_object[ws_key] = vars(self)[ws_key]
             else:
                 worksheet_json_object = self.remove_key(worksheet_json_object, ws_key)
         return worksheet_json_object
 
-    def count_rows(self, sheet_session):
+    def count_rows(
+        self, sheet_session: SheetsSession, spreadsheet_id: Optional[str] = None
+    ) -> int:
         """Count the number of rows in the worksheet.
 
-        TODO: Implement this function
+        The row count is the size of the grid from the `gridProperties`
+        metadata, it includes empty rows at the bottom of the worksheet.
+
+        Parameters
+        ----------
+        sheet_session : SheetsSession
+            A Google Sheets session object
+        spreadsheet_id : Optional[str], optional
+            The spreadsheet id from Google Sheets, by default None.
+            If given, the grid properties are refreshed from the API,
+            otherwise the known grid properties are used when available.
+
+        Returns
+        -------
+        int
+            The number of rows in the worksheet grid
+
         """
-        pass  # pylint: disable=unnecessary-pass
+        if spreadsheet_id is not None or not self.gridProperties:
+            if spreadsheet_id is None:
+                raise ValueError("No grid properties known, provide spreadsheet_id")
+            result = sheet_session.session.get(  # type: ignore
+                spreadsheetId=spreadsheet_id,
+                ranges=[quote_sheet_title(self.title)],  # type: ignore
+                fields="sheets.properties.gridProperties",
+            ).execute()
+            self.gridProperties = result["sheets"][0]["properties"]["gridProperties"]
+        return self.gridProperties.get("rowCount", 0)  # type: ignore
+
+    def appender(self, spreadsheet: "SpreadSheet", **kwargs) -> "RowAppender":
+        """Get a buffered row appender for the worksheet.
+
+        Parameters
+        ----------
+        spreadsheet : SpreadSheet
+            The spreadsheet the worksheet belongs to
+        **kwargs : dict
+            Additional arguments for `RowAppender`, e.g. the flush thresholds
 
-    def add_row(self):
+        Returns
+        -------
+        RowAppender
+            The row appender, use it as a context manager to flush on exit
+
+        """
+        return RowAppender(spreadsheet, self.title, **kwargs)  # type: ignore
+
+    def add_row(self, row: List, spreadsheet: "SpreadSheet", **kwargs) -> "RowAppender":
         """Add a row to the worksheet.
 
-        TODO: Implement this function
+        The row is queued on a buffered appender that is created on the first
+        call and sends the rows in bulk through `values.append`.
+        Call `close()` on the returned appender to write the remaining rows.
+
+        Parameters
+        ----------
+        row : List
+            The cell values of the row
+        spreadsheet : SpreadSheet
+            The spreadsheet the worksheet belongs to
+        **kwargs : dict
+            Additional arguments for `RowAppender` used when it is created
+
+        Returns
+        -------
+        RowAppender
+            The row appender of the worksheet
+
         """
-        pass  # pylint: disable=unnecessary-pass
+        if getattr(self, "_appender", None) is None:
+            self._appender = self.appender(spreadsheet, **kwargs)
+        self._appender.append(row)
+        return self._appender
 
     def apply_cf_to_range(
         self,
         spreadsheet_id: str,
-        sample_range: list,
+        sample_range: Any,
         cf_style_dict: dict,
         sheet_session: SheetsSession,
     ) -> dict:
         """Apply conditional formatting to worksheet range.
 
+        All the rules of `cf_style_dict` are sent in a single `batchUpdate` call.
+
         Parameters
         ----------
         spreadsheet_id : str
             The spreadsheet id from Google Sheets
-        sample_range : list
-            The range of cells to apply the conditional formatting
+        sample_range : Any
+            The range of cells to apply the conditional formatting.
+            Either a sheet id (the default range of the rule template is used),
+            a GridRange dictionary or a list of those.
         cf_style_dict : dict
             A dictionary object containing the conditional formatting style
         sheet_session : SheetsSession
@@ -97,28 +455,10 @@ class WorkSheet(object):
             A dictionary object containing the conditional formatting style
 
         """
-        cfr = CONDITIONAL_FORMATTING_RULE
-        for i in cf_style_dict:
-            body: dict[str, Any] = {"requests": []}
-            cfr["addConditionalFormatRule"]["rule"]["ranges"][0][
-                "sheetId"
-            ] = sample_range
-            cfr["addConditionalFormatRule"]["rule"]["booleanRule"]["condition"][
-                "values"
-            ][0]["userEnteredValue"] = i
-            cfr["addConditionalFormatRule"]["rule"]["booleanRule"]["format"][
-                "backgroundColor"
-            ]["blue"] = cf_style_dict[i]["blue"]
-            cfr["addConditionalFormatRule"]["rule"]["booleanRule"]["format"][
-                "backgroundColor"
-            ]["green"] = cf_style_dict[i]["green"]
-            cfr["addConditionalFormatRule"]["rule"]["booleanRule"]["format"][
-                "backgroundColor"
-            ]["red"] = cf_style_dict[i]["red"]
-            body["requests"].append(cfr)
-            result = sheet_session.session.batchUpdate(  # type: ignore
-                spreadsheet_id=spreadsheet_id, body=body
-            ).execute()
+        body = {"requests": build_cf_requests(sample_range, cf_style_dict)}
+        result = sheet_session.session.batchUpdate(  # type: ignore
+            spreadsheetId=spreadsheet_id, body=body
+        ).execute()
         return result
 
 
@@ -128,7 +468,12 @@ class SpreadSheet(object):
     spreadsheet_id: Optional[str] = None
     session: SheetsSession
 
-    def __init__(self, session: SheetsSession, spreadsheet_id: Optional[str] = None):
+    def __init__(
+        self,
+        session: SheetsSession,
+        spreadsheet_id: Optional[str] = None,
+        metadata_ttl: float = 300.0,
+    ):
         """Construct an spreadsheet instance.
 
         Parameters
@@ -137,10 +482,17 @@ class SpreadSheet(object):
             A Google Sheets session object
         spreadsheet_id : Optional[str], optional
             The spreadsheet id from Google Sheets, by default None
+        metadata_ttl : float, optional
+            How long the worksheet metadata is cached, in seconds, by default 300
 
         """
         self.spreadsheet_id = spreadsheet_id
         self.session = session
+        self.metadata_ttl = metadata_ttl
+        self._snapshots: Dict[str, List[List]] = {}
+        self._metadata_lock = threading.RLock()
+        self._worksheets: Optional[Dict[str, WorkSheet]] = None
+        self._worksheets_fetched = 0.0
 
     def new_worksheet(self, worksheet: WorkSheet):
         """Add new worksheet to spreadsheet.
@@ -156,23 +508,188 @@ class SpreadSheet(object):
             A dictionary object containing the worksheet properties
 
         """
-        body = {"requests": [{"addSheet": {"properties": worksheet.to_json()}}]}
-        result = self.session.batchUpdate(  # type: ignore
-            spreadsheet_id=self.spreadsheet_id, body=body
-        ).execute()
-        return result
+        return self.batch_update([{"addSheet": {"properties": worksheet.to_json()}}])
 
-    def list_worksheets(self):
+    def list_worksheets(self, refresh: bool = False) -> Dict[str, WorkSheet]:
         """List available worksheets in the spreadsheet document.
 
-        TODO: Implement this function
+        The worksheet properties are fetched with a tight field mask and cached
+        for `metadata_ttl` seconds. `batch_update` keeps the cache current for
+        added and deleted worksheets and invalidates it when a request changes
+        worksheet properties.
+
+        Parameters
+        ----------
+        refresh : bool, optional
+            Fetch the worksheets even if the cache is still valid, by default False
 
         Returns
         -------
-        dict
-            A dictionary object containing the available worksheets
+        Dict[str, WorkSheet]
+            The available worksheets keyed by title
+
+        """
+        with self._metadata_lock:
+            expired = time.monotonic() - self._worksheets_fetched > self.metadata_ttl
+            if self._worksheets is None or expired or refresh:
+                result = self.session.session.get(
+                    spreadsheetId=self.spreadsheet_id,
+                    fields=f"sheets.properties({WORKSHEET_FIELDS})",
+                ).execute()
+                self._worksheets = {
+                    sheet["properties"]["title"]: WorkSheet(**sheet["properties"])
+                    for sheet in result.get("sheets", [])
+                }
+                self._worksheets_fetched = time.monotonic()
+            return dict(self._worksheets)
+
+    def invalidate_metadata(self) -> None:
+        """Drop the cached worksheet metadata."""
+        with self._metadata_lock:
+            self._worksheets = None
+
+    def get_worksheet(self, title: str) -> WorkSheet:
+        """Get a worksheet of the spreadsheet by its title.
+
+        Parameters
+        ----------
+        title : str
+            The title of the worksheet
+
+        Returns
+        -------
+        WorkSheet
+            The worksheet with its properties, including `gridProperties`
+
+        """
+        worksheets = self.list_worksheets()
+        if title not in worksheets:
+            # The worksheet may have been added since the metadata was cached
+            worksheets = self.list_worksheets(refresh=True)
+        if title not in worksheets:
+            raise KeyError(f"Worksheet not found: {title}")
+        return worksheets[title]
+
+    def sheet_id(self, title: str) -> int:
+        """Resolve a worksheet title to its sheet id.
+
+        Parameters
+        ----------
+        title : str
+            The title of the worksheet
+
+        Returns
+        -------
+        int
+            The sheet id
 
         """
+        return self.get_worksheet(title).sheetId  # type: ignore
+
+    def _patch_metadata(self, requests: List[dict], replies: List[dict]) -> None:
+        """Update the cached worksheet metadata from a `batchUpdate` call."""
+        with self._metadata_lock:
+            if self._worksheets is None:
+                return
+            for request, reply in zip(requests, replies, strict=False):
+                kind = next(iter(request), None)
+                if kind in ("addSheet", "duplicateSheet") and reply.get(kind):
+                    properties = reply[kind]["properties"]
+                    self._worksheets[properties["title"]] = WorkSheet(**properties)
+                elif kind == "deleteSheet":
+                    sheet_id = request["deleteSheet"]["sheetId"]
+                    self._worksheets = {
+                        title: worksheet
+                        for title, worksheet in self._worksheets.items()
+                        if worksheet.sheetId != sheet_id
+                    }
+                elif kind in METADATA_CHANGING_REQUESTS:
+                    self._worksheets = None
+                    return
+
+    def iter_rows(
+        self,
+        sheet_title: str,
+        chunk_rows: int = 5000,
+        batches: bool = False,
+        prefetch: bool = True,
+        **kwargs,
+    ) -> Iterator[Any]:
+        """Iterate over the rows of a worksheet, reading it in chunks.
+
+        The worksheet size is taken from its `gridProperties`, the rows are
+        read in windows of `chunk_rows` rows. While a chunk is being consumed
+        the next one is already fetched in the background, so memory use stays
+        bounded by two chunks regardless of the worksheet size.
+
+        Empty rows between rows with values are yielded as empty lists, so the
+        n-th row yielded is row n of the worksheet. Empty rows at the end of
+        the worksheet are not yielded, and the first window without any value
+        ends the iteration: the grid often has far more rows than data.
+
+        Parameters
+        ----------
+        sheet_title : str
+            The title of the worksheet to read
+        chunk_rows : int, optional
+            The number of rows per read request, by default 5000
+        batches : bool, optional
+            Yield lists of rows per chunk instead of single rows, by default False
+        prefetch : bool, optional
+            Fetch the next chunk concurrently, by default True
+        **kwargs : dict
+            Additional arguments for `values.get`, e.g. `valueRenderOption`
+
+        Yields
+        ------
+        Any
+            The rows (lists of cell values) or batches of rows
+
+        """
+        # The row count must be current, rows may have been appended since
+        # the metadata was cached
+        self.invalidate_metadata()
+        row_count = self.get_worksheet(sheet_title).count_rows(self.session)
+        windows = [
+            (start, min(start + chunk_rows, row_count))
+            for start in range(0, row_count, chunk_rows)
+        ]
+
+        def fetch(window: Tuple[int, int]) -> List:
+            start, end = window
+            result = (
+                self.session.session.values()
+                .get(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f"{quote_sheet_title(sheet_title)}!{start + 1}:{end}",
+                    **kwargs,
+                )
+                .execute(http=self.session.thread_http())
+            )
+            return result.get("values", [])
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = executor.submit(fetch, windows[0]) if windows else None
+            # Empty rows at the end of the last window, held back until a later
+            # row with values shows they are not the end of the data
+            blank = 0
+            for index, (start, end) in enumerate(windows):
+                next_window = windows[index + 1] if index + 1 < len(windows) else None
+                rows = pending.result()  # type: ignore
+                pending = None
+                if not rows:
+                    return
+                if prefetch and next_window is not None:
+                    pending = executor.submit(fetch, next_window)
+                held = blank
+                blank = end - start - len(rows)
+                rows = [[] for _ in range(held)] + rows
+                if batches:
+                    yield rows
+                else:
+                    yield from rows
+                if pending is None and next_window is not None:
+                    pending = executor.submit(fetch, next_window)
 
     def get_cell_range(self, cell_range: str) -> List[Union[str, int, float]]:
         """Get a range of cells from the spreadsheet.
@@ -196,17 +713,77 @@ class SpreadSheet(object):
         values = result.get("values", [])
         return values
 
-    def update_cell_range(
-        self, cell_range: str, values: List, input_value_option: str = "RAW"
+    def get_columns(
+        self, cell_range: str, header: bool = False
+    ) -> Union[List[Any], Dict[str, Any]]:
+        """Get a range of cells as typed columns.
+
+        The values are read unformatted (dates and times as serial numbers)
+        in column-major order, ragged columns are padded with empty cells and
+        every column is converted to a typed array: a NumPy array when NumPy
+        is installed, an `array.array` otherwise. Columns that hold text or
+        mixed values stay lists (object arrays with NumPy).
+
+        Parameters
+        ----------
+        cell_range : str
+            The range of cells to get from the spreadsheet
+        header : bool, optional
+            Use the first row as column names, by default False
+
+        Returns
+        -------
+        Union[List[Any], Dict[str, Any]]
+            The typed columns, keyed by column name if `header` is True
+
+        """
+        result = (
+            self.session.session.values()
+            .get(
+                spreadsheetId=self.spreadsheet_id,
+                range=cell_range,
+                majorDimension="COLUMNS",
+                valueRenderOption="UNFORMATTED_VALUE",
+                dateTimeRenderOption="SERIAL_NUMBER",
+            )
+            .execute()
+        )
+        raw_columns = result.get("values", [])
+        names = []
+        if header:
+            names = [str(column[0]) if column else "" for column in raw_columns]
+            raw_columns = [column[1:] for column in raw_columns]
+        height = max((len(column) for column in raw_columns), default=0)
+        columns = [
+            _to_typed_column(
+                [None if value == "" else value for value in column]
+                + [None] * (height - len(column))
+            )
+            for column in raw_columns
+        ]
+        if header:
+            return dict(zip(names, columns, strict=True))
+        return columns
+
+    def write_columns(
+        self,
+        cell_range: str,
+        columns: Union[List[Any], Dict[str, Any]],
+        input_value_option: str = "RAW",
     ) -> dict:
-        """Update a range of cells in the spreadsheet.
+        """Write typed columns to a range of cells.
+
+        The columns are sent in column-major order, so every column array is
+        converted to a list in one go instead of building the rows cell by cell.
+        NaN values are written as empty strings, clearing their cells.
 
         Parameters
         ----------
         cell_range : str
-            The range of cells to update in the spreadsheet
-        values : List
-            A list of strings or numbers containing the cell values
+            The range of cells to update, starting at the top left cell
+        columns : Union[List[Any], Dict[str, Any]]
+            The columns (NumPy arrays, `array.array` or lists). If a dictionary
+            is given, the keys are written as a header row.
         input_value_option : str, optional
             The input value option, by default "RAW"
 
@@ -216,20 +793,921 @@ class SpreadSheet(object):
             A dictionary object containing the updated cell values
 
         """
-        body = {"values": values}
+        if isinstance(columns, dict):
+            values = [[name, *_serialize_column(col)] for name, col in columns.items()]
+        else:
+            values = [_serialize_column(column) for column in columns]
         result = (
             self.session.session.values()
             .update(
                 spreadsheetId=self.spreadsheet_id,
                 range=cell_range,
                 valueInputOption=input_value_option,
-                body=body,
+                body={"majorDimension": "COLUMNS", "values": values},
             )
             .execute()
         )
-        print(f"Updated {result.get('updatedCells')} cells.")
         return result
 
+    def sync_cell_range(
+        self,
+        cell_range: str,
+        values: List[List],
+        input_value_option: str = "RAW",
+        max_gap: int = 0,
+        refresh: bool = False,
+    ) -> dict:
+        """Update a range of cells, writing only the cells that changed.
+
+        The new values are compared to a snapshot of the range: the values
+        written by the previous sync of the same range, or the current values
+        read back from the spreadsheet. Only the rectangles of changed cells
+        are sent, all of them in a single `values.batchUpdate` call.
+
+        Parameters
+        ----------
+        cell_range : str
+            The range of cells to update in the spreadsheet
+        values : List[List]
+            The new cell values, rows of the full range
+        input_value_option : str, optional
+            The input value option, by default "RAW"
+        max_gap : int, optional
+            The number of unchanged cells allowed inside a written run, larger
+            gaps split the run into separate ranges, by default 0
+        refresh : bool, optional
+            Read the snapshot back from the spreadsheet even if a cached one
+            exists, by default False
+
+        Returns
+        -------
+        dict
+            The written ranges ("ranges"), the number of written cells
+            ("updated_cells") and the number of cells that were not rewritten
+            ("saved_cells")
+
+        """
+        snapshot = self._snapshots.get(cell_range)
+        if snapshot is None or refresh:
+            result = (
+                self.session.session.values()
+                .get(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=cell_range,
+                    valueRenderOption="FORMULA",
+                )
+                .execute()
+            )
+            snapshot = result.get("values", [])
+
+        anchor = parse_a1(cell_range)
+        data = {}
+        updated_cells = 0
+        for start_row, start_column, end_row, end_column in diff_rectangles(
+            snapshot, values, max_gap
+        ):
+            sub_range = anchor.sub_range(
+                start_row, start_column, end_row - start_row, end_column - start_column
+            )
+            data[sub_range.to_a1()] = [
+                [
+                    (
+                        values[row][column]
+                        if row < len(values) and column < len(values[row])
+                        else ""
+                    )
+                    for column in range(start_column, end_column)
+                ]
+                for row in range(start_row, end_row)
+            ]
+            updated_cells += (end_row - start_row) * (end_column - start_column)
+        if data:
+            self.update_cell_ranges(data, input_value_option)
+        self._snapshots[cell_range] = [list(row) for row in values]
+
+        total_cells = sum(
+            max(
+                len(snapshot[row]) if row < len(snapshot) else 0,
+                len(values[row]) if row < len(values) else 0,
+            )
+            for row in range(max(len(snapshot), len(values)))
+        )
+        return {
+            "ranges": list(data),
+            "updated_cells": updated_cells,
+            "saved_cells": max(total_cells - updated_cells, 0),
+        }
+
+    def update_cell_range(
+        self,
+        cell_range: str,
+        values: List,
+        input_value_option: str = "RAW",
+        journal: Optional[JobJournal] = None,
+        max_bytes: int = MAX_REQUEST_PAYLOAD_BYTES,
+        max_workers: int = 4,
+        limiter: Optional[QuotaLimiter] = None,
+    ) -> dict:
+        """Update a range of cells in the spreadsheet.
+
+        Values whose serialized size exceeds `max_bytes` are split into row
+        chunks of bounded size. The chunks do not overlap, so they are written
+        concurrently, paced by the quota limiter and retried one by one.
+
+        Parameters
+        ----------
+        cell_range : str
+            The range of cells to update in the spreadsheet
+        values : List
+            A list of strings or numbers containing the cell values
+        input_value_option : str, optional
+            The input value option, by default "RAW"
+        journal : Optional[JobJournal], optional
+            A job journal to record the written chunks in, by default None.
+            Chunks written by a previous run with the same job ID are skipped.
+        max_bytes : int, optional
+            The maximum serialized size of the values per request, by default 2 MB
+        max_workers : int, optional
+            The maximum number of concurrent requests, by default 4
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter to pace the requests with, by default one that
+            allows 60 requests per minute
+
+        Returns
+        -------
+        dict
+            A dictionary object containing the updated cell values.
+            Writes split into several chunks return the summed counts.
+
+        """
+        planned = self._plan_write(cell_range, values, max_bytes)
+        results: Dict[str, dict] = {}
+        if journal is not None:
+            results.update(journal.payloads([chunk[0] for chunk in planned]))
+        chunks = [chunk for chunk in planned if chunk[0] not in results]
+
+        def write(chunk: Tuple[str, List], http: Any = None) -> dict:
+            chunk_range, chunk_values = chunk
+            request = self.session.session.values().update(
+                spreadsheetId=self.spreadsheet_id,
+                range=chunk_range,
+                valueInputOption=input_value_option,
+                body={"values": chunk_values},
+            )
+            result = execute_with_retries(request, http=http, limiter=limiter)
+            if journal is not None:
+                journal.record({chunk_range: result})
+            return result
+
+        if len(planned) == 1:
+            if not chunks:
+                return results[cell_range]
+            result = write(chunks[0])
+            self.invalidate_metadata()
+            logging.info(f"Updated {result.get('updatedCells')} cells")
+            return result
+
+        limiter = limiter or QuotaLimiter(DEFAULT_WRITE_RATE, burst=max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for chunk, result in zip(
+                chunks,
+                executor.map(
+                    lambda chunk: write(chunk, self.session.thread_http()), chunks
+                ),
+                strict=True,
+            ):
+                results[chunk[0]] = result
+        # Writes past the last row expand the grid
+        self.invalidate_metadata()
+
+        result = {
+            "spreadsheetId": self.spreadsheet_id,
+            "updatedRanges": list(results),
+            "updatedRows": sum(r.get("updatedRows", 0) for r in results.values()),
+            "updatedColumns": max(
+                (r.get("updatedColumns", 0) for r in results.values()), default=0
+            ),
+            "updatedCells": sum(r.get("updatedCells", 0) for r in results.values()),
+        }
+        logging.info(f"Updated {result['updatedCells']} cells in {len(planned)} chunks")
+        return result
+
+    def _plan_write(
+        self, cell_range: str, values: List, max_bytes: int
+    ) -> List[Tuple[str, List]]:
+        """Split a write into row chunks with a bounded serialized size."""
+        chunks = list(
+            _chunk_by_size(values, lambda row: len(json.dumps(row)) + 1, max_bytes)
+        )
+        if len(chunks) <= 1:
+            return [(cell_range, values)]
+        anchor = parse_a1(cell_range)
+        planned = []
+        row_offset = 0
+        for chunk in chunks:
+            width = max((len(row) for row in chunk), default=0)
+            chunk_range = anchor.sub_range(row_offset, 0, len(chunk), max(width, 1))
+            planned.append((chunk_range.to_a1(), chunk))
+            row_offset += len(chunk)
+        return planned
+
+    def get_cell_ranges(self, cell_ranges: List[str], **kwargs) -> Dict[str, List]:
+        """Get several ranges of cells from the spreadsheet using batch requests.
+
+        The ranges are fetched with `values.batchGet`. Long lists of ranges are
+        split into as few calls as the request URL size allows.
+
+        Parameters
+        ----------
+        cell_ranges : List[str]
+            The ranges of cells to get from the spreadsheet
+        **kwargs : dict
+            Additional arguments for `values.batchGet`, e.g. `valueRenderOption`
+
+        Returns
+        -------
+        Dict[str, List]
+            The cell values keyed by the requested range
+
+        """
+        values: Dict[str, List] = {}
+        for chunk in _chunk_by_size(
+            dict.fromkeys(cell_ranges),
+            lambda cell_range: len(quote(cell_range)) + len("&ranges="),
+            MAX_BATCH_GET_URL_LENGTH,
+        ):
+            result = (
+                self.session.session.values()
+                .batchGet(spreadsheetId=self.spreadsheet_id, ranges=chunk, **kwargs)
+                .execute()
+            )
+            # Value ranges are returned in the order of the requested ranges
+            for cell_range, value_range in zip(
+                chunk, result.get("valueRanges", []), strict=False
+            ):
+                values[cell_range] = value_range.get("values", [])
+        return values
+
+    def update_cell_ranges(
+        self,
+        cell_values: Dict[str, List],
+        input_value_option: str = "RAW",
+        journal: Optional[JobJournal] = None,
+    ) -> Dict[str, dict]:
+        """Update several ranges of cells in the spreadsheet using batch requests.
+
+        The ranges are written with `values.batchUpdate`. The ranges are split
+        into as few calls as the request payload size allows.
+
+        Parameters
+        ----------
+        cell_values : Dict[str, List]
+            The cell values keyed by the range of cells to update
+        input_value_option : str, optional
+            The input value option, by default "RAW"
+        journal : Optional[JobJournal], optional
+            A job journal to record written ranges in, by default None.
+            Ranges written by a previous run with the same job ID are skipped.
+
+        Returns
+        -------
+        Dict[str, dict]
+            The update responses keyed by range
+
+        """
+        results: Dict[str, dict] = {}
+        cell_ranges = list(cell_values)
+        if journal is not None:
+            results.update(journal.payloads(cell_ranges))
+            cell_ranges = [r for r in cell_ranges if r not in results]
+
+        value_ranges = [
+            {"range": cell_range, "values": cell_values[cell_range]}
+            for cell_range in cell_ranges
+        ]
+        for chunk in _chunk_by_size(
+            value_ranges,
+            lambda value_range: len(json.dumps(value_range)),
+            MAX_REQUEST_PAYLOAD_BYTES,
+        ):
+            result = (
+                self.session.session.values()
+                .batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={"valueInputOption": input_value_option, "data": chunk},
+                )
+                .execute()
+            )
+            chunk_results = {
+                value_range["range"]: response
+                for value_range, response in zip(
+                    chunk, result.get("responses", []), strict=False
+                )
+            }
+            if journal is not None:
+                journal.record(chunk_results)
+            results.update(chunk_results)
+        return results
+
+    def import_csv(
+        self,
+        source: Union[str, os.PathLike, Iterable[List]],
+        sheet: Union[str, WorkSheet],
+        start_row: int = 0,
+        max_bytes: int = MAX_REQUEST_PAYLOAD_BYTES // 2,
+        max_in_flight: int = 4,
+        limiter: Optional[QuotaLimiter] = None,
+        encoding: str = "utf-8",
+    ) -> dict:
+        """Import a CSV file or an iterable of rows into a worksheet.
+
+        The rows are streamed and packed into `pasteData` requests of bounded
+        size that are submitted concurrently, with at most `max_in_flight`
+        requests (and chunks in memory) at a time. The grid is grown ahead of
+        the pasted rows with `updateSheetProperties`, so the sheet does not
+        have to expand on every request, and trimmed to the imported rows at
+        the end.
+
+        Parameters
+        ----------
+        source : Union[str, os.PathLike, Iterable[List]]
+            Path to a CSV file or an iterable of rows
+        sheet : Union[str, WorkSheet]
+            The worksheet or the title of the worksheet to import into
+        start_row : int, optional
+            The zero-based row to start pasting at, by default 0
+        max_bytes : int, optional
+            The maximum size of the pasted data per request, by default 1 MB
+        max_in_flight : int, optional
+            The maximum number of concurrent requests, by default 4
+        limiter : Optional[QuotaLimiter], optional
+            The quota limiter to pace the requests with, by default one that
+            allows 60 requests per minute
+        encoding : str, optional
+            The encoding of the CSV file, by default "utf-8"
+
+        Returns
+        -------
+        dict
+            The number of imported rows ("rows") and of paste requests ("requests")
+
+        """
+        if isinstance(sheet, str):
+            sheet = self.get_worksheet(sheet)
+        grid = dict(sheet.gridProperties or {})  # type: ignore
+        grid_rows = grid.get("rowCount", 0)
+        grid_columns = grid.get("columnCount", 0)
+        limiter = limiter or QuotaLimiter(DEFAULT_WRITE_RATE, burst=max_in_flight)
+
+        def paste(row_index: int, data: str) -> None:
+            request = self.session.session.batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={
+                    "requests": [
+                        {
+                            "pasteData": {
+                                "coordinate": {
+                                    "sheetId": sheet.sheetId,
+                                    "rowIndex": row_index,
+                                    "columnIndex": 0,
+                                },
+                                "data": data,
+                                "delimiter": ",",
+                                "type": "PASTE_NORMAL",
+                            }
+                        }
+                    ]
+                },
+            )
+            execute_with_retries(
+                request, http=self.session.thread_http(), limiter=limiter
+            )
+
+        def resize(rows: int, columns: int) -> None:
+            self.batch_update(
+                [
+                    {
+                        "updateSheetProperties": {
+                            "properties": {
+                                "sheetId": sheet.sheetId,
+                                "gridProperties": {
+                                    "rowCount": rows,
+                                    "columnCount": columns,
+                                },
+                            },
+                            "fields": "gridProperties(rowCount,columnCount)",
+                        }
+                    }
+                ]
+            )
+
+        with contextlib.ExitStack() as stack:
+            if isinstance(source, (str, os.PathLike)):
+                source = csv.reader(
+                    stack.enter_context(open(source, newline="", encoding=encoding))
+                )
+            executor = stack.enter_context(ThreadPoolExecutor(max_in_flight))
+            in_flight: set = set()
+            row_index = start_row
+            requests = 0
+            for chunk_rows, data, width in _pack_csv_chunks(source, max_bytes):
+                end_row = row_index + chunk_rows
+                if end_row > grid_rows or width > grid_columns:
+                    # Leave room for the chunks that follow
+                    grid_rows = max(grid_rows, end_row + chunk_rows * max_in_flight)
+                    grid_columns = max(grid_columns, width)
+                    resize(grid_rows, grid_columns)
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                in_flight.add(executor.submit(paste, row_index, data))
+                row_index = end_row
+                requests += 1
+            for future in in_flight:
+                future.result()
+
+        original_rows = grid.get("rowCount", 0)
+        if grid_rows > max(row_index, original_rows):
+            resize(max(row_index, original_rows), grid_columns)
+        return {"rows": row_index - start_row, "requests": requests}
+
+    def batch_update(self, requests: List[dict]) -> dict:
+        """Send a list of requests to the spreadsheet in one `batchUpdate` call.
+
+        Parameters
+        ----------
+        requests : List[dict]
+            The `batchUpdate` requests
+
+        Returns
+        -------
+        dict
+            The `batchUpdate` response
+
+        """
+        result = self.session.session.batchUpdate(
+            spreadsheetId=self.spreadsheet_id, body={"requests": requests}
+        ).execute()
+        self._patch_metadata(requests, result.get("replies", []))
+        return result
+
+    def apply_formatting_plan(self, plan: List[dict]) -> dict:
+        """Apply a whole conditional formatting plan in a single `batchUpdate` call.
+
+        Parameters
+        ----------
+        plan : List[dict]
+            The formatting plan. Every entry is a dictionary with the keys:
+            "ranges" - a sheet id, a GridRange dictionary or a list of those,
+            "styles" - a `cf_style_dict` mapping condition values to colors,
+            "condition_type" - optional boolean condition type, "TEXT_EQ" by default.
+
+        Returns
+        -------
+        dict
+            The `batchUpdate` response
+
+        """
+        requests = [
+            request
+            for entry in plan
+            for request in build_cf_requests(
+                entry["ranges"],
+                entry["styles"],
+                entry.get("condition_type", "TEXT_EQ"),
+            )
+        ]
+        if not requests:
+            return {}
+        return self.batch_update(requests)
+
     # except HttpError as error:
     #     print(f"An error occurred: {error}")
     #     return error
+
+
+class RowAppender(object):
+    """Buffered writer that appends rows to a worksheet in bulk.
+
+    Rows are queued in memory and sent in one `values.append` call when the
+    buffer reaches `max_rows` rows, `max_bytes` bytes of serialized values or
+    is older than `max_interval` seconds. There is no background timer: the
+    thresholds are only checked when rows are added, so a slow trickle of rows
+    stays queued until the next `append()`, `flush()`, `close()` or the exit
+    of the context manager.
+
+    A failed flush is retried. Before retrying after a server error or a
+    timeout the appender reads the rows after the last written row back and
+    compares them cell by cell, so a retry neither duplicates nor drops rows.
+    Rows that may have been written but cannot be checked (a failed first
+    flush has no last written row) are never sent again, they are kept in
+    `unverified` for the caller to inspect.
+
+    The appender is safe to share between threads.
+    """
+
+    spreadsheet: "SpreadSheet"
+    sheet_title: str
+    rows_written: int = 0
+    unverified: List[List[List]]
+
+    def __init__(
+        self,
+        spreadsheet: "SpreadSheet",
+        sheet_title: str,
+        max_rows: int = 1000,
+        max_bytes: int = 1_000_000,
+        max_interval: float = 5.0,
+        input_value_option: str = "RAW",
+        max_retries: int = 5,
+    ):
+        """Construct a row appender.
+
+        Parameters
+        ----------
+        spreadsheet : SpreadSheet
+            The spreadsheet to write to
+        sheet_title : str
+            The title of the worksheet to append the rows to
+        max_rows : int, optional
+            Flush when this many rows are queued, by default 1000
+        max_bytes : int, optional
+            Flush when the queued rows exceed this size, by default 1 MB
+        max_interval : float, optional
+            Flush on the next `append()` once the oldest queued row is older
+            than this many seconds, by default 5.0
+        input_value_option : str, optional
+            The input value option, by default "RAW"
+        max_retries : int, optional
+            The maximum number of attempts per flush, by default 5
+
+        """
+        self.spreadsheet = spreadsheet
+        self.sheet_title = sheet_title
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_interval = max_interval
+        self.input_value_option = input_value_option
+        self.max_retries = max_retries
+        self.rows_written = 0
+        self.unverified = []
+
+        self._lock = threading.RLock()
+        self._send_lock = threading.Lock()
+        self._buffer: List[List] = []
+        self._buffer_bytes = 0
+        self._buffer_started: Optional[float] = None
+        self._next_row: Optional[int] = None
+
+    def __enter__(self) -> "RowAppender":
+        """Enter the appender context."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Flush the queued rows on context exit.
+
+        If the block raised, a failing flush is logged instead of replacing
+        the original error.
+        """
+        if exc_type is None:
+            self.close()
+            return
+        try:
+            self.close()
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Could not write the queued rows")
+
+    def append(self, row: List) -> None:
+        """Queue a row, flushing the buffer if a threshold is reached.
+
+        Parameters
+        ----------
+        row : List
+            The cell values of the row
+
+        """
+        with self._lock:
+            if not self._buffer:
+                self._buffer_started = time.monotonic()
+            self._buffer.append(list(row))
+            self._buffer_bytes += len(json.dumps(row))
+            due = (
+                len(self._buffer) >= self.max_rows
+                or self._buffer_bytes >= self.max_bytes
+                or time.monotonic() - self._buffer_started >= self.max_interval  # type: ignore
+            )
+        if due:
+            self.flush()
+
+    def extend(self, rows: Iterable[List]) -> None:
+        """Queue several rows.
+
+        Parameters
+        ----------
+        rows : Iterable[List]
+            The rows to queue
+
+        """
+        for row in rows:
+            self.append(row)
+
+    def flush(self) -> Optional[dict]:
+        """Write all queued rows to the worksheet.
+
+        The rows are sent outside of the buffer lock, so other threads keep
+        queuing rows while a flush is in flight. Flushes are sent one at a
+        time, in order. If the write fails the rows are put back at the front
+        of the buffer and the error is raised. Rows that may have been written
+        but cannot be checked are moved to `unverified` instead.
+
+        Returns
+        -------
+        Optional[dict]
+            The `values.append` response, None if there was nothing to write
+
+        """
+        with self._send_lock:
+            with self._lock:
+                rows = self._buffer
+                if not rows:
+                    return None
+                self._buffer = []
+                self._buffer_bytes = 0
+                self._buffer_started = None
+            request = _AppendRequest(self, rows)
+            try:
+                result = execute_with_retries(request, max_retries=self.max_retries)
+            except Exception:
+                landed = request.landed()
+                if landed is None:
+                    with self._lock:
+                        self.unverified.append(rows)
+                    raise
+                if not landed:
+                    with self._lock:
+                        self._buffer = rows + self._buffer
+                        self._buffer_bytes += sum(len(json.dumps(row)) for row in rows)
+                        self._buffer_started = self._buffer_started or time.monotonic()
+                    raise
+                logging.warning("Append failed but the rows landed")
+                result = {}
+            with self._lock:
+                self.rows_written += len(rows)
+            # The appended rows changed the grid size
+            self.spreadsheet.invalidate_metadata()
+            return result
+
+    def close(self) -> None:
+        """Write all queued rows."""
+        self.flush()
+
+    def _rows_landed(self, rows: List[List], start_row: int) -> bool:
+        """Check whether exactly these rows follow the last written row."""
+        # One extra row shows whether anything else was appended after them
+        result = (
+            self.spreadsheet.session.session.values()
+            .get(
+                spreadsheetId=self.spreadsheet.spreadsheet_id,
+                range=f"{quote_sheet_title(self.sheet_title)}!"
+                f"{start_row}:{start_row + len(rows)}",
+                valueRenderOption="UNFORMATTED_VALUE",
+            )
+            .execute()
+        )
+
+        def normalized(values: List[List]) -> List[List[str]]:
+            keys = [[_cell_key(value) for value in row] for row in values]
+            for row in keys:
+                while row and row[-1] == "":
+                    row.pop()
+            return keys
+
+        return normalized(result.get("values", [])) == normalized(rows)
+
+
+class _AppendRequest(object):
+    """A `values.append` call of a RowAppender that is safe to retry.
+
+    `values.append` has no idempotency key, a request that failed with a
+    server error or a timeout may still have been applied. Before sending the
+    rows again the rows after the last row known from an `updatedRange` are
+    read back and compared cell by cell. Without a known last row (the first
+    flush of an appender) such an error cannot be resolved and is raised as
+    not retryable. Rate limited requests are never applied and always retried.
+    """
+
+    def __init__(self, appender: RowAppender, rows: List[List]):
+        self.appender = appender
+        self.rows = rows
+        self.start_row = appender._next_row  # pylint: disable=protected-access
+        self._maybe_applied = False
+
+    def landed(self) -> Optional[bool]:
+        """Check whether the rows of the failed last attempt were written.
+
+        Returns
+        -------
+        Optional[bool]
+            None if the attempt may have been applied and that cannot be
+            checked
+
+        """
+        if not self._maybe_applied:
+            return False
+        if self.start_row is None:
+            return None
+        try:
+            # pylint: disable=protected-access
+            landed = self.appender._rows_landed(self.rows, self.start_row)
+        except (HttpError, OSError):
+            return None
+        if landed:
+            self.appender._next_row = self.start_row + len(self.rows)
+        return landed
+
+    def execute(self, http=None) -> dict:
+        appender = self.appender
+        if self._maybe_applied:
+            # pylint: disable=protected-access
+            if appender._rows_landed(self.rows, self.start_row):
+                logging.warning("Append failed but the rows landed")
+                appender._next_row = self.start_row + len(self.rows)
+                return {}
+            self._maybe_applied = False
+        request = appender.spreadsheet.session.session.values().append(
+            spreadsheetId=appender.spreadsheet.spreadsheet_id,
+            range=f"{quote_sheet_title(appender.sheet_title)}!A1",
+            valueInputOption=appender.input_value_option,
+            insertDataOption="INSERT_ROWS",
+            body={"values": self.rows},
+        )
+        try:
+            result = request.execute() if http is None else request.execute(http=http)
+        except (HttpError, OSError) as error:
+            self._maybe_applied = not (
+                isinstance(error, HttpError) and error.resp.status == 429
+            )
+            if self._maybe_applied and self.start_row is None:
+                raise RuntimeError(
+                    "Append may have been applied and cannot be verified, "
+                    "not retrying to avoid duplicate rows"
+                ) from error
+            raise
+        updated_range = result.get("updates", {}).get("updatedRange")
+        if updated_range:
+            last_row, _ = parse_cell(split_a1(updated_range)[1].split(":")[-1])
+            appender._next_row = last_row + 2  # type: ignore
+        return result
+
+
+def _cell_key(value: Any) -> str:
+    """Normalize a cell value for comparing written and read back values."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+class ReadPlanner(object):
+    """Read planner that coalesces range reads into few batch requests.
+
+    Ranges are queued with `add` (or passed to `read`), overlapping and
+    adjacent ranges are merged into bounding ranges and all of them are
+    fetched in one `values.batchGet` call. Every caller gets the values of
+    exactly the range it asked for.
+
+    Fetched ranges are kept for `ttl` seconds, so repeated reads within a job
+    are served from memory. Writes through the spreadsheet do not update the
+    cache, call `invalidate` after writing to ranges that are read again.
+    """
+
+    spreadsheet: SpreadSheet
+    ttl: float
+
+    def __init__(self, spreadsheet: SpreadSheet, ttl: float = 30.0, **kwargs):
+        """Construct a read planner.
+
+        Parameters
+        ----------
+        spreadsheet : SpreadSheet
+            The spreadsheet to read from
+        ttl : float, optional
+            How long fetched ranges are cached, in seconds, by default 30
+        **kwargs : dict
+            Additional arguments for `values.batchGet`, e.g. `valueRenderOption`
+
+        """
+        self.spreadsheet = spreadsheet
+        self.ttl = ttl
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._queued: List[str] = []
+        self._cache: List[Tuple[A1Range, List[List], float]] = []
+
+    def add(self, cell_range: str) -> None:
+        """Queue a range to be read by the next `fetch`.
+
+        Parameters
+        ----------
+        cell_range : str
+            The range of cells to read
+
+        """
+        with self._lock:
+            self._queued.append(cell_range)
+
+    def fetch(self) -> Dict[str, List]:
+        """Read all queued ranges.
+
+        Returns
+        -------
+        Dict[str, List]
+            The cell values keyed by the queued ranges
+
+        """
+        with self._lock:
+            queued, self._queued = self._queued, []
+        return self.read(queued)
+
+    def read(self, cell_ranges: List[str]) -> Dict[str, List]:
+        """Read ranges, fetching the ones that are not cached in one batch.
+
+        Parameters
+        ----------
+        cell_ranges : List[str]
+            The ranges of cells to read
+
+        Returns
+        -------
+        Dict[str, List]
+            The cell values keyed by range
+
+        """
+        requested = {cell_range: parse_a1(cell_range) for cell_range in cell_ranges}
+        values: Dict[str, List] = {}
+        missing: List[A1Range] = []
+        for cell_range, parsed in requested.items():
+            cached = self._lookup(parsed)
+            if cached is None:
+                missing.append(parsed)
+            else:
+                values[cell_range] = cached
+
+        if missing:
+            planned = merge_ranges(missing)
+            fetched = self.spreadsheet.get_cell_ranges(
+                [region.to_a1() for region in planned], **self._kwargs
+            )
+            regions = [(region, fetched[region.to_a1()]) for region in planned]
+            now = time.monotonic()
+            with self._lock:
+                self._cache.extend(
+                    (region, region_values, now) for region, region_values in regions
+                )
+            # Served from this fetch even if the cache already dropped it (ttl=0)
+            for cell_range, parsed in requested.items():
+                if cell_range not in values:
+                    values[cell_range] = _slice_covering(parsed, regions)  # type: ignore
+        return values
+
+    def get(self, cell_range: str) -> List:
+        """Read a single range.
+
+        Parameters
+        ----------
+        cell_range : str
+            The range of cells to read
+
+        Returns
+        -------
+        List
+            The cell values
+
+        """
+        return self.read([cell_range])[cell_range]
+
+    def invalidate(self) -> None:
+        """Drop all cached ranges."""
+        with self._lock:
+            self._cache = []
+
+    def _lookup(self, cell_range: A1Range) -> Optional[List]:
+        """Get the values of a range from a cached covering range."""
+        now = time.monotonic()
+        with self._lock:
+            self._cache = [entry for entry in self._cache if now - entry[2] < self.ttl]
+            return _slice_covering(
+                cell_range, [(region, values) for region, values, _ in self._cache]
+            )
+
+
+def _slice_covering(
+    cell_range: A1Range, regions: List[Tuple[A1Range, List[List]]]
+) -> Optional[List]:
+    """Get the values of a range from the first region that covers it."""
+    for region, region_values in regions:
+        if region.contains(cell_range):
+            return cell_range.slice(region, region_values)
+    return None
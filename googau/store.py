@@ -0,0 +1,48 @@
+"""Base class of the local SQLite stores."""
+
+import sqlite3
+import threading
+from typing import Tuple, TypeVar
+
+_Store = TypeVar("_Store", bound="SQLiteStore")
+
+
+class SQLiteStore(object):
+    """A SQLite database shared between threads.
+
+    Subclasses list the statements that create their tables in `_schema` and
+    run their queries on `_connection` while holding `_lock`.
+    """
+
+    path: str
+    _schema: Tuple[str, ...] = ()
+
+    def __init__(self, path: str):
+        """Open (or create) the database and its tables.
+
+        Parameters
+        ----------
+        path : str
+            Path to the SQLite database file. Use ":memory:" for a database
+            that only lives as long as the object.
+
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            for statement in self._schema:
+                self._connection.execute(statement)
+
+    def __enter__(self: _Store) -> _Store:
+        """Enter the store context."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the store on context exit."""
+        self.close()
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,41 @@
+"""Shared test fixtures."""
+
+from unittest.mock import MagicMock
+import pytest
+
+
+class FakeBatch:
+    """HTTP batch that resolves every request to the outcome it returns.
+
+    Requests are callables returning a response or an exception instance.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            outcome = request()
+            if isinstance(outcome, Exception):
+                self.callback(request_id, None, outcome)
+            else:
+                self.callback(request_id, outcome, None)
+
+
+@pytest.fixture
+def fake_service():
+    """Discovery service mock whose batches are recorded in `batches`."""
+    service = MagicMock()
+    service.batches = []
+
+    def new_batch_http_request(callback):
+        batch = FakeBatch(callback)
+        service.batches.append(batch)
+        return batch
+
+    service.new_batch_http_request.side_effect = new_batch_http_request
+    return service
@@ -0,0 +1,39 @@
+"""Test the batching module."""
+
+from unittest.mock import MagicMock, patch
+from googleapiclient.errors import HttpError
+from googau.batching import accept_status, execute_batched, execute_paced
+
+
+@patch("googau.batching.time.sleep")
+def test_execute_batched_retries_only_failed_items(mock_sleep, fake_service):
+    service = fake_service
+    outcomes = iter([HttpError(MagicMock(status=503), b"unavailable"), {"id": "b"}])
+    requests = {
+        "a": lambda: lambda: {"id": "a"},
+        "b": lambda: lambda: next(outcomes),
+        "c": lambda: lambda: HttpError(MagicMock(status=404), b"not found"),
+    }
+    results = execute_batched(service, requests, batch_size=2)
+    assert results["a"].response == {"id": "a"}
+    assert results["b"].response == {"id": "b"}
+    assert not results["c"].ok
+    assert [len(batch.requests) for batch in service.batches] == [2, 1, 1]
+
+
+def test_execute_batched_accepts_errors(fake_service):
+    service = fake_service
+    requests = {
+        "a": lambda: lambda: HttpError(MagicMock(status=409), b"exists"),
+        "b": lambda: lambda: HttpError(MagicMock(status=403), b"forbidden"),
+    }
+    results = execute_batched(service, requests, accept=accept_status(404, 409))
+    assert results["a"].ok
+    assert not results["b"].ok
+
+
+@patch("googau.batching.QuotaLimiter")
+def test_execute_paced_defaults_the_limiter(mock_limiter, fake_service):
+    results = execute_paced(fake_service, {"a": lambda: lambda: {"id": "a"}})
+    assert results["a"].response == {"id": "a"}
+    mock_limiter.return_value.acquire.assert_called_once_with(1)
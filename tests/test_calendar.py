@@ -1,6 +1,15 @@
+import datetime
 import pytest
-from unittest.mock import patch
-from googau.calendar import Calendar
+from unittest.mock import MagicMock, patch
+from googleapiclient.errors import HttpError
+from googau.calendar import (
+    Calendar,
+    CalendarGroup,
+    EventIndex,
+    EventStore,
+    event_id_for,
+)
+from googau.quota import QuotaLimiter
 from googau.sessions import CalendarSession
 
 
@@ -23,3 +32,242 @@ def test_get_events_td(mock_get_events, calendar_session):
     events = calendar.get_events_td()
     assert isinstance(events, list)
     mock_get_events.assert_called_once()
+
+
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_iter_events_follows_pages(calendar_session, prefetch):
+    pages = {
+        None: {"items": [{"id": "1"}, {"id": "2"}], "nextPageToken": "p2"},
+        "p2": {"items": [{"id": "3"}]},
+    }
+    calendar_session.session = MagicMock()
+    calendar_session.session.list.side_effect = lambda pageToken, **kwargs: MagicMock(
+        execute=MagicMock(return_value=pages[pageToken])
+    )
+    calendar_session.thread_http = MagicMock()
+    calendar = Calendar(session=calendar_session, calendarId="test_calendar_id")
+    events = calendar.iter_events(
+        "2024-01-01T00:00:00Z", "2025-01-01T00:00:00Z", fields="id", prefetch=prefetch
+    )
+    assert [event["id"] for event in events] == ["1", "2", "3"]
+    kwargs = calendar_session.session.list.call_args.kwargs
+    assert kwargs["fields"] == "nextPageToken,items(id)"
+    assert kwargs["maxResults"] == 2500
+
+
+def test_get_events_td_limits_across_pages(calendar_session):
+    calendar_session.session = MagicMock()
+    calendar_session.session.list.return_value.execute.side_effect = [
+        {"items": [{"id": "1"}, {"id": "2"}], "nextPageToken": "p2"},
+        {"items": [{"id": "3"}, {"id": "4"}]},
+    ]
+    calendar = Calendar(session=calendar_session, calendarId="test_calendar_id")
+    events = calendar.get_events_td(date="2024-06-01", limit=3)
+    assert [event["id"] for event in events] == ["1", "2", "3"]
+
+
+def test_sync_applies_incremental_changes(calendar_session):
+    calendar_session.session = MagicMock()
+    execute = calendar_session.session.list.return_value.execute
+    calendar = Calendar(session=calendar_session, calendarId="cal")
+    store = EventStore(":memory:")
+
+    execute.side_effect = [
+        {"items": [{"id": "a"}, {"id": "b"}], "nextPageToken": "p2"},
+        {"items": [{"id": "c"}], "nextSyncToken": "t1"},
+    ]
+    changes = calendar.sync(store)
+    assert changes["full_sync"] is True
+    assert store.sync_token("cal") == "t1"
+    assert len(store.events("cal")) == 3
+
+    execute.side_effect = [
+        {
+            "items": [{"id": "a", "status": "cancelled"}, {"id": "b", "summary": "x"}],
+            "nextSyncToken": "t2",
+        }
+    ]
+    changes = calendar.sync(store)
+    assert changes == {
+        "updated": [{"id": "b", "summary": "x"}],
+        "deleted": ["a"],
+        "full_sync": False,
+    }
+    assert calendar_session.session.list.call_args.kwargs["syncToken"] == "t1"
+    assert store.get("cal", "a") is None
+    assert store.get("cal", "b") == {"id": "b", "summary": "x"}
+    assert store.sync_token("cal") == "t2"
+
+
+def test_sync_resyncs_when_token_expired(calendar_session):
+    calendar_session.session = MagicMock()
+    execute = calendar_session.session.list.return_value.execute
+    calendar = Calendar(session=calendar_session, calendarId="cal")
+    store = EventStore(":memory:")
+    store.apply("cal", [{"id": "stale"}], [])
+    store.set_sync_token("cal", "expired")
+
+    execute.side_effect = [
+        HttpError(MagicMock(status=410), b"Gone"),
+        {"items": [{"id": "fresh"}], "nextSyncToken": "t1"},
+    ]
+    changes = calendar.sync(store)
+    assert changes["full_sync"] is True
+    assert [event["id"] for event in store.events("cal")] == ["fresh"]
+
+
+def test_calendar_group_fetches_pages_in_batches(calendar_session, fake_service):
+    pages = {
+        ("a", None): {"items": [{"id": "a1"}], "nextPageToken": "a2"},
+        ("a", "a2"): {"items": [{"id": "a2"}]},
+        ("b", None): {"items": [{"id": "b1"}]},
+    }
+    calendar_session.session = MagicMock()
+    calendar_session.session.list.side_effect = (
+        lambda calendarId, pageToken, **kwargs: lambda: pages[(calendarId, pageToken)]
+    )
+    calendar_session.service = fake_service
+    group = CalendarGroup(calendar_session, ["a", "b"], limiter=QuotaLimiter(1000))
+    events = group.get_events("2024-01-01T00:00:00Z", "2024-02-01T00:00:00Z")
+    assert events == {"a": [{"id": "a1"}, {"id": "a2"}], "b": [{"id": "b1"}]}
+    assert [len(batch.requests) for batch in calendar_session.service.batches] == [2, 1]
+
+
+def test_calendar_group_get_busy(calendar_session):
+    calendar_session.service = MagicMock()
+    calendar_session.service.freebusy().query().execute.return_value = {
+        "calendars": {
+            "a": {"busy": [{"start": "s", "end": "e"}]},
+            "b": {"errors": [{"reason": "notFound"}]},
+        }
+    }
+    group = CalendarGroup(calendar_session, ["a", "b"])
+    assert group.get_busy("s", "e") == {"a": [{"start": "s", "end": "e"}]}
+
+
+def _event(event_id, start, end, **kwargs):
+    return {
+        "id": event_id,
+        "start": {"dateTime": f"2024-06-03T{start}:00Z"},
+        "end": {"dateTime": f"2024-06-03T{end}:00Z"},
+        **kwargs,
+    }
+
+
+def test_event_index_queries():
+    index = EventIndex.from_events(
+        {
+            "alice": [_event("a1", "09:00", "10:00"), _event("a2", "13:30", "15:00")],
+            "bob": [
+                _event("b1", "14:00", "14:30"),
+                _event("b2", "14:45", "16:00"),
+                _event("b3", "11:00", "12:00", transparency="transparent"),
+            ],
+        }
+    )
+    overlapping = index.overlapping("2024-06-03T14:00:00Z", "2024-06-03T15:00:00Z")
+    assert [event["id"] for event in overlapping] == ["a2", "b1", "b2"]
+    assert [e["id"] for e in index.at("2024-06-03T14:00:00Z", ["bob"])] == ["b1"]
+    assert index.at("2024-06-03T10:00:00Z") == []
+
+    day = ("2024-06-03T08:00:00Z", "2024-06-03T18:00:00Z")
+    busy = [(s.strftime("%H:%M"), e.strftime("%H:%M")) for s, e in index.busy(*day)]
+    assert busy == [("09:00", "10:00"), ("13:30", "16:00")]
+    slots = index.free_slots(*day, min_duration=datetime.timedelta(hours=2))
+    assert [(s.strftime("%H:%M"), e.strftime("%H:%M")) for s, e in slots] == [
+        ("10:00", "13:30"),
+        ("16:00", "18:00"),
+    ]
+
+
+def test_event_index_applies_sync_changes():
+    index = EventIndex.from_events({"cal": [_event("a", "09:00", "10:00")]})
+    index.apply(
+        "cal",
+        {
+            "updated": [_event("b", "11:00", "12:00")],
+            "deleted": ["a"],
+            "full_sync": False,
+        },
+    )
+    assert len(index) == 1
+    assert index.at("2024-06-03T11:30:00Z")[0]["id"] == "b"
+
+
+def test_event_id_for_is_valid_and_stable():
+    event_id = event_id_for("booking-42")
+    assert event_id == event_id_for("booking-42")
+    assert event_id != event_id_for("booking-43")
+    assert set(event_id) <= set("0123456789abcdefghijklmnopqrstuv")
+    assert 5 <= len(event_id) <= 1024
+
+
+def test_insert_events_is_idempotent(calendar_session, fake_service):
+    calendar_session.service = fake_service
+    calendar_session.session = MagicMock()
+    existing = event_id_for("booking-1")
+    calendar_session.session.insert.side_effect = lambda calendarId, body: lambda: (
+        HttpError(MagicMock(status=409), b"duplicate")
+        if body["id"] == existing
+        else body
+    )
+    calendar_session.session.get().execute.return_value = {"status": "confirmed"}
+    calendar = Calendar(session=calendar_session, calendarId="cal")
+    results = calendar.insert_events(
+        {"booking-1": {"summary": "a"}, "booking-2": {"summary": "b"}},
+        limiter=QuotaLimiter(1000),
+    )
+    assert all(result.ok for result in results.values())
+    assert results["booking-2"].response["id"] == event_id_for("booking-2")
+
+
+def test_delete_events_reports_outcomes(calendar_session, fake_service):
+    calendar_session.service = fake_service
+    calendar_session.session = MagicMock()
+    statuses = {"gone": 410, "forbidden": 403}
+    calendar_session.session.delete.side_effect = lambda calendarId, eventId: lambda: (
+        HttpError(MagicMock(status=statuses[eventId]), b"error")
+        if eventId in statuses
+        else ""
+    )
+    calendar = Calendar(session=calendar_session, calendarId="cal")
+    results = calendar.delete_events(
+        ["ok", "gone", "forbidden"], limiter=QuotaLimiter(1000)
+    )
+    assert {key: result.ok for key, result in results.items()} == {
+        "ok": True,
+        "gone": True,
+        "forbidden": False,
+    }
+
+
+def test_insert_events_keeps_identical_events(calendar_session, fake_service):
+    calendar_session.service = fake_service
+    calendar_session.session = MagicMock()
+    calendar_session.session.insert.side_effect = lambda calendarId, body: lambda: body
+    calendar = Calendar(session=calendar_session, calendarId="cal")
+    event = {"summary": "standup"}
+    results = calendar.insert_events([event, event], limiter=QuotaLimiter(1000))
+    assert len(results) == 2
+    # The ids are stable across calls
+    again = calendar.insert_events([event, event], limiter=QuotaLimiter(1000))
+    assert set(again) == set(results)
+
+
+def test_insert_events_conflict_with_cancelled_event(calendar_session, fake_service):
+    calendar_session.service = fake_service
+    calendar_session.session = MagicMock()
+    calendar_session.session.insert.side_effect = lambda calendarId, body: lambda: (
+        HttpError(MagicMock(status=409), b"duplicate")
+    )
+    statuses = {event_id_for("live"): "confirmed", event_id_for("gone"): "cancelled"}
+    calendar_session.session.get.side_effect = lambda calendarId, eventId: MagicMock(
+        execute=MagicMock(return_value={"status": statuses[eventId]})
+    )
+    calendar = Calendar(session=calendar_session, calendarId="cal")
+    results = calendar.insert_events(
+        {"live": {"summary": "a"}, "gone": {"summary": "b"}},
+        limiter=QuotaLimiter(1000),
+    )
+    assert results["live"].ok
+    assert not results["gone"].ok
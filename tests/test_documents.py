@@ -1,6 +1,6 @@
 import pytest
-from unittest.mock import patch
-from googau.documents import Doc
+from unittest.mock import MagicMock, patch
+from googau.documents import Doc, DocElement
 from googau.sessions import DocSession
 
 
@@ -16,3 +16,134 @@ def test_doc_init(doc_session):
     assert document is not None
     assert document.documentId == "test_document_id"
     assert document.session == doc_session
+
+
+def _paragraph(start, text, style="NORMAL_TEXT"):
+    end = start + len(text.encode("utf-16-le")) // 2
+    return {
+        "startIndex": start,
+        "endIndex": end,
+        "paragraph": {
+            "elements": [
+                {"startIndex": start, "endIndex": end, "textRun": {"content": text}}
+            ],
+            "paragraphStyle": {"namedStyleType": style},
+        },
+    }
+
+
+DOCUMENT = {
+    "revisionId": "rev1",
+    "body": {
+        "content": [
+            {"endIndex": 1, "sectionBreak": {}},
+            _paragraph(1, "Title\n", "HEADING_1"),
+            _paragraph(7, "A \U0001f600 smile\n"),
+            {
+                "startIndex": 18,
+                "endIndex": 30,
+                "table": {
+                    "tableRows": [
+                        {
+                            "tableCells": [
+                                {"content": [_paragraph(21, "x\n")]},
+                                {"content": [_paragraph(24, "smile\n")]},
+                            ]
+                        }
+                    ]
+                },
+            },
+        ]
+    },
+}
+
+
+@pytest.fixture
+def document(doc_session):
+    doc_session.session = MagicMock()
+    doc_session.session.get().execute.return_value = DOCUMENT
+    return Doc(session=doc_session, documentId="doc")
+
+
+def test_load_adds_revision_to_field_mask(document):
+    document.load(fields="body.content")
+    kwargs = document.session.session.get.call_args.kwargs
+    assert kwargs["fields"] == "body.content,revisionId"
+    assert document.revisionId == "rev1"
+
+
+def test_elements(document):
+    elements = document.elements()
+    assert [element.kind for element in elements] == ["heading", "paragraph", "table"]
+    assert elements[0] == DocElement("heading", 1, 7, "Title\n", "HEADING_1")
+    assert elements[2].cells == (("x\n", "smile\n"),)
+    assert document.headings() == elements[:1]
+    # The extraction is cached
+    assert document.elements() is elements
+    assert document.session.session.get().execute.call_count == 1
+
+
+def test_text_view_maps_offsets_to_indices(document):
+    text = document.text
+    assert str(text) == "Title\nA \U0001f600 smile\nx\nsmile\n"
+    # The emoji takes two UTF-16 code units
+    assert list(text.find("smile")) == [(12, 17), (24, 29)]
+    # A match that ends at the paragraph break before the table
+    assert list(text.find("smile\n")) == [(12, 18), (24, 30)]
+
+
+def test_edit_orders_and_merges(document):
+    edit = document.edit()
+    edit.update_text_style(1, 3, {"bold": True}, "bold")
+    edit.update_text_style(3, 6, {"bold": True}, "bold")
+    edit.insert_text(7, "Hello ")
+    edit.delete_range(10, 12).delete_range(12, 14)
+    edit.insert_text(7, "world ")
+    edit.replace_text(2, 4, "XY Z")
+    assert edit.requests() == [
+        {"deleteContentRange": {"range": {"startIndex": 10, "endIndex": 14}}},
+        {"insertText": {"location": {"index": 7}, "text": "Hello world "}},
+        {"deleteContentRange": {"range": {"startIndex": 2, "endIndex": 4}}},
+        {"insertText": {"location": {"index": 2}, "text": "XY Z"}},
+        {
+            "updateTextStyle": {
+                "range": {"startIndex": 1, "endIndex": 8},
+                "textStyle": {"bold": True},
+                "fields": "bold",
+            }
+        },
+    ]
+    # 12 + inserted "XY Z" and "Hello world " - deleted 2-4 and 10-12
+    assert edit.shift(12) == 12 + 4 + 12 - 2 - 2
+
+
+def test_edit_consecutive_replacements(document):
+    edit = document.edit().replace_text(5, 10, "a").replace_text(10, 12, "b")
+    edit.delete_range(12, 14)
+    assert edit.requests() == [
+        {"deleteContentRange": {"range": {"startIndex": 10, "endIndex": 14}}},
+        {"insertText": {"location": {"index": 10}, "text": "b"}},
+        {"deleteContentRange": {"range": {"startIndex": 5, "endIndex": 10}}},
+        {"insertText": {"location": {"index": 5}, "text": "a"}},
+    ]
+    edit = document.edit().delete_range(5, 10).delete_range(10, 12)
+    assert edit.insert_text(10, "c").shift(12) == 5 + 1
+
+
+def test_edit_rejects_conflicts(document):
+    edit = document.edit().insert_text(5, "x")
+    with pytest.raises(ValueError):
+        edit.delete_range(3, 8)
+
+
+def test_edit_execute_uses_revision(document):
+    document.session.session.batchUpdate().execute.return_value = {"replies": []}
+    document.edit().insert_text(1, "Hi ").execute()
+    body = document.session.session.batchUpdate.call_args.kwargs["body"]
+    assert body["writeControl"] == {"requiredRevisionId": "rev1"}
+    assert len(body["requests"]) == 1
+    assert document.document is None
+    # The cached views are reloaded from the edited document
+    calls = document.session.session.get().execute.call_count
+    assert str(document.text)
+    assert document.session.session.get().execute.call_count == calls + 1
@@ -1,6 +1,10 @@
+import re
 import pytest
-from unittest.mock import patch
-from googau.drive import SharedDrive
+from unittest.mock import MagicMock, patch
+from googleapiclient.errors import HttpError
+from googau.constants.drive_constants import SHARED_DRIVE
+from googau.drive import DriveFile, DriveIndex, SharedDrive, drive_request_id
+from googau.journal import JobJournal
 from googau.sessions import DriveSession
 
 
@@ -23,3 +27,182 @@ def test_create_drive(mock_create, drive_session):
     result = drive.create(request_id="test_request_id", name="test_drive")
     assert isinstance(result, dict)
     mock_create.assert_called_once()
+
+
+def _file(file_id, parent, folder=False):
+    return {
+        "id": file_id,
+        "name": file_id,
+        "mimeType": ("application/vnd.google-apps.folder" if folder else "text/plain"),
+        "parents": [parent],
+    }
+
+
+def test_get_drive_contents_flat(drive_session):
+    drive_session.service = MagicMock()
+    drive_session.service.files().list().execute.side_effect = [
+        {"files": [_file("a", "root")], "nextPageToken": "token"},
+        {"files": [{**_file("b", "root"), "size": "12"}]},
+    ]
+    drive = SharedDrive(session=drive_session, drive_id="root")
+    files = list(drive.get_drive_contents())
+    assert [file.id for file in files] == ["a", "b"]
+    assert files[1].size == 12
+    assert isinstance(files[0], DriveFile)
+    kwargs = drive_session.service.files().list.call_args.kwargs
+    assert kwargs["corpora"] == "drive"
+    assert kwargs["pageSize"] == 1000
+    assert kwargs["pageToken"] == "token"
+
+
+def test_get_drive_contents_recursive(drive_session):
+    tree = {
+        "root": [_file("f1", "root", True), _file("f2", "root", True)],
+        "f1": [_file("x", "f1"), _file("f3", "f1", True)],
+        "f2": [_file("y", "f2")],
+        "f3": [_file("z", "f3")],
+    }
+    queries = []
+
+    def list_files(self, drive_id, query, page_token, http=None):
+        queries.append(query)
+        parents = re.findall(r"'(\w+)' in parents", query)
+        return {"files": [file for parent in parents for file in tree[parent]]}
+
+    drive_session.thread_http = MagicMock()
+    drive = SharedDrive(session=drive_session, drive_id="root")
+    with patch.object(SharedDrive, "_list_files", list_files):
+        files = list(drive.get_drive_contents(recursive=True))
+    assert sorted(file.id for file in files) == ["f1", "f2", "f3", "x", "y", "z"]
+    # One query per level, folders of a level are queried together
+    assert len(queries) == 3
+    assert "'f1' in parents or 'f2' in parents" in queries[1]
+
+
+def test_drive_index_find():
+    index = DriveIndex(":memory:")
+    index.apply(
+        "d",
+        [
+            DriveFile("a", "report", "text/plain", ("f",), "2024-01-02T00:00:00Z"),
+            DriveFile("b", "notes", "text/plain", ("g",), "2024-03-01T00:00:00Z"),
+        ],
+        [],
+    )
+    assert [f.id for f in index.find("d", parent="f")] == ["a"]
+    assert [f.id for f in index.find("d", modified_after="2024-02-01")] == ["b"]
+    assert index.get("d", "a").parents == ("f",)
+    index.apply("d", [], ["a"])
+    assert index.get("d", "a") is None
+    assert index.find("other") == []
+
+
+def test_sync_index(drive_session):
+    drive_session.service = MagicMock()
+    changes = drive_session.service.changes()
+    changes.getStartPageToken().execute.return_value = {"startPageToken": "t1"}
+    drive_session.service.files().list().execute.return_value = {
+        "files": [_file("a", "root"), _file("b", "root")]
+    }
+    drive = SharedDrive(session=drive_session, drive_id="root")
+    index = DriveIndex(":memory:")
+
+    result = drive.sync_index(index)
+    assert result == {"indexed": 2, "full_sync": True}
+    assert len(index.find("root")) == 2
+    assert index.page_token("root") == "t1"
+
+    changes.list().execute.side_effect = [
+        {
+            "changes": [{"changeType": "file", "fileId": "a", "removed": True}],
+            "nextPageToken": "t2",
+        },
+        {
+            "changes": [
+                {"changeType": "file", "fileId": "c", "file": _file("c", "root")},
+                {"fileId": "b", "file": {**_file("b", "root"), "trashed": True}},
+            ],
+            "newStartPageToken": "t3",
+        },
+    ]
+    result = drive.sync_index(index)
+    assert not result["full_sync"]
+    assert result["removed"] == ["a", "b"]
+    assert [f.id for f in index.find("root")] == ["c"]
+    assert index.page_token("root") == "t3"
+    assert changes.list.call_args.kwargs["pageToken"] == "t2"
+
+
+def test_create_drives_deterministic_request_ids(drive_session, fake_service):
+    drive_session.service = fake_service
+    drive_session.session = MagicMock()
+    drive_session.session.create.side_effect = lambda **kwargs: lambda: {
+        "id": kwargs["requestId"]
+    }
+    drive = SharedDrive(session=drive_session)
+    results = drive.create_drives(
+        [
+            {"name": "Finance", "key": "fin-1", "orgUnitId": "ou1"},
+            {"name": "HR", "key": "hr-1"},
+        ]
+    )
+    assert set(results) == {"fin-1", "hr-1"}
+    assert results["hr-1"].response["id"] == drive_request_id("hr-1")
+    assert drive_request_id("hr-1") == drive_request_id("hr-1")
+    body = drive_session.session.create.call_args_list[0].kwargs["body"]
+    assert body["name"] == "Finance" and body["orgUnitId"] == "ou1"
+    # The shared template is not modified
+    assert "name" not in SHARED_DRIVE
+
+
+def test_create_drives_requires_keys(drive_session):
+    drive = SharedDrive(session=drive_session)
+    with pytest.raises(ValueError):
+        drive.create_drives([{"name": "Finance"}])
+
+
+def test_create_drives_conflict_needs_the_created_drive(drive_session, fake_service):
+    drive_session.service = fake_service
+    drive_session.session = MagicMock()
+    journal = JobJournal("drives", ":memory:")
+    specs = [{"name": "Finance", "key": "fin-1"}, {"name": "HR", "key": "hr-1"}]
+    drive_session.session.create.side_effect = lambda **kwargs: lambda: {
+        "id": f"id-{kwargs['body']['name']}"
+    }
+    drive = SharedDrive(session=drive_session)
+    assert all(
+        result.ok for result in drive.create_drives(specs, journal=journal).values()
+    )
+
+    # The rerun conflicts, the HR drive was deleted since
+    conflict = HttpError(MagicMock(status=409), b"conflict")
+    drive_session.session.create.side_effect = lambda **kwargs: lambda: conflict
+    drive_session.session.get.side_effect = lambda driveId, fields: MagicMock(
+        execute=MagicMock(
+            side_effect=(
+                HttpError(MagicMock(status=404), b"not found")
+                if driveId == "id-HR"
+                else None
+            ),
+            return_value={"id": driveId},
+        )
+    )
+    results = drive.create_drives(specs, journal=journal)
+    assert results["fin-1"].ok and results["fin-1"].response is None
+    assert results["hr-1"].error is conflict
+    # Without a recorded drive a conflict cannot be confirmed
+    results = drive.create_drives(specs)
+    assert results["fin-1"].error is conflict
+
+
+def test_hide_drives_reports_per_drive(drive_session, fake_service):
+    drive_session.service = fake_service
+    drive_session.session = MagicMock()
+    error = HttpError(MagicMock(status=404), b"not found")
+    drive_session.session.hide.side_effect = lambda driveId: lambda: (
+        error if driveId == "missing" else {"id": driveId, "hidden": True}
+    )
+    results = SharedDrive(session=drive_session).hide_drives(["d1", "missing"])
+    assert results["d1"].ok
+    assert results["missing"].error is error
+    assert len(fake_service.batches) == 1
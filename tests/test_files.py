@@ -0,0 +1,227 @@
+import hashlib
+import re
+import httplib2
+import pytest
+from unittest.mock import MagicMock, call, patch
+from googau.files import DriveFiles, file_md5
+from googau.journal import JobJournal
+from googau.sessions import FilesSession
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture
+@patch("googau.sessions.FilesSession.__init__", return_value=None)
+def files_session(mock_init):
+    session = FilesSession()
+    session.session = MagicMock()
+    session.thread_http = MagicMock()
+    return session
+
+
+def _range_request():
+    request = MagicMock()
+    request.headers = {}
+
+    def execute(http=None):
+        start, end = map(int, re.findall(r"\d+", request.headers["Range"]))
+        return CONTENT[start : end + 1]
+
+    request.execute.side_effect = execute
+    return request
+
+
+def test_download(files_session, tmp_path):
+    files_session.session.get().execute.return_value = {
+        "id": "f",
+        "size": str(len(CONTENT)),
+        "md5Checksum": hashlib.md5(CONTENT).hexdigest(),
+    }
+    files_session.session.get_media.side_effect = lambda **kwargs: _range_request()
+    reports = []
+    path = tmp_path / "out.bin"
+    DriveFiles(files_session).download(
+        "f", str(path), chunk_size=1000, progress=lambda *args: reports.append(args)
+    )
+    assert path.read_bytes() == CONTENT
+    assert files_session.session.get_media.call_count == 11
+    assert reports[-1][:2] == (len(CONTENT), len(CONTENT))
+
+
+def test_download_checksum_mismatch(files_session, tmp_path):
+    files_session.session.get().execute.return_value = {
+        "size": str(len(CONTENT)),
+        "md5Checksum": "0" * 32,
+    }
+    files_session.session.get_media.side_effect = lambda **kwargs: _range_request()
+    with pytest.raises(ValueError):
+        DriveFiles(files_session).download("f", str(tmp_path / "out.bin"))
+
+
+def test_upload_resumes_from_journal(files_session, tmp_path):
+    path = tmp_path / "in.bin"
+    path.write_bytes(CONTENT)
+    response = {"id": "new", "md5Checksum": file_md5(str(path))}
+    journal = JobJournal("upload", ":memory:")
+
+    request = files_session.session.create.return_value
+    request.resumable_uri = "https://upload/session"
+    request.next_chunk.side_effect = [
+        (MagicMock(resumable_progress=4096), None),
+        OSError("connection reset"),
+    ]
+    with pytest.raises(OSError):
+        DriveFiles(files_session).upload(str(path), {"name": "in.bin"}, journal=journal)
+
+    # The rerun resumes the recorded session after the bytes it received
+    resumed = MagicMock()
+    resumed.http.request.return_value = (
+        httplib2.Response({"status": 308, "range": "bytes=0-8191"}),
+        b"",
+    )
+    resumed.next_chunk.return_value = (None, response)
+    files_session.session.create.return_value = resumed
+    result = DriveFiles(files_session).upload(str(path), journal=journal)
+    assert result == response
+    status_request = resumed.http.request.call_args
+    assert status_request.args == ("https://upload/session",)
+    assert status_request.kwargs["headers"]["Content-Range"] == "bytes */10240"
+    assert resumed.resumable_uri == "https://upload/session"
+    assert resumed.resumable_progress == 8192
+    # A finished upload is not sent again
+    assert DriveFiles(files_session).upload(str(path), journal=journal) == response
+    assert resumed.next_chunk.call_count == 1
+
+
+def test_upload_restarts_an_expired_session(files_session, tmp_path):
+    path = tmp_path / "in.bin"
+    path.write_bytes(CONTENT)
+    response = {"id": "new", "md5Checksum": file_md5(str(path))}
+    journal = JobJournal("upload", ":memory:")
+    key = f"upload:{path}"
+    journal.record({key: {"uri": "https://upload/old", "progress": 4096}})
+
+    request = files_session.session.create.return_value
+    request.resumable_uri = None
+    request.http.request.return_value = (httplib2.Response({"status": 404}), b"")
+    request.next_chunk.side_effect = [
+        (MagicMock(resumable_progress=8192), None),
+        (None, response),
+    ]
+    result = DriveFiles(files_session).upload(str(path), journal=journal)
+    assert result == response
+    # The upload started over in a new session
+    assert request.resumable_uri is None
+    assert request.next_chunk.call_count == 2
+    assert journal.payloads([key]) == {key: {"response": response}}
+
+
+class FakeDownload:
+    """Media download that writes the file id in two chunks."""
+
+    def __init__(self, output, request, chunksize):
+        self.output = output
+        self.chunks = [request.file_id.encode(), b"!"]
+
+    def next_chunk(self, num_retries=0):
+        self.output.write(self.chunks.pop(0))
+        return None, not self.chunks
+
+
+def _export_session(files_session, fake_service, files):
+    files_session.service = fake_service
+    files_session.session.get.side_effect = lambda fileId, **kwargs: lambda: files[
+        fileId
+    ]
+    files_session.session.export_media.side_effect = lambda fileId, mimeType: (
+        MagicMock(file_id=fileId)
+    )
+
+
+@patch("googau.files.MediaIoBaseDownload", FakeDownload)
+def test_export_with_manifest(files_session, fake_service, tmp_path):
+    files = {
+        "d1": {
+            "id": "d1",
+            "name": "Report: Q1",
+            "mimeType": "application/vnd.google-apps.document",
+            "modifiedTime": "2024-01-01T00:00:00Z",
+        },
+        "p1": {"id": "p1", "name": "photo", "mimeType": "image/jpeg"},
+    }
+    _export_session(files_session, fake_service, files)
+    manifest = JobJournal("export", ":memory:")
+    exporter = DriveFiles(files_session)
+
+    results = exporter.export(str(tmp_path), ["d1", "p1"], manifest=manifest)
+    path = tmp_path / "Report_ Q1_d1.pdf"
+    assert results["d1"].response == {"path": str(path), "skipped": False}
+    assert path.read_bytes() == b"d1!"
+    assert isinstance(results["p1"].error, ValueError)
+
+    results = exporter.export(str(tmp_path), ["d1"], manifest=manifest)
+    assert results["d1"].response["skipped"]
+    assert files_session.session.export_media.call_count == 1
+
+    files["d1"]["modifiedTime"] = "2024-02-01T00:00:00Z"
+    results = exporter.export(str(tmp_path), ["d1"], manifest=manifest)
+    assert not results["d1"].response["skipped"]
+
+
+class FlakyDownload(FakeDownload):
+    """Media download whose second chunk fails as often as the file id says."""
+
+    def __init__(self, output, request, chunksize):
+        super().__init__(output, request, chunksize)
+        self.failures = int(request.file_id[-1])
+
+    def next_chunk(self, num_retries=0):
+        if len(self.chunks) == 1 and self.failures:
+            self.failures -= 1
+            raise OSError("connection reset")
+        return super().next_chunk(num_retries)
+
+
+@patch("googau.quota.time.sleep")
+@patch("googau.files.MediaIoBaseDownload", FlakyDownload)
+def test_export_retries_chunks_and_removes_partial_files(
+    mock_sleep, files_session, fake_service, tmp_path
+):
+    files = {
+        file_id: {"id": file_id, "name": "doc", "mimeType": "image/png"}
+        for file_id in ("f1", "f5")
+    }
+    _export_session(files_session, fake_service, files)
+    limiter = MagicMock()
+    results = DriveFiles(files_session, limiter=limiter).export(
+        str(tmp_path), ["f1", "f5"], formats={"image/png": "image/png"}
+    )
+    assert (tmp_path / "doc_f1.png").read_bytes() == b"f1!"
+    assert isinstance(results["f5"].error, OSError)
+    # The partial export of the failed file is removed
+    assert [path.name for path in tmp_path.iterdir()] == ["doc_f1.png"]
+    # Every chunk attempt is paced: 3 of f1, 1 + 5 of f5
+    assert limiter.acquire.call_args_list.count(call(1.0)) == 9
+
+
+@patch("googau.files.MediaIoBaseDownload", FakeDownload)
+def test_export_by_query(files_session, fake_service, tmp_path):
+    files_session.service = fake_service
+    files_session.session.list().execute.return_value = {
+        "files": [
+            {
+                "id": "s1",
+                "name": "data",
+                "mimeType": "application/vnd.google-apps.spreadsheet",
+            }
+        ]
+    }
+    files_session.session.export_media.side_effect = lambda fileId, mimeType: (
+        MagicMock(file_id=fileId)
+    )
+    results = DriveFiles(files_session).export(
+        str(tmp_path),
+        query="'folder' in parents",
+        formats={"application/vnd.google-apps.spreadsheet": "text/csv"},
+    )
+    assert results["s1"].response["path"].endswith("data_s1.csv")
@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from googau.gmail import GmailSession, GmailMailbox
+from googau.journal import JobJournal
 
 
 @pytest.fixture
@@ -50,3 +51,21 @@ def test_get_messages_mailbox_no_msg_ids(gmail_mailbox):
     messages = gmail_mailbox.get_messages()
     assert isinstance(messages, list)
     assert len(messages) == 0
+
+
+@patch("googau.gmail.time.sleep")
+@patch("googau.gmail.GmailSession.__init__", return_value=None)
+def test_modify_messages_skips_journaled_chunks(mock_init, mock_sleep):
+    session = GmailSession()
+    session.service = MagicMock()
+    session.messages = MagicMock()
+    mailbox = GmailMailbox(session)
+    journal = JobJournal("modify", path=":memory:")
+    journal.record_keys(["m1"])
+
+    mailbox.modify_messages(msg_ids=["m1", "m2"], add_label_ids=["L1"], journal=journal)
+
+    session.messages().batchModify.assert_called_once_with(
+        userId="me",
+        body={"ids": ["m2"], "addLabelIds": ["L1"], "removeLabelIds": []},
+    )
@@ -0,0 +1,43 @@
+"""Test the journal module."""
+
+from unittest.mock import MagicMock
+from googau.journal import JobJournal
+
+
+def test_record_and_pending():
+    journal = JobJournal("job", path=":memory:")
+    journal.record({"a": {"id": "a"}, "b": None})
+    assert journal.is_done("a")
+    assert journal.pending(["a", "b", "c"]) == ["c"]
+    assert journal.payloads(["a", "c"]) == {"a": {"id": "a"}}
+    journal.discard(["a"])
+    assert journal.pending(["a", "b"]) == ["a"]
+
+
+def test_jobs_are_isolated(tmp_path):
+    path = str(tmp_path / "journal.sqlite3")
+    with JobJournal("first", path=path) as journal:
+        journal.record_keys(["a"])
+    with JobJournal("second", path=path) as journal:
+        assert journal.pending(["a"]) == ["a"]
+    with JobJournal("first", path=path) as journal:
+        assert journal.pending(["a"]) == []
+        journal.clear()
+        assert journal.pending(["a"]) == ["a"]
+
+
+def test_paginate_resumes_from_recorded_pages():
+    pages = {
+        None: {"files": [1, 2], "nextPageToken": "p2"},
+        "p2": {"files": [3], "nextPageToken": "p3"},
+        "p3": {"files": [4]},
+    }
+    fetch_page = MagicMock(side_effect=lambda token: pages[token])
+    journal = JobJournal("listing", path=":memory:")
+
+    listing = journal.paginate(fetch_page, "files")
+    assert [next(listing), next(listing), next(listing)] == [1, 2, 3]
+    # Simulate a crash before the last page was fetched
+    fetch_page.reset_mock()
+    assert list(journal.paginate(fetch_page, "files")) == [1, 2, 3, 4]
+    fetch_page.assert_called_once_with("p3")
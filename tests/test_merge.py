@@ -0,0 +1,119 @@
+from unittest.mock import MagicMock
+import pytest
+from googleapiclient.errors import HttpError
+from googau.journal import JobJournal
+from googau.merge import MailMerge, rows_from_sheet
+
+ROWS = [
+    {"id": "1", "name": "Ann", "city": "Oslo"},
+    {"id": "2", "name": "Ben", "city": None},
+    {"id": "3", "name": "Cid", "city": "Rome"},
+]
+
+
+def _merge(fake_service, journal=None, fail_fill=()):
+    files_session = MagicMock()
+    files_session.service = fake_service
+    files_session.session.copy.side_effect = lambda **kwargs: lambda: {
+        "id": f"doc-{kwargs['body']['name']}"
+    }
+    doc_session = MagicMock()
+
+    def batch_update(documentId, body):
+        request = MagicMock()
+        if documentId in fail_fill:
+            request.execute.side_effect = HttpError(MagicMock(status=400), b"bad")
+        else:
+            request.execute.return_value = {"replies": []}
+        return request
+
+    doc_session.session.batchUpdate.side_effect = batch_update
+    return MailMerge(files_session, doc_session, "template", journal=journal)
+
+
+def test_replacements():
+    requests = MailMerge.replacements({"name": "Ann", "city": None})
+    assert requests[0]["replaceAllText"] == {
+        "containsText": {"text": "{{name}}", "matchCase": True},
+        "replaceText": "Ann",
+    }
+    assert requests[1]["replaceAllText"]["replaceText"] == ""
+
+
+def test_run(fake_service):
+    merge = _merge(fake_service)
+    results = merge.run(ROWS, "id", name="Letter {name}", batch_size=2)
+    assert results["1"].response == {"documentId": "doc-Letter Ann"}
+    assert len(fake_service.batches) == 2
+    assert merge.doc_session.session.batchUpdate.call_count == 3
+    body = merge.doc_session.session.batchUpdate.call_args.kwargs["body"]
+    assert len(body["requests"]) == 3
+
+
+def test_run_resumes_by_row_key(fake_service):
+    journal = JobJournal("merge", ":memory:")
+    merge = _merge(fake_service, journal, fail_fill=("doc-2",))
+    results = merge.run(ROWS, "id")
+    assert not results["2"].ok
+    # The copy that could not be filled can still be found
+    assert results["2"].response == {"documentId": "doc-2"}
+    assert merge.files_session.session.copy.call_count == 3
+
+    merge = _merge(fake_service, journal)
+    results = merge.run(ROWS, "id")
+    assert all(result.ok for result in results.values())
+    # Finished rows are skipped, the copy of the failed row is filled again
+    merge.files_session.session.copy.assert_not_called()
+    merge.doc_session.session.batchUpdate.assert_called_once()
+    assert results["2"].response == {"documentId": "doc-2"}
+
+
+def test_run_journals_copies_of_an_interrupted_batch(fake_service):
+    journal = JobJournal("merge", ":memory:")
+    merge = _merge(fake_service, journal)
+
+    def copy(**kwargs):
+        def request():
+            if kwargs["body"]["name"] == "3":
+                raise RuntimeError("interrupted")
+            return {"id": f"doc-{kwargs['body']['name']}"}
+
+        return request
+
+    merge.files_session.session.copy.side_effect = copy
+    with pytest.raises(RuntimeError):
+        merge.run(ROWS, "id")
+
+    merge = _merge(fake_service, journal)
+    results = merge.run(ROWS, "id")
+    assert all(result.ok for result in results.values())
+    # Only the row whose copy was not made is copied again
+    merge.files_session.session.copy.assert_called_once()
+    assert merge.doc_session.session.batchUpdate.call_count == 3
+
+
+def test_run_rejects_duplicate_keys(fake_service):
+    merge = _merge(fake_service)
+    with pytest.raises(ValueError):
+        merge.run([*ROWS, {"id": "1", "name": "Dan"}], "id", batch_size=2)
+    # The rows of the first batch were merged before the duplicate was read
+    assert merge.doc_session.session.batchUpdate.call_count == 2
+
+
+def test_run_skips_rows_without_key(fake_service):
+    merge = _merge(fake_service)
+    rows = [{"id": "", "name": "Nobody"}, {"id": None, "name": ""}, *ROWS]
+    results = merge.run(rows, "id", batch_size=2)
+    assert sorted(results) == ["1", "2", "3"]
+    assert merge.files_session.session.copy.call_count == 3
+
+
+def test_rows_from_sheet():
+    spreadsheet = MagicMock()
+    spreadsheet.iter_rows.return_value = iter(
+        [["id", "name"], ["1", "Ann"], [], ["", ""], ["2"]]
+    )
+    assert list(rows_from_sheet(spreadsheet, "Data")) == [
+        {"id": "1", "name": "Ann"},
+        {"id": "2", "name": ""},
+    ]
@@ -0,0 +1,69 @@
+from unittest.mock import MagicMock
+from googleapiclient.errors import HttpError
+from googau.permissions import PermissionAuditor, PermissionChange, PermissionRecord
+
+
+def _session(fake_service):
+    session = MagicMock()
+    session.service = fake_service
+    return session
+
+
+def test_iter_permissions_follows_pages(fake_service):
+    pages = {
+        ("a", None): {
+            "permissions": [{"id": "p1", "type": "anyone", "role": "reader"}],
+            "nextPageToken": "next",
+        },
+        ("a", "next"): {"permissions": [{"id": "p2", "type": "user", "role": "writer"}]},
+        ("b", None): {"permissions": []},
+    }
+    error = HttpError(MagicMock(status=404), b"not found")
+
+    def list_permissions(fileId, pageToken, **kwargs):
+        return lambda: pages.get((fileId, pageToken), error)
+
+    fake_service.permissions().list.side_effect = list_permissions
+    auditor = PermissionAuditor(_session(fake_service))
+    errors = {}
+    records = list(auditor.iter_permissions(["a", "b", "c"], errors=errors))
+    assert [(r.fileId, r.id) for r in records] == [("a", "p1"), ("a", "p2")]
+    assert errors == {"c": error}
+    assert len(fake_service.batches) == 2
+
+
+def test_plan_changes():
+    records = [
+        PermissionRecord("f", "p1", "anyone", "reader"),
+        PermissionRecord("f", "p2", "user", "writer", "bob@other.com"),
+        PermissionRecord("f", "p3", "user", "writer", "amy@example.com"),
+        PermissionRecord("f", "p4", "user", "owner", "eve@other.com"),
+    ]
+    changes = PermissionAuditor.plan_changes(
+        records,
+        downgrade={"writer": "reader", "owner": "reader"},
+        allowed_domains=["example.com"],
+    )
+    assert changes == [
+        PermissionChange("f", "p1"),
+        PermissionChange("f", "p2", "reader"),
+    ]
+
+
+def test_apply_changes(fake_service):
+    permissions = fake_service.permissions()
+    permissions.delete.side_effect = lambda **kwargs: lambda: HttpError(
+        MagicMock(status=404), b"gone"
+    )
+    permissions.update.side_effect = lambda **kwargs: lambda: {"role": "reader"}
+    auditor = PermissionAuditor(_session(fake_service))
+    changes = [PermissionChange("f", "p1"), PermissionChange("f", "p2", "reader")]
+
+    preview = auditor.apply_changes(changes, dry_run=True)
+    assert preview["f/p2"].response == changes[1]
+    assert not fake_service.batches
+
+    results = auditor.apply_changes(changes)
+    assert results["f/p1"].ok
+    assert results["f/p2"].response == {"role": "reader"}
+    assert permissions.update.call_args.kwargs["body"] == {"role": "reader"}
@@ -0,0 +1,36 @@
+"""Test the quota module."""
+
+from unittest.mock import MagicMock, patch
+import pytest
+from googleapiclient.errors import HttpError
+from googau.quota import QuotaLimiter, execute_with_retries
+
+
+def test_limiter_paces_requests():
+    limiter = QuotaLimiter(rate=10, burst=2)
+    with patch("googau.quota.time.sleep") as mock_sleep:
+        limiter.acquire()
+        limiter.acquire()
+        mock_sleep.assert_not_called()
+        mock_sleep.side_effect = lambda seconds: setattr(limiter, "_tokens", 1)
+        limiter.acquire()
+        mock_sleep.assert_called_once()
+
+
+@patch("googau.quota.time.sleep")
+def test_execute_with_retries_retries_transient_errors(mock_sleep):
+    request = MagicMock()
+    request.execute.side_effect = [
+        HttpError(MagicMock(status=503), b"unavailable"),
+        {"ok": True},
+    ]
+    assert execute_with_retries(request) == {"ok": True}
+    assert request.execute.call_count == 2
+
+
+def test_execute_with_retries_raises_client_errors():
+    request = MagicMock()
+    request.execute.side_effect = HttpError(MagicMock(status=400), b"bad request")
+    with pytest.raises(HttpError):
+        execute_with_retries(request)
+    request.execute.assert_called_once()
@@ -0,0 +1,72 @@
+"""Test the ranges module."""
+
+import pytest
+from googau.ranges import (
+    A1Range,
+    parse_a1,
+    column_index,
+    column_letters,
+    merge_ranges,
+    parse_cell,
+    quote_sheet_title,
+    split_a1,
+)
+
+
+@pytest.mark.parametrize(
+    "index, letters", [(0, "A"), (25, "Z"), (26, "AA"), (701, "ZZ")]
+)
+def test_column_letters_roundtrip(index, letters):
+    assert column_letters(index) == letters
+    assert column_index(letters) == index
+
+
+def test_split_a1_unquotes_sheet_title():
+    assert split_a1(quote_sheet_title("Bob's data") + "!A1:B2") == (
+        "Bob's data",
+        "A1:B2",
+    )
+    assert split_a1("A1") == (None, "A1")
+
+
+def test_parse_cell():
+    assert parse_cell("$B$3") == (2, 1)
+    assert parse_cell("C") == (None, 2)
+    assert parse_cell("10") == (9, None)
+    with pytest.raises(ValueError):
+        parse_cell("1A")
+
+
+@pytest.mark.parametrize(
+    "a1, expected",
+    [
+        ("'S 1'!A1:B2", A1Range("S 1", 0, 0, 2, 2)),
+        ("C5", A1Range(None, 4, 2, 5, 3)),
+        ("A:C", A1Range(None, None, 0, None, 3)),
+        ("2:5", A1Range(None, 1, None, 5, None)),
+        ("Data", A1Range("Data")),
+    ],
+)
+def test_parse_a1_roundtrip(a1, expected):
+    assert parse_a1(a1) == expected
+    assert parse_a1(expected.to_a1()) == expected
+
+
+def test_sub_range():
+    assert parse_a1("Data!B2:D9").sub_range(1, 1, 2, 2).to_a1() == "'Data'!C3:D4"
+
+
+def test_merge_ranges_coalesces_overlapping_and_adjacent():
+    ranges = [parse_a1(a1) for a1 in ["A1:C100", "B50:D200", "Sheet2!A:A", "E1:E10"]]
+    merged = {r.to_a1() for r in merge_ranges(ranges)}
+    assert merged == {"A1:E200", "'Sheet2'!A:A"}
+    # Ranges that only share a corner are kept apart
+    assert len(merge_ranges([parse_a1("A1:A5"), parse_a1("B6:B7")])) == 2
+
+
+def test_contains_and_slice():
+    outer = parse_a1("B2:D4")
+    inner = parse_a1("C3:D4")
+    assert outer.contains(inner) and not inner.contains(outer)
+    values = [["b2", "c2", "d2"], ["b3", "c3", ""], ["b4", "", ""]]
+    assert inner.slice(outer, values) == [["c3"]]
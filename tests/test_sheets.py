@@ -1,8 +1,22 @@
 """Test the sheets module."""
 
+import copy
+import math
+from array import array
 import pytest
 from unittest.mock import MagicMock, patch
-from googau.sheets import SpreadSheet, WorkSheet
+from googau.constants.sheets_constants import CONDITIONAL_FORMATTING_RULE
+from googleapiclient.errors import HttpError
+from googau.journal import JobJournal
+from googau.quota import QuotaLimiter
+from googau.sheets import (
+    ReadPlanner,
+    RowAppender,
+    SpreadSheet,
+    WorkSheet,
+    build_cf_requests,
+    diff_rectangles,
+)
 
 # pylint: disable=import-outside-toplevel
 
@@ -43,17 +57,49 @@ def test_add_row(mock_spreadsheet):
 
 
 def test_list_worksheets(mock_spreadsheet):
-    mock_spreadsheet.list_worksheets = MagicMock(return_value={"Sheet1": "id1"})
-    assert mock_spreadsheet.list_worksheets() == {"Sheet1": "id1"}
+    mock_spreadsheet.session.session.get.return_value.execute.return_value = {
+        "sheets": [{"properties": {"sheetId": 0, "title": "Sheet1"}}]
+    }
+    worksheets = mock_spreadsheet.list_worksheets()
+    assert list(worksheets) == ["Sheet1"]
+    assert worksheets["Sheet1"].sheetId == 0
+    # The metadata is cached
+    assert mock_spreadsheet.sheet_id("Sheet1") == 0
+    mock_spreadsheet.session.session.get.assert_called_once()
 
 
 def test_new_worksheet(mock_spreadsheet, mock_worksheet):
-    mock_spreadsheet.session.batchUpdate = MagicMock(
+    mock_spreadsheet.session.session.batchUpdate = MagicMock(
         return_value=MagicMock(execute=MagicMock(return_value={"status": "success"}))
     )
     result = mock_spreadsheet.new_worksheet(mock_worksheet)
     assert result == {"status": "success"}
-    mock_spreadsheet.session.batchUpdate.assert_called_once()
+    mock_spreadsheet.session.session.batchUpdate.assert_called_once()
+
+
+def test_batch_update_patches_metadata(mock_spreadsheet):
+    session = mock_spreadsheet.session.session
+    session.get.return_value.execute.return_value = {
+        "sheets": [{"properties": {"sheetId": 0, "title": "Sheet1"}}]
+    }
+    mock_spreadsheet.list_worksheets()
+    session.batchUpdate.return_value.execute.return_value = {
+        "replies": [{"addSheet": {"properties": {"sheetId": 7, "title": "New"}}}, {}]
+    }
+    mock_spreadsheet.batch_update(
+        [
+            {"addSheet": {"properties": {"title": "New"}}},
+            {"deleteSheet": {"sheetId": 0}},
+        ]
+    )
+    assert list(mock_spreadsheet.list_worksheets()) == ["New"]
+    assert mock_spreadsheet.sheet_id("New") == 7
+    session.get.assert_called_once()
+
+    session.batchUpdate.return_value.execute.return_value = {"replies": [{}]}
+    mock_spreadsheet.batch_update([{"appendDimension": {"sheetId": 7, "length": 5}}])
+    mock_spreadsheet.list_worksheets()
+    assert session.get.call_count == 2
 
 
 def test_get_cell_range(mock_spreadsheet):
@@ -83,19 +129,396 @@ def test_worksheet_to_json(mock_worksheet):
     assert mock_worksheet.to_json() == expected_json
 
 
-# decorator to disable test
-@pytest.mark.skip("test_apply_cf_to_range is not implemented correctly")
-@patch(
-    "googau.sheets.SheetsSession().session.batchUpdate",
-    return_value=MagicMock(execute=MagicMock(return_value={"status": "success"})),
-)
-def test_apply_cf_to_range(mock_batch_update, mock_spreadsheet):
-    sample_range = [0, 1, 2, 3]
+def test_apply_cf_to_range(mock_worksheet):
+    sheet_session = MagicMock()
+    sheet_session.session.batchUpdate.return_value.execute.return_value = {
+        "status": "success"
+    }
     cf_style_dict = {
         "condition1": {"blue": 1, "green": 1, "red": 1},
+        "condition2": {"blue": 0, "green": 0.5, "red": 0},
     }
-    result = mock_spreadsheet.apply_cf_to_range(
-        "spreadsheet_id", sample_range, cf_style_dict, mock_spreadsheet.session
+    result = mock_worksheet.apply_cf_to_range(
+        "spreadsheet_id", 0, cf_style_dict, sheet_session
     )
     assert result == {"status": "success"}
-    mock_batch_update.assert_called_once()
+    sheet_session.session.batchUpdate.assert_called_once()
+    requests = sheet_session.session.batchUpdate.call_args.kwargs["body"]["requests"]
+    assert len(requests) == 2
+    rules = [request["addConditionalFormatRule"]["rule"] for request in requests]
+    assert rules[0]["booleanRule"]["condition"]["values"][0]["userEnteredValue"] == (
+        "condition1"
+    )
+    assert rules[1]["booleanRule"]["format"]["backgroundColor"]["green"] == 0.5
+    assert rules[0]["ranges"][0]["sheetId"] == 0
+
+
+def test_build_cf_requests_does_not_mutate_template():
+    template = copy.deepcopy(CONDITIONAL_FORMATTING_RULE)
+    build_cf_requests({"sheetId": 1}, {"x": {"blue": 1, "green": 1, "red": 1}})
+    assert CONDITIONAL_FORMATTING_RULE == template
+
+
+def test_apply_formatting_plan(mock_spreadsheet):
+    mock_spreadsheet.session.session.batchUpdate.reset_mock()
+    plan = [
+        {
+            "ranges": [1, {"sheetId": 2}],
+            "styles": {"a": {"blue": 1, "green": 1, "red": 1}},
+        },
+        {"ranges": 3, "styles": {"b": {"blue": 0, "green": 0, "red": 1}}},
+    ]
+    mock_spreadsheet.apply_formatting_plan(plan)
+    mock_spreadsheet.session.session.batchUpdate.assert_called_once()
+    body = mock_spreadsheet.session.session.batchUpdate.call_args.kwargs["body"]
+    assert len(body["requests"]) == 2
+
+
+def test_get_cell_ranges(mock_spreadsheet):
+    batch_get = mock_spreadsheet.session.session.values().batchGet
+    batch_get().execute.return_value = {
+        "valueRanges": [{"values": [["A1"]]}, {"range": "B1:B2"}]
+    }
+    batch_get.reset_mock()
+    result = mock_spreadsheet.get_cell_ranges(["A1", "B1:B2"])
+    assert result == {"A1": [["A1"]], "B1:B2": []}
+    batch_get.assert_called_once_with(
+        spreadsheetId="spreadsheet_id", ranges=["A1", "B1:B2"]
+    )
+
+
+def test_update_cell_ranges_splits_by_payload_size(mock_spreadsheet):
+    batch_update = mock_spreadsheet.session.session.values().batchUpdate
+    batch_update().execute.return_value = {"responses": [{"updatedCells": 1}]}
+    batch_update.reset_mock()
+    with patch("googau.sheets.MAX_REQUEST_PAYLOAD_BYTES", 50):
+        result = mock_spreadsheet.update_cell_ranges({"A1": [["x"]], "B1": [["y"]]})
+    assert result == {"A1": {"updatedCells": 1}, "B1": {"updatedCells": 1}}
+    assert batch_update.call_count == 2
+
+
+def test_row_appender_flushes_on_row_threshold(mock_spreadsheet):
+    append = mock_spreadsheet.session.session.values().append
+    append().execute.return_value = {"updates": {"updatedRange": "Log!A1:B2"}}
+    append.reset_mock()
+    with RowAppender(mock_spreadsheet, "Log", max_rows=2) as appender:
+        appender.extend([[1, "a"], [2, "b"], [3, "c"]])
+        assert append.call_count == 1
+    assert append.call_count == 2
+    assert appender.rows_written == 3
+    assert append.call_args.kwargs["body"] == {"values": [[3, "c"]]}
+    assert append.call_args.kwargs["range"] == "'Log'!A1"
+
+
+def _failing_append(values, first_result):
+    """Let the first append succeed and the following ones fail with 503."""
+    outcomes = iter([first_result])
+
+    def execute(*args, **kwargs):
+        outcome = next(outcomes, None)
+        if outcome is None:
+            raise HttpError(MagicMock(status=503), b"Service unavailable")
+        return outcome
+
+    values.append().execute.side_effect = execute
+    values.append.reset_mock()
+
+
+@patch("googau.quota.time.sleep")
+def test_row_appender_retry_does_not_duplicate_rows(mock_sleep, mock_spreadsheet):
+    values = mock_spreadsheet.session.session.values()
+    _failing_append(values, {"updates": {"updatedRange": "'Log'!A1:B3"}})
+    values.get().execute.return_value = {"values": [[1.0, "a"], [2, "b", ""]]}
+    values.get.reset_mock()
+    appender = RowAppender(mock_spreadsheet, "Log")
+    appender.extend([["h", "x"], [0, "y"], [0, "z"]])
+    appender.flush()
+    appender.extend([[1, "a"], [2, "b"]])
+    appender.flush()
+    # The read back shows the rows landed, so they are not sent again
+    assert values.append.call_count == 2
+    assert values.get.call_args.kwargs["range"] == "'Log'!4:6"
+    assert appender.rows_written == 5
+
+
+@patch("googau.quota.time.sleep")
+def test_row_appender_retries_rows_that_did_not_land(mock_sleep, mock_spreadsheet):
+    values = mock_spreadsheet.session.session.values()
+    _failing_append(values, {"updates": {"updatedRange": "'Log'!A1:B1"}})
+    # The first column matches, another one does not
+    values.get().execute.return_value = {"values": [[1, "other"]]}
+    appender = RowAppender(mock_spreadsheet, "Log", max_retries=3)
+    appender.append(["h", "x"])
+    appender.flush()
+    appender.append([1, "a"])
+    with pytest.raises(HttpError):
+        appender.flush()
+    assert values.append.call_count == 4
+    assert appender.rows_written == 1
+    # The rows stay queued for the next flush
+    assert appender._buffer == [[1, "a"]]
+
+
+def test_row_appender_first_flush_failure_is_not_guessed(mock_spreadsheet):
+    values = mock_spreadsheet.session.session.values()
+    _failing_append(values, None)
+    appender = RowAppender(mock_spreadsheet, "Log")
+    appender.append([1])
+    with pytest.raises(RuntimeError):
+        appender.flush()
+    assert values.append.call_count == 1
+    values.get.assert_not_called()
+    # The rows are kept apart instead of being sent again
+    assert appender.unverified == [[[1]]]
+    assert appender.flush() is None
+
+
+def test_row_appender_context_does_not_resend_unverified_rows(mock_spreadsheet):
+    values = mock_spreadsheet.session.session.values()
+    _failing_append(values, None)
+    with pytest.raises(RuntimeError):
+        with RowAppender(mock_spreadsheet, "Log", max_rows=2) as appender:
+            appender.extend([[1], [2]])
+    assert values.append.call_count == 1
+    assert appender.unverified == [[[1], [2]]]
+
+
+def test_row_appender_context_keeps_the_original_error(mock_spreadsheet):
+    values = mock_spreadsheet.session.session.values()
+    _failing_append(values, None)
+    with pytest.raises(KeyError):
+        with RowAppender(mock_spreadsheet, "Log") as appender:
+            appender.append([1])
+            raise KeyError("row")
+    # The failed flush on exit did not replace the error of the block
+    assert values.append.call_count == 1
+
+
+def test_worksheet_add_row_buffers_rows(mock_spreadsheet, mock_worksheet):
+    append = mock_spreadsheet.session.session.values().append
+    append().execute.return_value = {}
+    append.reset_mock()
+    appender = mock_worksheet.add_row(["a"], mock_spreadsheet)
+    assert mock_worksheet.add_row(["b"], mock_spreadsheet) is appender
+    append.assert_not_called()
+    appender.close()
+    assert append.call_args.kwargs["body"] == {"values": [["a"], ["b"]]}
+    assert "_appender" not in mock_worksheet.to_json()
+
+
+def test_worksheet_count_rows_uses_grid_properties(mock_worksheet):
+    mock_worksheet.gridProperties = {"rowCount": 1000, "columnCount": 26}
+    assert mock_worksheet.count_rows(MagicMock()) == 1000
+
+
+def test_iter_rows_reads_in_chunks(mock_spreadsheet):
+    mock_spreadsheet.session.session.get().execute.return_value = {
+        "sheets": [{"properties": {"title": "Data", "gridProperties": {"rowCount": 5}}}]
+    }
+    chunks = {
+        "'Data'!1:2": [["a"], ["b"]],
+        "'Data'!3:4": [["c"]],
+        "'Data'!5:5": [["e"]],
+    }
+    values = mock_spreadsheet.session.session.values()
+    values.get.side_effect = lambda spreadsheetId, range: MagicMock(
+        execute=MagicMock(return_value={"values": chunks[range]})
+    )
+    rows = list(mock_spreadsheet.iter_rows("Data", chunk_rows=2))
+    # The empty row 4 keeps row 5 in place
+    assert rows == [["a"], ["b"], ["c"], [], ["e"]]
+    batches = list(mock_spreadsheet.iter_rows("Data", chunk_rows=2, batches=True))
+    assert batches == [[["a"], ["b"]], [["c"]], [[], ["e"]]]
+
+
+def test_iter_rows_stops_after_the_data(mock_spreadsheet):
+    mock_spreadsheet.session.session.get().execute.return_value = {
+        "sheets": [
+            {"properties": {"title": "Data", "gridProperties": {"rowCount": 1000}}}
+        ]
+    }
+    values = mock_spreadsheet.session.session.values()
+    values.get.side_effect = lambda spreadsheetId, range: MagicMock(
+        execute=MagicMock(
+            return_value=(
+                {"values": [["a"], [], ["c"]]} if range == "'Data'!1:100" else {}
+            )
+        )
+    )
+    rows = list(mock_spreadsheet.iter_rows("Data", chunk_rows=100, prefetch=False))
+    assert rows == [["a"], [], ["c"]]
+    # The empty second window ends the iteration
+    assert values.get.call_count == 2
+
+
+def test_get_columns_infers_types(mock_spreadsheet):
+    mock_spreadsheet.session.session.values().get().execute.return_value = {
+        "values": [["id", 1, 2, 3], ["score", 1.5, "", 2], ["name", "a"], ["ok", True]]
+    }
+    with patch("googau.sheets.np", None):
+        columns = mock_spreadsheet.get_columns("A1:D4", header=True)
+    assert columns["id"] == array("q", [1, 2, 3])
+    assert columns["score"][0] == 1.5 and math.isnan(columns["score"][1])
+    assert columns["name"] == ["a", None, None]
+    assert columns["ok"] == [True, None, None]
+
+
+def test_write_columns_serializes_arrays(mock_spreadsheet):
+    update = mock_spreadsheet.session.session.values().update
+    update.reset_mock()
+    with patch("googau.sheets.np", None):
+        mock_spreadsheet.write_columns(
+            "A1", {"id": array("q", [1, 2]), "score": array("d", [0.5, math.nan])}
+        )
+    assert update.call_args.kwargs["body"] == {
+        "majorDimension": "COLUMNS",
+        "values": [["id", 1, 2], ["score", 0.5, ""]],
+    }
+
+
+def test_columns_roundtrip_with_numpy(mock_spreadsheet):
+    np = pytest.importorskip("numpy")
+    mock_spreadsheet.session.session.values().get().execute.return_value = {
+        "values": [[1, 2], [0.5, ""]]
+    }
+    columns = mock_spreadsheet.get_columns("A1:B2")
+    assert columns[0].dtype == np.int64
+    assert np.isnan(columns[1][1])
+    update = mock_spreadsheet.session.session.values().update
+    mock_spreadsheet.write_columns("A1", columns)
+    assert update.call_args.kwargs["body"]["values"] == [[1, 2], [0.5, ""]]
+
+
+def test_diff_rectangles_merges_rows():
+    old = [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    new = [[1, "x", 3], [4, "y", 6], [7, 8, 9, "z"]]
+    assert diff_rectangles(old, new) == [(0, 1, 2, 2), (2, 3, 3, 4)]
+    assert diff_rectangles(old, [row[:] for row in old]) == []
+    assert diff_rectangles([[1, 2, 3]], [["a", 2, "c"]], max_gap=1) == [(0, 0, 1, 3)]
+
+
+def test_sync_cell_range_writes_only_changes(mock_spreadsheet):
+    values = mock_spreadsheet.session.session.values()
+    values.get().execute.return_value = {"values": [[1, 2], [3, 4]]}
+    values.batchUpdate().execute.return_value = {"responses": [{}]}
+    values.batchUpdate.reset_mock()
+    result = mock_spreadsheet.sync_cell_range("'Dash'!B2:C3", [[1, 2], [3, 5]])
+    assert result == {"ranges": ["'Dash'!C3"], "updated_cells": 1, "saved_cells": 3}
+    data = values.batchUpdate.call_args.kwargs["body"]["data"]
+    assert data == [{"range": "'Dash'!C3", "values": [[5]]}]
+
+    # The written values are cached, an unchanged sync sends nothing
+    values.get.reset_mock()
+    values.batchUpdate.reset_mock()
+    result = mock_spreadsheet.sync_cell_range("'Dash'!B2:C3", [[1, 2], [3, 5]])
+    assert result["updated_cells"] == 0
+    values.get.assert_not_called()
+    values.batchUpdate.assert_not_called()
+
+
+def test_update_cell_range_splits_large_writes(mock_spreadsheet):
+    update = mock_spreadsheet.session.session.values().update
+    update().execute.return_value = {"updatedRows": 2, "updatedCells": 4}
+    update.reset_mock()
+    rows = [["a" * 10, "b"] for _ in range(6)]
+    result = mock_spreadsheet.update_cell_range(
+        "'Data'!B2", rows, max_bytes=40, limiter=QuotaLimiter(1000)
+    )
+    chunk_ranges = sorted(call.kwargs["range"] for call in update.call_args_list)
+    assert chunk_ranges == ["'Data'!B2:C3", "'Data'!B4:C5", "'Data'!B6:C7"]
+    assert result["updatedCells"] == 12
+    assert result["updatedRows"] == 6
+
+
+def test_update_cell_range_skips_journaled_chunks(mock_spreadsheet):
+    update = mock_spreadsheet.session.session.values().update
+    update().execute.return_value = {"updatedCells": 1}
+    update.reset_mock()
+    journal = JobJournal("write", path=":memory:")
+    journal.record({"'Data'!A1": {"updatedCells": 1}})
+    mock_spreadsheet.update_cell_range(
+        "'Data'!A1", [["x"], ["y"]], journal=journal, max_bytes=5
+    )
+    assert [call.kwargs["range"] for call in update.call_args_list] == ["'Data'!A2"]
+
+
+def test_read_planner_coalesces_and_caches(mock_spreadsheet):
+    batch_get = mock_spreadsheet.session.session.values().batchGet
+    batch_get().execute.return_value = {
+        "valueRanges": [{"values": [["a1", "b1"], ["a2", "b2"], ["a3", "b3"]]}]
+    }
+    batch_get.reset_mock()
+    planner = ReadPlanner(mock_spreadsheet)
+    planner.add("A1:B2")
+    planner.add("A3:B3")
+    values = planner.fetch()
+    assert values == {"A1:B2": [["a1", "b1"], ["a2", "b2"]], "A3:B3": [["a3", "b3"]]}
+    batch_get.assert_called_once_with(spreadsheetId="spreadsheet_id", ranges=["A1:B3"])
+    assert planner.get("B2:B3") == [["b2"], ["b3"]]
+    batch_get.assert_called_once()
+
+
+def test_read_planner_without_cache(mock_spreadsheet):
+    batch_get = mock_spreadsheet.session.session.values().batchGet
+    batch_get().execute.return_value = {"valueRanges": [{"values": [["a1"]]}]}
+    batch_get.reset_mock()
+    planner = ReadPlanner(mock_spreadsheet, ttl=0)
+    assert planner.get("A1") == [["a1"]]
+    assert planner.get("A1") == [["a1"]]
+    assert batch_get.call_count == 2
+
+
+def test_import_csv_streams_paste_requests(mock_spreadsheet, tmp_path):
+    csv_path = tmp_path / "data.csv"
+    csv_path.write_text("".join(f"{i},name {i}\n" for i in range(10)))
+    session = mock_spreadsheet.session.session
+    session.batchUpdate.reset_mock()
+    worksheet = WorkSheet(
+        sheetId=3, title="Data", gridProperties={"rowCount": 4, "columnCount": 2}
+    )
+    result = mock_spreadsheet.import_csv(
+        str(csv_path), worksheet, max_bytes=30, limiter=QuotaLimiter(1000)
+    )
+    assert result == {"rows": 10, "requests": 3}
+    bodies = [
+        call.kwargs["body"]["requests"][0]
+        for call in session.batchUpdate.call_args_list
+    ]
+    pastes = [body["pasteData"] for body in bodies if "pasteData" in body]
+    assert sorted(paste["coordinate"]["rowIndex"] for paste in pastes) == [0, 4, 8]
+    assert "".join(
+        p["data"] for p in sorted(pastes, key=lambda p: p["coordinate"]["rowIndex"])
+    ) == (csv_path.read_text())
+    resizes = [
+        body["updateSheetProperties"]
+        for body in bodies
+        if "updateSheetProperties" in body
+    ]
+    # The grid is grown ahead once and trimmed to the imported rows at the end
+    assert [r["properties"]["gridProperties"]["rowCount"] for r in resizes] == [24, 10]
+
+
+def test_iter_rows_reads_current_row_count(mock_spreadsheet):
+    get = mock_spreadsheet.session.session.get().execute
+    get.return_value = {
+        "sheets": [{"properties": {"title": "Data", "gridProperties": {"rowCount": 1}}}]
+    }
+    mock_spreadsheet.list_worksheets()
+    # Rows were appended after the metadata was cached
+    get.return_value = {
+        "sheets": [{"properties": {"title": "Data", "gridProperties": {"rowCount": 3}}}]
+    }
+    values = mock_spreadsheet.session.session.values()
+    values.get().execute.return_value = {"values": [["a"], ["b"], ["c"]]}
+    values.get.reset_mock()
+    rows = list(mock_spreadsheet.iter_rows("Data"))
+    assert values.get.call_args.kwargs["range"] == "'Data'!1:3"
+    assert len(rows) == 3
+
+
+def test_row_appender_flush_invalidates_metadata(mock_spreadsheet):
+    mock_spreadsheet.session.session.values().append().execute.return_value = {}
+    mock_spreadsheet._worksheets = {"Log": WorkSheet(title="Log")}
+    with RowAppender(mock_spreadsheet, "Log") as appender:
+        appender.append([1])
+    assert mock_spreadsheet._worksheets is None